@@ -1,19 +1,33 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, request, jsonify, render_template, send_from_directory, g, has_app_context, has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from datetime import datetime, timedelta
 import json
+import logging
+import multiprocessing
 from decimal import Decimal
 import os
+import tempfile
 from werkzeug.utils import secure_filename
-from sqlalchemy import func, text
+from itertools import chain
+from sqlalchemy import event, func, inspect, text
+from sqlalchemy.exc import IntegrityError
 from utils import (
-    find_prev_balance,
-    calculate_report_profit,
+    ProfitCalculator,
     calculate_account_last_balance,
     group_reports_by_day_net_profit
 )
-import re
+from orders_parser import (
+    COLUMN_RULES, describe_columns, iter_orders_file, parse_orders_in_window, read_order_header,
+    preview_orders_file, current_parse_stats, start_parse_stats
+)
+from logging_setup import get_logger
+from job_queue import JobQueue
+from profit_cache import cache as profit_cache, WATCHED_TABLES as PROFIT_CACHE_TABLES
+from report_balances import report_balances, cache_stats as balances_cache_stats
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Опциональный импорт pandas
 try:
@@ -23,6 +37,8 @@ except ImportError:
     PANDAS_AVAILABLE = False
     pd = None
 
+logger = get_logger(__name__)
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///arbitrage_reports.db')
@@ -37,6 +53,12 @@ app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
+# Сколько процессов разбирает файлы выгрузок смены параллельно (1 — без пула)
+SHIFT_PARSE_WORKERS = int(os.environ.get('SHIFT_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+# Процессы пула запускаются заново (spawn), а не fork: файлы разбираются из потоков
+# фоновых задач, и fork многопоточного процесса может унаследовать захваченные блокировки
+SHIFT_PARSE_CONTEXT = multiprocessing.get_context('spawn')
+
 ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls', 'png', 'jpg', 'jpeg', 'webp', 'pdf', 'txt'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -51,6 +73,34 @@ def validate_file_size(file):
 def uploaded_file(filename):
     return send_from_directory(UPLOAD_FOLDER, filename)
 
+@app.before_request
+def start_request_stats():
+    g.request_started = time.perf_counter()
+    g.parse_stats = start_parse_stats()
+
+@app.before_request
+def start_job_workers():
+    # Запуск после fork: у каждого процесса gunicorn свой пул потоков
+    job_queue.start()
+
+@app.after_request
+def log_request_summary(response):
+    """Одна итоговая строка на запрос: сколько строк выгрузок разобрано и оставлено, сколько заняло"""
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    stats = g.get('parse_stats')
+    if stats is not None and stats.files:
+        logger.info(
+            "%s %s → %s: файлов %d, строк разобрано %d, оставлено %d, разбор %.2f с, всего %.2f с",
+            request.method, request.path, response.status_code,
+            stats.files, stats.rows_parsed, stats.rows_kept, stats.seconds, elapsed
+        )
+    else:
+        logger.debug("%s %s → %s за %.2f с", request.method, request.path, response.status_code, elapsed)
+    return response
+
 # --- КОНСТАНТЫ И ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 PLATFORMS = ['bybit', 'htx', 'bliss', 'gate']
 ADMIN_PASSWORD = 'Blalala2'
@@ -63,711 +113,19 @@ def validate_admin_password(data):
     admin_password = os.environ.get('ADMIN_PASSWORD', 'Blalala2')
     return data['password'] == admin_password
 
-def convert_to_moscow_time(datetime_obj, platform):
-    """
-    Конвертирует время из часового пояса платформы в московское время
-    
-    Args:
-        datetime_obj: объект datetime
-        platform: название платформы ('bybit', 'htx', 'bliss')
-    
-    Returns:
-        datetime объект в московском времени
-    """
-    if not datetime_obj:
-        print(f"DEBUG TIMEZONE: Получен пустой datetime_obj для {platform}")
-        return datetime_obj
-    
-    # Определяем смещение для каждой платформы относительно Москвы
-    timezone_offsets = {
-        'bybit': 3,   # Bybit время в UTC+0, МСК это UTC+3 → добавляем 3 часа
-        'htx': -5,    # HTX время в UTC+8, МСК это UTC+3 → вычитаем 5 часов
-        'bliss': 3,   # Bliss время в UTC+0, МСК это UTC+3 → добавляем 3 часа
-        'gate': 0     # Gate.io: пока без смещения (можно настроить позже)
-    }
-    
-    offset_hours = timezone_offsets.get(platform.lower(), 0)
-    
-    # Применяем смещение
-    if offset_hours != 0:
-        print(f"DEBUG TIMEZONE: Конвертируем {datetime_obj} для {platform}")
-        print(f"DEBUG TIMEZONE: Смещение {offset_hours} часов")
-        datetime_obj = datetime_obj + timedelta(hours=offset_hours)
-        print(f"DEBUG TIMEZONE: Результат -> {datetime_obj}")
-    else:
-        print(f"DEBUG TIMEZONE: Нет смещения для платформы {platform}")
-    
-    return datetime_obj
-
 def parse_orders_file(filepath, platform, start_date=None, end_date=None, original_filename=None):
     """Парсит файл с ордерами в зависимости от платформы"""
     try:
-        # Проверяем, что файл существует
-        if not os.path.exists(filepath):
-            print(f"Ошибка: файл {filepath} не существует")
-            return []
-        
-        # Определяем тип файла по расширению
-        ext = os.path.splitext(filepath)[1].lower()
-        
-        if platform.lower() == 'bliss':
-            try:
-                # Пробуем разные разделители
-                separators = [';', ',', '\t']
-                df = None
-                
-                print(f"\nBLISS DEBUG: Пытаемся прочитать файл {filepath}")
-                print(f"BLISS DEBUG: Размер файла: {os.path.getsize(filepath)} байт")
-                
-                # Читаем первые несколько строк файла для отладки
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    print("BLISS DEBUG: Первые строки файла:")
-                    for i, line in enumerate(f):
-                        if i < 5:  # Показываем первые 5 строк
-                            print(f"BLISS DEBUG: Строка {i+1}: {line.strip()}")
-                
-                for sep in separators:
-                    try:
-                        print(f"\nBLISS DEBUG: Пробуем разделитель '{sep}'")
-                        print(f"BLISS DEBUG: Путь к файлу: {filepath}")
-                        
-                        # Читаем первые несколько строк для отладки
-                        with open(filepath, 'r', encoding='utf-8') as f:
-                            print("BLISS DEBUG: Первые 3 строки файла:")
-                            for i, line in enumerate(f):
-                                if i < 3:
-                                    print(f"BLISS DEBUG: {line.strip()}")
-                        
-                        df = pd.read_csv(filepath, sep=sep, encoding='utf-8', quotechar='"', header=0)
-                        print(f"BLISS DEBUG: Успешно прочитали файл")
-                        print(f"BLISS DEBUG: Найдены колонки: {list(df.columns)}")
-                        print(f"BLISS DEBUG: Количество строк: {len(df)}")
-                        
-                        # Проверяем, что нашли нужные колонки
-                        required_columns = ['Creation date', 'Internal id', 'Organization user', 'Amount', 'Crypto amount', 'Status', 'Method']
-                        missing_columns = [col for col in required_columns if col not in df.columns]
-                        
-                        if missing_columns:
-                            print(f"BLISS DEBUG: Отсутствуют колонки: {missing_columns}")
-                            continue
-                        else:
-                            print(f"BLISS DEBUG: Успешно прочитали файл с разделителем '{sep}'")
-                            break
-                    except Exception as e:
-                        print(f"BLISS DEBUG: Не удалось прочитать файл с разделителем '{sep}': {str(e)}")
-                        continue
-                
-                if df is None:
-                    print("BLISS DEBUG: Не удалось прочитать файл ни с одним разделителем")
-                    return []
-                
-                orders_data = []
-                for _, row in df.iterrows():
-                    try:
-                        # Получаем необходимые поля
-                        order_id = str(row['Internal id']).strip()
-                        account_name = str(row['Organization user']).strip()
-                        amount = str(row['Amount']).strip().replace(' ', '').replace(',', '.')
-                        crypto_amount = str(row['Crypto amount']).strip().replace(' ', '').replace(',', '.')
-                        status = str(row['Status']).strip()
-                        method = str(row['Method']).strip()  # Добавляем поле Method
-                        
-                        print(f"\nBLISS DEBUG: Обрабатываем строку:")
-                        print(f"BLISS DEBUG: order_id = {order_id}")
-                        print(f"BLISS DEBUG: account_name = {account_name}")
-                        print(f"BLISS DEBUG: amount = {amount}")
-                        print(f"BLISS DEBUG: crypto_amount = {crypto_amount}")
-                        print(f"BLISS DEBUG: status = {status}")
-                        print(f"BLISS DEBUG: method = {method}")
-                        
-                        # Определяем сторону ордера на основе метода
-                        if method.lower() in ['sell', 'продажа', 'продать']:
-                            side = 'sell'
-                        else:
-                            side = 'buy'
-                        
-                        # Получаем время создания
-                        creation_date = str(row['Creation date']).strip()
-                        if creation_date:
-                            try:
-                                print(f"BLISS DEBUG: Исходная строка даты: '{creation_date}'")
-                                executed_at = datetime.strptime(creation_date, '%d.%m.%Y %H:%M:%S')
-                                print(f"BLISS DEBUG: Распарсенная дата: {executed_at}")
-                                
-                                # Конвертируем время в московское
-                                executed_at = convert_to_moscow_time(executed_at, platform)
-                                print(f"BLISS DEBUG: Дата в МСК: {executed_at}")
-                                
-                                # Фильтруем по времени, если указаны границы
-                                if start_date and executed_at < start_date:
-                                    print(f"BLISS DEBUG: Ордер {order_id} раньше начальной даты")
-                                    continue
-                                if end_date and executed_at > end_date:
-                                    print(f"BLISS DEBUG: Ордер {order_id} позже конечной даты")
-                                    continue
-                                
-                            except Exception as e:
-                                print(f"BLISS DEBUG: Ошибка обработки даты: '{creation_date}', ошибка: {str(e)}")
-                                executed_at = datetime.now()
-                        else:
-                            print(f"BLISS DEBUG: Пустая дата в строке")
-                            executed_at = datetime.now()
-                        
-                        # Конвертируем числовые значения
-                        try:
-                            total_usdt = float(amount)
-                            quantity = float(crypto_amount)
-                            print(f"BLISS DEBUG: total_usdt = {total_usdt}, quantity = {quantity}")
-                        except:
-                            print(f"BLISS DEBUG: Ошибка конвертации чисел: amount={amount}, crypto_amount={crypto_amount}")
-                            continue
-                        
-                        # Проверяем обязательные поля
-                        if not order_id:
-                            print(f"BLISS DEBUG: Пропускаем строку - не найден ID ордера")
-                            continue
-                        
-                        if not account_name:
-                            print(f"BLISS DEBUG: Пропускаем строку - не найдено имя аккаунта")
-                            continue
-                        
-                        # Вычисляем цену
-                        price = total_usdt / quantity if quantity > 0 else 0
-                        print(f"BLISS DEBUG: Вычисленная цена: {price}")
-                        
-                        # Определяем статус
-                        if status.lower() in ['success', 'completed', 'done']:
-                            order_status = 'filled'
-                        elif status.lower() in ['cancelled', 'canceled']:
-                            order_status = 'canceled'
-                        elif status.lower() in ['expired']:
-                            order_status = 'expired'
-                        elif status.lower() in ['failed']:
-                            order_status = 'failed'
-                        else:
-                            order_status = 'pending'
-                        
-                        order_data = {
-                            'order_id': order_id,
-                            'symbol': 'USDT',
-                            'side': side,
-                            'quantity': quantity,
-                            'price': price,
-                            'total_usdt': total_usdt,
-                            'fees_usdt': 0,
-                            'status': order_status,
-                            'executed_at': executed_at
-                        }
-                        
-                        print(f"BLISS DEBUG: Создан order_data:")
-                        for key, value in order_data.items():
-                            print(f"BLISS DEBUG: {key} = {value}")
-                        
-                        orders_data.append(order_data)
-                        print(f"BLISS DEBUG: Ордер {order_id} добавлен в список")
-                        
-                    except Exception as e:
-                        print(f"BLISS DEBUG: Ошибка парсинга строки: {str(e)}")
-                        continue
-                
-                print(f"BLISS DEBUG: Всего обработано {len(orders_data)} ордеров")
-                return orders_data
-                
-            except Exception as e:
-                print(f"BLISS: Ошибка чтения файла: {str(e)}")
-                return []
-                
-        elif ext in ['.csv']:
-            df = pd.read_csv(filepath)
-        elif ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(filepath)
-        else:
-            raise Exception(f"Неподдерживаемый формат файла: {ext}")
-        
+        # Собираем все пачки потокового разбора в один список
         orders_data = []
-        
-        if platform.lower() == 'bybit':
-            # Парсинг файла Bybit
-            for _, row in df.iterrows():
-                try:
-                    # Извлекаем данные из строки
-                    order_data = parse_bybit_order(row)
-                    if order_data:
-                        # Конвертируем время в московское
-                        order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], platform)
-                        
-                        # Фильтруем по времени, если указаны границы
-                        if start_date or end_date:
-                            order_time = order_data['executed_at']
-                            
-                            # Проверяем начальную дату
-                            if start_date and order_time < start_date:
-                                continue
-                            
-                            # Проверяем конечную дату
-                            if end_date and order_time > end_date:
-                                continue
-                        
-                        orders_data.append(order_data)
-                except Exception as e:
-                    print(f"Ошибка парсинга ордера Bybit: {str(e)}")
-                    continue
-                
-        elif platform.lower() == 'htx':
-            # Парсинг файла HTX
-            for _, row in df.iterrows():
-                try:
-                    # Извлекаем данные из строки
-                    order_data = parse_htx_order(row)
-                    if order_data:
-                        # Конвертируем время в московское
-                        order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], platform)
-                        
-                        # Фильтруем по времени, если указаны границы
-                        if start_date or end_date:
-                            order_time = order_data['executed_at']
-                            
-                            # Проверяем начальную дату
-                            if start_date and order_time < start_date:
-                                continue
-                            
-                            # Проверяем конечную дату
-                            if end_date and order_time > end_date:
-                                continue
-                        
-                        orders_data.append(order_data)
-                except Exception as e:
-                    print(f"Ошибка парсинга ордера HTX: {str(e)}")
-                    continue
-                
-        elif platform.lower() == 'gate':
-            # Парсинг файла Gate
-            for _, row in df.iterrows():
-                try:
-                    # Извлекаем данные из строки
-                    order_data = parse_gate_order(row)
-                    if order_data:
-                        # Конвертируем время в московское
-                        order_data['executed_at'] = convert_to_moscow_time(order_data['executed_at'], platform)
-                        
-                        # Фильтруем по времени, если указаны границы
-                        if start_date or end_date:
-                            order_time = order_data['executed_at']
-                            
-                            # Проверяем начальную дату
-                            if start_date and order_time < start_date:
-                                continue
-                            
-                            # Проверяем конечную дату
-                            if end_date and order_time > end_date:
-                                continue
-                        
-                        orders_data.append(order_data)
-                except Exception as e:
-                    print(f"Ошибка парсинга ордера Gate: {str(e)}")
-                    continue
-        
+        for batch in iter_orders_file(filepath, platform, start_date, end_date):
+            orders_data.extend(order.to_dict() for order in batch)
         return orders_data
         
     except Exception as e:
-        print(f"Ошибка парсинга файла: {str(e)}")
+        logger.error(f"Ошибка парсинга файла: {str(e)}")
         return []
 
-def parse_bybit_order(row):
-    """Парсит строку ордера Bybit"""
-    try:
-        # Ищем нужные столбцы в строке
-        order_id = None
-        symbol = None
-        side = None
-        coin_amount = None  # Объем (USDT) - из Coin Amount
-        price = None        # Цена - из Price
-        fiat_amount = None  # Объем (RUB) - из Fiat Amount
-        status = 'filled'   # Статус по умолчанию
-        executed_at = None
-        
-        # Проверяем разные варианты названий столбцов
-        for col in row.index:
-            col_lower = str(col).lower().strip()
-            col_value = str(row[col]).strip()
-            
-            # Order ID - различные варианты
-            if any(x in col_lower for x in ['order no', 'order id', 'orderid', 'order_id', 'номер']):
-                order_id = col_value
-            
-            # Symbol/Pair - торговая пара (из Cryptocurrency)
-            elif any(x in col_lower for x in ['cryptocurrency', 'symbol', 'pair', 'пара', 'инструмент', 'currency', 'валюта']):
-                if col_value and col_value.lower() not in ['nan', 'none', '']:
-                    symbol = col_value.upper()  # Приводим к верхнему регистру
-            
-            # Side/Type - направление сделки
-            elif any(x in col_lower for x in ['side', 'type', 'тип', 'направление']):
-                side_value = col_value.lower()
-                if any(x in side_value for x in ['buy', 'покупка', 'long']):
-                    side = 'buy'
-                elif any(x in side_value for x in ['sell', 'продажа', 'short']):
-                    side = 'sell'
-            
-            # Coin Amount - количество криптовалюты (идет в колонку Объем USDT)
-            elif any(x in col_lower for x in ['coin amount', 'coinamount', 'coin_amount']):
-                try:
-                    clean_value = re.sub(r'[^\d.,]', '', col_value)
-                    if clean_value:
-                        coin_amount = float(clean_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Price - цена (идет в колонку Цена)
-            elif any(x in col_lower for x in ['price', 'цена', 'курс']):
-                try:
-                    clean_value = re.sub(r'[^\d.,]', '', col_value)
-                    if clean_value:
-                        price = float(clean_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Fiat Amount - сумма в фиатной валюте (идет в колонку Объем RUB)
-            elif any(x in col_lower for x in ['fiat amount', 'fiatamount', 'fiat_amount']):
-                try:
-                    clean_value = re.sub(r'[^\d.,]', '', col_value)
-                    if clean_value:
-                        fiat_amount = float(clean_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Status - статус
-            elif any(x in col_lower for x in ['status', 'статус']):
-                if col_value and col_value.lower() not in ['nan', 'none', '']:
-                    status = col_value.lower()
-                    if 'completed' in status or 'завершен' in status:
-                        status = 'filled'
-                    elif 'canceled' in status or 'отменен' in status:
-                        status = 'canceled'
-                    elif 'pending' in status or 'ожидание' in status:
-                        status = 'pending'
-                    else:
-                        status = 'filled'  # По умолчанию
-            
-            # Time - время
-            elif any(x in col_lower for x in ['time', 'date', 'время', 'дата', 'created']):
-                try:
-                    if col_value and col_value != 'nan':
-                        if PANDAS_AVAILABLE:
-                            executed_at = pd.to_datetime(col_value)
-                        else:
-                            # Простой парсинг даты без pandas
-                            executed_at = datetime.strptime(col_value, '%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
-        
-        # Попытка автоматически вычислить недостающие значения
-        # Вычисляем price, если есть coin_amount и fiat_amount
-        if price is None and coin_amount not in [None, 0] and fiat_amount not in [None, 0]:
-            try:
-                price = fiat_amount / coin_amount if coin_amount else None
-            except Exception as _:
-                pass
-        # Вычисляем fiat_amount, если есть price и coin_amount
-        if fiat_amount is None and price not in [None, 0] and coin_amount not in [None, 0]:
-            try:
-                fiat_amount = price * coin_amount
-            except Exception as _:
-                pass
-
-        # Установка значения по умолчанию для symbol
-        if not symbol or str(symbol).lower() in ['nan', 'none', '']:
-            symbol = 'USDT'
-
-        # Проверяем, что все необходимые данные есть после попыток вычисления
-        if not order_id or coin_amount is None or (price is None and fiat_amount is None):
-            print(f"Пропускаем строку - недостаточно данных: order_id={order_id}, coin_amount={coin_amount}, price={price}, fiat_amount={fiat_amount}")
-            return None
-        
-        # Дополнительная проверка на корректность symbol
-        if symbol.lower() in ['nan', 'none', '']:
-            print(f"Пропускаем строку - некорректный символ: {symbol}")
-            return None
-        
-        # Если нет времени, используем текущее
-        if not executed_at:
-            executed_at = datetime.now()
-        
-        return {
-            'order_id': order_id,
-            'symbol': symbol,
-            'side': side,
-            'quantity': coin_amount,    # Объем (USDT) - из Coin Amount
-            'price': price,            # Цена - из Price
-            'total_usdt': fiat_amount, # Объем (RUB) - из Fiat Amount
-            'fees_usdt': 0,
-            'status': status,          # Статус - из Status
-            'executed_at': executed_at
-        }
-        
-    except Exception as e:
-        print(f"Ошибка парсинга ордера Bybit: {e}")
-        return None
-
-def parse_htx_order(row):
-    """Парсит строку ордера HTX с учетом специфики формата HTX"""
-    try:
-        # Инициализируем переменные
-        order_id = None
-        symbol = None
-        side = None
-        quantity = None     # Объем (USDT) - из Количество
-        price = None        # Цена - из Цена за ед.
-        total_usdt = None   # Объем (RUB) - из Общая цена
-        status = 'filled'   # Статус по умолчанию
-        executed_at = None
-        
-        # Прямой маппинг колонок HTX
-        for col in row.index:
-            col_str = str(col).strip()
-            col_value = str(row[col]).strip()
-            
-            # Order ID - Номер:
-            if col_str == 'Номер:':
-                order_id = col_value
-            
-            # Symbol/Pair - Монета (USDT + RUB = USDT)
-            elif col_str == 'Монета':
-                if col_value and col_value.lower() not in ['nan', 'none', '']:
-                    symbol = col_value.upper()  # USDT
-            
-            # Side/Type - Тип (Продать/Купить)
-            elif col_str == 'Тип':
-                if 'Продать' in col_value or 'продать' in col_value:
-                    side = 'sell'
-                elif 'Купить' in col_value or 'купить' in col_value:
-                    side = 'buy'
-            
-            # Quantity - Количество
-            elif col_str == 'Количество':
-                try:
-                    if col_value and col_value != 'nan':
-                        quantity = float(col_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Price - Цена за ед.
-            elif col_str == 'Цена за ед.':
-                try:
-                    if col_value and col_value != 'nan':
-                        price = float(col_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Total - Общая цена
-            elif col_str == 'Общая цена':
-                try:
-                    if col_value and col_value != 'nan':
-                        total_usdt = float(col_value.replace(',', '.'))
-                except:
-                    pass
-            
-            # Status - Статус
-            elif col_str == 'Статус':
-                if col_value and col_value.lower() not in ['nan', 'none', '']:
-                    if 'Завершено' in col_value or 'завершено' in col_value:
-                        status = 'filled'
-                    elif 'Отменено' in col_value or 'отменено' in col_value:
-                        status = 'canceled'
-                    elif 'Ожидание' in col_value or 'ожидание' in col_value:
-                        status = 'pending'
-                    else:
-                        status = 'filled'  # По умолчанию
-            
-            # Time - Время
-            elif col_str == 'Время':
-                try:
-                    if col_value and col_value != 'nan':
-                        if PANDAS_AVAILABLE:
-                            executed_at = pd.to_datetime(col_value)
-                        else:
-                            # Простой парсинг даты без pandas
-                            executed_at = datetime.strptime(col_value, '%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
-        
-        # Попытка автоматически вычислить недостающие значения
-        if price is None and quantity not in [None, 0] and total_usdt not in [None, 0]:
-            try:
-                price = total_usdt / quantity if quantity else None
-            except Exception:
-                pass
-        if total_usdt is None and price not in [None, 0] and quantity not in [None, 0]:
-            try:
-                total_usdt = price * quantity
-            except Exception:
-                pass
-
-        # Устанавливаем значение символа по умолчанию, если не удалось прочитать
-        if not symbol or str(symbol).lower() in ['nan', 'none', '']:
-            symbol = 'USDT'
-
-        # Проверяем, что все необходимые данные есть после вычислений
-        if not order_id or quantity is None or (price is None and total_usdt is None):
-            print(f"HTX: Пропускаем строку - недостаточно данных: order_id={order_id}, quantity={quantity}, price={price}, total_usdt={total_usdt}")
-            return None
-        
-        # Дополнительная проверка на корректность symbol
-        if symbol.lower() in ['nan', 'none', '']:
-            print(f"HTX: Пропускаем строку - некорректный символ: {symbol}")
-            return None
-        
-        # Если нет времени, используем текущее
-        if not executed_at:
-            executed_at = datetime.now()
-        
-        return {
-            'order_id': order_id,
-            'symbol': symbol,
-            'side': side,
-            'quantity': quantity,      # Объем (USDT) - из Количество
-            'price': price,           # Цена - из Цена за ед.
-            'total_usdt': total_usdt, # Объем (RUB) - из Общая цена
-            'fees_usdt': 0,
-            'status': status,         # Статус - из Статус
-            'executed_at': executed_at
-        }
-        
-    except Exception as e:
-        print(f"Ошибка парсинга ордера HTX: {e}")
-        return None
-
-def parse_gate_order(row):
-    """Парсит строку ордера Gate.io"""
-    # Аналогично Bybit, но с учетом специфики Gate
-    return parse_bybit_order(row)  # Пока используем тот же парсер
-
-def parse_bliss_order(row):
-    """Парсит строку ордера Bliss с учетом специфики формата Bliss"""
-    try:
-        # Инициализируем переменные
-        order_id = None
-        symbol = 'USDT'  # Всегда USDT для Bliss
-        side = 'buy'     # Всегда покупка согласно описанию
-        quantity = None  # Объем (USDT) - из Crypto amount
-        price = None     # Цена - пропускается поле
-        total_usdt = None  # Объем (RUB) - из Amount
-        status = 'filled'  # Статус по умолчанию
-        executed_at = None
-        
-        # Отладка: выводим все колонки
-        print(f"BLISS DEBUG: Все колонки в строке: {list(row.index)}")
-        
-        for col in row.index:
-            col_str = str(col).strip()
-            col_value = str(row[col]).strip()
-            
-            print(f"BLISS DEBUG: Обрабатываем колонку '{col_str}' со значением '{col_value}'")
-            
-            # Order ID - Internal id
-            if col_str == 'Internal id':
-                order_id = col_value
-                print(f"BLISS DEBUG: Найден order_id: {order_id}")
-            
-            # Quantity - Crypto amount
-            elif col_str == 'Crypto amount':
-                try:
-                    if col_value and col_value != 'nan':
-                        # Убираем запятые и конвертируем в float
-                        quantity = float(col_value.replace(',', '.'))
-                        print(f"BLISS DEBUG: Найден quantity: {quantity}")
-                except:
-                    pass
-            
-            # Total USDT - Amount
-            elif col_str == 'Amount':
-                try:
-                    if col_value and col_value != 'nan':
-                        # Убираем запятые и конвертируем в float
-                        total_usdt = float(col_value.replace(',', '.'))
-                        print(f"BLISS DEBUG: Найден total_usdt: {total_usdt}")
-                except:
-                    pass
-            
-            # Status - Status
-            elif col_str == 'Status':
-                if col_value and col_value != 'nan':
-                    status_value = col_value.lower()
-                    if status_value in ['success', 'completed', 'done']:
-                        status = 'filled'
-                    elif status_value in ['cancelled', 'canceled']:
-                        status = 'canceled'
-                    elif status_value in ['expired']:
-                        status = 'expired'
-                    elif status_value in ['failed']:
-                        status = 'failed'
-                    else:
-                        status = 'pending'
-                    print(f"BLISS DEBUG: Найден status: {status}")
-            
-            # Time - пробуем разные варианты названий колонок с датой
-            elif col_str in ['Finish date', 'Creation date', 'Date', 'Time', 'Timestamp', 'Дата завершения', 'Время']:
-                print(f"BLISS DEBUG: Найдена колонка с датой '{col_str}' со значением '{col_value}'")
-                try:
-                    if col_value and col_value != 'nan':
-                        # Пробуем разные форматы даты
-                        date_formats = [
-                            '%d.%m.%Y %H:%M',
-                            '%d.%m.%Y %H:%M:%S',
-                            '%Y-%m-%d %H:%M:%S',
-                            '%Y-%m-%d %H:%M',
-                            '%d/%m/%Y %H:%M',
-                            '%d-%m-%Y %H:%M'
-                        ]
-                        
-                        for date_format in date_formats:
-                            try:
-                                if PANDAS_AVAILABLE:
-                                    executed_at = pd.to_datetime(col_value, format=date_format)
-                                else:
-                                    executed_at = datetime.strptime(col_value, date_format)
-                                print(f"BLISS DEBUG: Успешно распарсили дату '{col_value}' в формате '{date_format}' -> {executed_at}")
-                                break
-                            except:
-                                continue
-                        else:
-                            print(f"BLISS DEBUG: Не удалось распарсить дату '{col_value}' ни в одном формате")
-                except Exception as e:
-                    print(f"BLISS DEBUG: Ошибка парсинга даты '{col_value}': {e}")
-        
-        # Вычисляем цену на основе имеющихся данных
-        price = None
-        if quantity is not None and total_usdt is not None and quantity > 0:
-            price = total_usdt / quantity
-        
-        # Проверяем, что все необходимые данные есть
-        if not order_id or quantity is None or total_usdt is None or price is None:
-            print(f"BLISS: Пропускаем строку - недостаточно данных: order_id={order_id}, symbol={symbol}, side={side}, quantity={quantity}, price={price}, total_usdt={total_usdt}")
-            return None
-        
-        # Если нет времени, используем текущее
-        if not executed_at:
-            executed_at = datetime.now()
-        
-        # Время будет конвертировано позже в process_platform_file
-        # executed_at остаётся в исходном часовом поясе
-        
-        return {
-            'order_id': order_id,
-            'account_name': None,  # Не используем имя аккаунта из файла
-            'symbol': symbol,
-            'side': side,              # Всегда 'buy'
-            'quantity': quantity,      # Объем (USDT) - из Crypto amount
-            'price': price,            # Цена - вычисляется
-            'total_usdt': total_usdt,  # Объем (RUB) - из Amount
-            'fees_usdt': 0,
-            'status': status,          # Статус - из Status
-            'executed_at': executed_at
-        }
-        
-    except Exception as e:
-        print(f"BLISS: Ошибка парсинга строки: {str(e)}")
-        return None
-
 # Модели данных
 class Employee(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -828,6 +186,14 @@ class ShiftReport(db.Model):
     # Время начала и окончания смены по МСК
     shift_start_time = db.Column(db.DateTime, default=None)  # Время начала смены
     shift_end_time = db.Column(db.DateTime, default=None)    # Время окончания смены
+    # Прибыль, посчитанная при записи отчёта (utils.calculate_report_profit)
+    profit = db.Column(db.Numeric(15, 2), default=None)
+    project_profit = db.Column(db.Numeric(15, 2), default=None)
+    salary_profit = db.Column(db.Numeric(15, 2), default=None)
+    # Прибыль устарела (изменились более ранние балансы) и ждёт фонового пересчёта
+    profit_dirty = db.Column(db.Boolean, nullable=False, default=True, index=True)
+    # Растёт при каждой пометке на пересчёт: пересчёт не затирает более новую пометку
+    profit_revision = db.Column(db.Integer, nullable=False, default=0)
 
 class OrderDetail(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -861,10 +227,34 @@ class AccountBalanceHistory(db.Model):
     employee_name = db.Column(db.String(100), nullable=True)
     balance_type = db.Column(db.String(10), nullable=False, default='end')  # start или end
 
+class AccountBalanceLedger(db.Model):
+    """
+    Балансы аккаунтов из отчётов о сменах (balances_json) по строке на аккаунт отчёта.
+    Ведётся при создании и удалении отчёта; по индексу ix_balance_ledger_lookup
+    предыдущий баланс аккаунта находится одним запросом (utils.find_prev_balance).
+    """
+    __table_args__ = (
+        db.UniqueConstraint('report_id', 'platform', 'account_id', name='uq_balance_ledger_report_account'),
+        db.Index('ix_balance_ledger_lookup', 'account_id', 'platform', 'shift_date', 'shift_rank'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('shift_report.id'), nullable=False, index=True)
+    account_id = db.Column(db.Integer, nullable=False)
+    platform = db.Column(db.String(20), nullable=False)
+    shift_date = db.Column(db.Date, nullable=False)
+    shift_type = db.Column(db.String(20), nullable=False)
+    shift_rank = db.Column(db.Integer, nullable=False, default=0)  # Порядок смены внутри дня (SHIFT_TYPE_RANKS)
+    start_balance = db.Column(db.Numeric(20, 8), nullable=True)
+    end_balance = db.Column(db.Numeric(20, 8), nullable=True)
+    balance = db.Column(db.Numeric(20, 8), nullable=True)
+
 class Order(db.Model):
     """Модель для хранения ордеров от расширения Bybit"""
+    # Номера ордеров уникальны в пределах площадки; индекс (platform, order_id)
+    # служит и для поиска дублей, и для INSERT с пропуском конфликтов
+    __table_args__ = (db.UniqueConstraint('platform', 'order_id', name='uq_order_platform_order_id'),)
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.String(100), nullable=False, unique=True)
+    order_id = db.Column(db.String(100), nullable=False)
     employee_id = db.Column(db.Integer, db.ForeignKey('employee.id'), nullable=False)
     platform = db.Column(db.String(20), nullable=False, default='bybit')
     account_name = db.Column(db.String(100), nullable=False)
@@ -905,6 +295,573 @@ class SalarySettings(db.Model):
     bonus_requests_threshold = db.Column(db.Integer, nullable=False, default=70)  # Порог заявок для получения бонуса
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class IngestionJob(db.Model):
+    """Фоновая задача обработки файлов выгрузок (см. job_queue.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    report_id = db.Column(db.Integer, nullable=True)  # Отчёт, к которому относятся файлы
+    payload_json = db.Column(db.Text, nullable=False, default='{}')
+    result_json = db.Column(db.Text)
+    error = db.Column(db.Text)
+    progress_done = db.Column(db.Integer, default=0)
+    progress_total = db.Column(db.Integer, default=0)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # Последняя отметка прогресса выполняющейся задачи
+    finished_at = db.Column(db.DateTime)
+
+class OrderBatch(db.Model):
+    """Принятый пакет ордеров от расширения: ответ хранится по ключу идемпотентности"""
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(100), unique=True, nullable=False)
+    response_json = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class IngestionWatermark(db.Model):
+    """Интервал времени ордеров аккаунта площадки, уже полностью загруженный из выгрузок"""
+    __table_args__ = (db.UniqueConstraint('platform', 'account_name', name='uq_ingestion_watermark_account'),)
+    id = db.Column(db.Integer, primary_key=True)
+    platform = db.Column(db.String(20), nullable=False)
+    account_name = db.Column(db.String(100), nullable=False)
+    covered_from = db.Column(db.DateTime, nullable=False)  # Самый ранний ордер загруженного интервала
+    covered_to = db.Column(db.DateTime, nullable=False)  # Самый поздний ордер загруженного интервала
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class CacheGeneration(db.Model):
+    """Счётчик поколения данных: растёт при каждой записи, от которой зависят кэши процессов"""
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+# Очередь фоновой обработки выгрузок: рабочие потоки запускаются в каждом процессе при первом запросе
+job_queue = JobQueue(app, db, IngestionJob)
+
+# --- ЖУРНАЛ БАЛАНСОВ ---
+# Порядок смен внутри дня: утренняя раньше вечерней
+SHIFT_TYPE_RANKS = {'morning': 0, 'evening': 1}
+BALANCE_PLATFORMS = ['bybit', 'htx', 'bliss', 'gate']
+
+def shift_rank(shift_type):
+    return SHIFT_TYPE_RANKS.get(shift_type, 0)
+
+def balance_ledger_rows(report):
+    """
+    Строки журнала балансов из balances_json отчёта. Записи без числового id
+    аккаунта пропускаются; если аккаунт повторяется на площадке, берётся
+    первая запись (как при поиске по balances_json).
+    """
+    try:
+        balances = json.loads(report.balances_json or '{}')
+    except (json.JSONDecodeError, TypeError):
+        return []
+    if not isinstance(balances, dict):
+        return []
+    
+    rows = []
+    for platform in BALANCE_PLATFORMS:
+        seen = set()
+        for acc in balances.get(platform) or []:
+            if not isinstance(acc, dict):
+                continue
+            account_id = safe_int(acc.get('account_id') or acc.get('id'), None)
+            if account_id is None or account_id in seen:
+                continue
+            seen.add(account_id)
+            rows.append({
+                'report_id': report.id,
+                'account_id': account_id,
+                'platform': platform,
+                'shift_date': report.shift_date,
+                'shift_type': report.shift_type,
+                'shift_rank': shift_rank(report.shift_type),
+                'start_balance': safe_float(acc.get('start_balance'), None),
+                'end_balance': safe_float(acc.get('end_balance'), None),
+                'balance': safe_float(acc.get('balance'), None)
+            })
+    return rows
+
+def sync_balance_ledger(report):
+    """Перезаписывает строки журнала балансов отчёта в текущей транзакции (без commit)"""
+    AccountBalanceLedger.query.filter_by(report_id=report.id).delete(synchronize_session=False)
+    rows = balance_ledger_rows(report)
+    if rows:
+        db.session.execute(AccountBalanceLedger.__table__.insert(), rows)
+
+def backfill_balance_ledger():
+    """
+    Заполняет пустой журнал балансов из balances_json уже сохранённых отчётов
+    (для баз, созданных db.create_all без миграции). Возвращает число строк.
+    """
+    if AccountBalanceLedger.query.first() is not None:
+        return 0
+    created = 0
+    last_id = 0
+    while True:
+        reports = ShiftReport.query.filter(ShiftReport.id > last_id).order_by(ShiftReport.id).limit(500).all()
+        if not reports:
+            break
+        rows = [row for report in reports for row in balance_ledger_rows(report)]
+        if rows:
+            db.session.execute(AccountBalanceLedger.__table__.insert(), rows)
+            created += len(rows)
+        last_id = reports[-1].id
+    db.session.commit()
+    return created
+
+# --- СОХРАНЁННАЯ ПРИБЫЛЬ ОТЧЁТОВ ---
+# Сколько отчётов пересчитывается за одну транзакцию фонового пересчёта (и помечается одним UPDATE)
+PROFIT_REFRESH_BATCH_SIZE = int(os.environ.get('PROFIT_REFRESH_BATCH_SIZE', 200))
+
+def store_report_profit(report, profit=None):
+    """
+    Записывает прибыль отчёта в его столбцы (без commit). По умолчанию считает
+    её заново по журналу балансов, поэтому sync_balance_ledger вызывается раньше.
+    """
+    if profit is None:
+        profit = ProfitCalculator(db.session).compute(report)
+    report.profit = profit['profit']
+    report.project_profit = profit['project_profit']
+    report.salary_profit = profit['salary_profit']
+    report.profit_dirty = False
+
+def mark_reports_dirty(report_ids):
+    """Помечает прибыль отчётов устаревшей (без commit). Возвращает число помеченных"""
+    report_ids = list(report_ids)
+    marked = 0
+    for start in range(0, len(report_ids), PROFIT_REFRESH_BATCH_SIZE):
+        chunk = report_ids[start:start + PROFIT_REFRESH_BATCH_SIZE]
+        marked += db.session.execute(
+            ShiftReport.__table__.update()
+            .where(ShiftReport.__table__.c.id.in_(chunk))
+            .values(profit_dirty=True, profit_revision=ShiftReport.__table__.c.profit_revision + 1)
+        ).rowcount
+    return marked
+
+def reports_touching_accounts(pairs, after=None, exclude_report_id=None):
+    """
+    id отчётов, в балансах которых есть аккаунты pairs ((площадка, id аккаунта)).
+    after=(дата, тип смены) оставляет только отчёты более поздних смен.
+    """
+    pairs = set(pairs)
+    if not pairs:
+        return set()
+    ledger = AccountBalanceLedger
+    query = db.session.query(ledger.report_id, ledger.platform, ledger.account_id).filter(
+        ledger.account_id.in_({account_id for _, account_id in pairs})
+    )
+    if after is not None:
+        after_date, after_type = after
+        query = query.filter(db.or_(
+            ledger.shift_date > after_date,
+            db.and_(ledger.shift_date == after_date, ledger.shift_rank > shift_rank(after_type))
+        ))
+    if exclude_report_id is not None:
+        query = query.filter(ledger.report_id != exclude_report_id)
+    return {row.report_id for row in query if (row.platform, row.account_id) in pairs}
+
+def invalidate_later_report_profits(report):
+    """
+    Помечает на пересчёт отчёты более поздних смен с теми же аккаунтами: их
+    предыдущие балансы могли измениться. Использует строки журнала отчёта,
+    поэтому при удалении вызывается до их удаления. Без commit.
+    """
+    pairs = {(row.platform, row.account_id) for row in AccountBalanceLedger.query.filter_by(report_id=report.id)}
+    later = reports_touching_accounts(pairs, after=(report.shift_date, report.shift_type), exclude_report_id=report.id)
+    return mark_reports_dirty(later)
+
+def invalidate_initial_balance_profits(previous, current):
+    """
+    Помечает на пересчёт отчёты аккаунтов, у которых изменился начальный баланс.
+    previous/current — {(площадка, имя аккаунта): баланс} до и после изменения. Без commit.
+    """
+    changed = {key for key in previous.keys() | current.keys() if previous.get(key) != current.get(key)}
+    if not changed:
+        return 0
+    pairs = set()
+    for platform in {platform for platform, _ in changed}:
+        names = [name for changed_platform, name in changed if changed_platform == platform]
+        accounts = Account.query.filter(Account.platform == platform, Account.account_name.in_(names)).all()
+        pairs.update((platform, account.id) for account in accounts)
+    return mark_reports_dirty(reports_touching_accounts(pairs))
+
+@event.listens_for(db.session, 'after_flush')
+def invalidate_account_profits_after_flush(session, flush_context):
+    """
+    Переименование аккаунта, смена его площадки или удаление меняют начальный баланс
+    его отчётов: find_initial_balance ищет InitialBalance и по имени аккаунта.
+    Такие отчёты помечаются на пересчёт в той же транзакции; пересчёт ставит
+    schedule_profit_refresh после commit.
+    """
+    pairs = set()
+    for obj in session.deleted:
+        if isinstance(obj, Account):
+            pairs.add((obj.platform, obj.id))
+    for obj in session.dirty:
+        if not isinstance(obj, Account):
+            continue
+        attrs = inspect(obj).attrs
+        if not (attrs.account_name.history.has_changes() or attrs.platform.history.has_changes()):
+            continue
+        # При смене площадки отчёты хранят аккаунт под прежней площадкой
+        for platform in [obj.platform, *attrs.platform.history.deleted]:
+            pairs.add((platform, obj.id))
+    if pairs:
+        mark_reports_dirty(reports_touching_accounts(pairs))
+
+def record_report_balances(report):
+    """После добавления отчёта (flush): журнал балансов, прибыль отчёта и пометка более поздних отчётов (без commit)"""
+    sync_balance_ledger(report)
+    store_report_profit(report)
+    invalidate_later_report_profits(report)
+
+def schedule_profit_refresh():
+    """Ставит фоновый пересчёт прибыли, если есть помеченные отчёты и пересчёт ещё не в очереди"""
+    if ShiftReport.query.filter_by(profit_dirty=True).first() is None:
+        return None
+    pending = IngestionJob.query.filter(
+        IngestionJob.kind == 'report_profits',
+        IngestionJob.status == 'queued'
+    ).first()
+    if pending is not None:
+        return pending
+    return job_queue.enqueue('report_profits', {})
+
+@job_queue.handler('report_profits')
+def refresh_report_profits(payload, progress):
+    """
+    Пересчитывает помеченные отчёты пачками в хронологическом порядке. Значение
+    записывается, только если отчёт не был помечен заново во время пересчёта
+    (profit_revision не изменился); иначе он останется в следующей пачке.
+    """
+    table = ShiftReport.__table__
+    total = ShiftReport.query.filter_by(profit_dirty=True).count()
+    refreshed = 0
+    while True:
+        batch = ShiftReport.query.filter_by(profit_dirty=True).order_by(
+            ShiftReport.shift_date, ShiftReport.id
+        ).limit(PROFIT_REFRESH_BATCH_SIZE).all()
+        if not batch:
+            break
+        calculator = ProfitCalculator(db.session)
+        calculator.prepare(batch)
+        stored = 0
+        for report in batch:
+            profit = calculator.compute(report)
+            stored += db.session.execute(
+                table.update()
+                .where(table.c.id == report.id, table.c.profit_revision == report.profit_revision)
+                .values(
+                    profit=profit['profit'],
+                    project_profit=profit['project_profit'],
+                    salary_profit=profit['salary_profit'],
+                    profit_dirty=False
+                )
+            ).rowcount
+        db.session.commit()
+        refreshed += stored
+        progress(min(refreshed, total), total)
+        if not stored:
+            # Все отчёты пачки помечены заново за время пересчёта — их подберёт следующий запуск
+            break
+    return {'refreshed': refreshed}
+
+def report_profit_sums(*criteria, by_employee=False):
+    """
+    Суммы profit, project_profit и salary_profit отчётов, подходящих под criteria.
+    Сохранённая прибыль суммируется в SQL; отчёты, ожидающие пересчёта,
+    досчитываются калькулятором запроса. by_employee=True — {id сотрудника: суммы}.
+    """
+    columns = ('profit', 'project_profit', 'salary_profit')
+    group = [ShiftReport.employee_id] if by_employee else []
+    rows = db.session.query(
+        *group, *[func.coalesce(func.sum(getattr(ShiftReport, column)), 0) for column in columns]
+    ).filter(*criteria, ShiftReport.profit_dirty.is_(False)).group_by(*group).all()
+
+    sums = {}
+    for row in rows:
+        key = row[0] if by_employee else None
+        sums[key] = {column: float(value) for column, value in zip(columns, row[len(group):])}
+
+    dirty = ShiftReport.query.filter(*criteria, ShiftReport.profit_dirty.is_(True)).all()
+    if dirty:
+        profit_calculator().prepare(dirty)
+        for report in dirty:
+            key = report.employee_id if by_employee else None
+            totals = sums.setdefault(key, dict.fromkeys(columns, 0.0))
+            profit = profit_calculator().profit(report)
+            for column in columns:
+                totals[column] += profit[column]
+    if by_employee:
+        return sums
+    return sums.get(None, dict.fromkeys(columns, 0.0))
+
+# --- КЭШ ПРИБЫЛИ МЕЖДУ ЗАПРОСАМИ ---
+# Строка CacheGeneration, которую сверяет profit_cache
+PROFIT_CACHE_GENERATION = 'profit'
+
+def ensure_cache_generation():
+    """Создаёт строку счётчика поколения (для баз, созданных db.create_all без миграции)"""
+    if db.session.get(CacheGeneration, PROFIT_CACHE_GENERATION) is None:
+        db.session.add(CacheGeneration(name=PROFIT_CACHE_GENERATION, value=0))
+        db.session.commit()
+
+def read_cache_generation():
+    """Поколение данных из базы; None, если счётчика нет — тогда кэш не наполняется"""
+    return db.session.execute(
+        db.select(CacheGeneration.value).where(CacheGeneration.name == PROFIT_CACHE_GENERATION)
+    ).scalar()
+
+def bump_cache_generation(session):
+    """
+    Увеличивает поколение в транзакции записи (один раз на транзакцию) и сразу
+    очищает кэш своего процесса. Текущий запрос до конца больше не наполняет
+    кэш: значения, посчитанные по незафиксированным данным, в нём не нужны.
+    """
+    if has_app_context():
+        g.profit_cache_generation = None
+        if 'profit_calculator' in g:
+            g.profit_calculator.generation = None
+    if session.info.get('cache_generation_bumped'):
+        return
+    table = CacheGeneration.__table__
+    session.connection().execute(
+        table.update().where(table.c.name == PROFIT_CACHE_GENERATION).values(value=table.c.value + 1)
+    )
+    session.info['cache_generation_bumped'] = True
+    profit_cache.invalidate()
+
+@event.listens_for(db.session, 'after_transaction_end')
+def reset_generation_bump(session, transaction):
+    session.info.pop('cache_generation_bumped', None)
+
+@event.listens_for(db.session, 'after_flush')
+def bump_generation_after_flush(session, flush_context):
+    """Запись отчётов, начальных балансов или аккаунтов через ORM меняет поколение"""
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if getattr(obj, '__tablename__', None) in PROFIT_CACHE_TABLES:
+            bump_cache_generation(session)
+            return
+
+@event.listens_for(db.session, 'do_orm_execute')
+def bump_generation_on_bulk_write(orm_execute_state):
+    """То же для массовых UPDATE/DELETE/INSERT (query.delete(), table.update()), минующих flush"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    table = getattr(orm_execute_state.statement, 'table', None)
+    if getattr(table, 'name', None) in PROFIT_CACHE_TABLES:
+        bump_cache_generation(orm_execute_state.session)
+
+@app.before_request
+def sync_profit_cache_generation():
+    """
+    Сверяет поколение с кэшем процесса в начале запроса, до чтения моделей:
+    иначе строки, загруженные до записи в другом процессе, попали бы в кэш
+    под новым поколением
+    """
+    try:
+        g.profit_cache_generation = profit_cache.sync(read_cache_generation())
+    except Exception as e:
+        # Нет таблицы cache_generation (база без миграции) — запрос работает без кэша
+        db.session.rollback()
+        g.profit_cache_generation = None
+        logger.debug(f"Поколение кэша прибыли не прочитано: {str(e)}")
+
+def profit_cache_generation():
+    """
+    Поколение данных, сверенное в начале запроса (sync_profit_cache_generation).
+    None — кэш не наполняется: запрос уже писал данные или поколение не прочитано.
+    """
+    return g.get('profit_cache_generation')
+
+# --- ПАКЕТНАЯ ЗАПИСЬ ОРДЕРОВ ---
+# Сколько ордеров проверяется на дубли одним запросом IN и вставляется одним INSERT
+ORDER_BULK_CHUNK_SIZE = 500
+
+# Базы, в которых insert_ignoring_conflicts пропускает дубли сама
+CONFLICT_IGNORING_DIALECTS = ('sqlite', 'postgresql', 'mysql', 'mariadb')
+
+def insert_ignoring_conflicts(table):
+    """
+    INSERT, при котором строки, нарушающие уникальность, пропускает сама база:
+    ON CONFLICT DO NOTHING в SQLite/PostgreSQL, INSERT IGNORE в MySQL
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(table).on_conflict_do_nothing()
+    if dialect in ('mysql', 'mariadb'):
+        return table.insert().prefix_with('IGNORE')
+    return table.insert()
+
+def find_existing_order_ids(platform, order_ids):
+    """Какие из order_ids уже сохранены для площадки (один запрос IN)"""
+    if not order_ids:
+        return set()
+    rows = db.session.execute(
+        db.select(Order.order_id).where(Order.platform == platform, Order.order_id.in_(order_ids))
+    )
+    return {row.order_id for row in rows}
+
+def bulk_insert_orders(rows):
+    """
+    Вставляет ордера одним пакетным INSERT (без создания ORM-объектов).
+
+    Returns:
+        int: сколько строк реально вставлено (конфликты база пропускает)
+    """
+    if not rows:
+        return 0
+    statement = insert_ignoring_conflicts(Order.__table__)
+    if db.engine.dialect.insert_executemany_returning:
+        # SQLite/PostgreSQL возвращают только вставленные строки — их и считаем
+        return len(db.session.execute(statement.returning(Order.__table__.c.id), rows).all())
+    result = db.session.execute(statement, rows)
+    return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(rows)
+
+def insert_new_orders(orders, platform, employee_id, account_name_for, seen_ids):
+    """
+    Сохраняет ордера, которых ещё нет в базе, в текущую транзакцию (без commit).
+    Ордера вставляются одним INSERT на пачку из ORDER_BULK_CHUNK_SIZE, дубли
+    по (platform, order_id) пропускает сама база, без чтения перед записью.
+    В базах без такого INSERT дубли сначала ищутся одним запросом IN на пачку.
+    
+    Args:
+        orders: список ParsedOrder
+        account_name_for: функция ордер -> имя аккаунта, к которому он привязывается
+        seen_ids: множество id, уже встреченных в этой загрузке (пополняется);
+            повтор ордера в файле считается дублем
+    
+    Returns:
+        tuple: (создано, пропущено дублей)
+    """
+    created_count = 0
+    skipped_count = 0
+    read_before_write = db.engine.dialect.name not in CONFLICT_IGNORING_DIALECTS
+    for chunk_start in range(0, len(orders), ORDER_BULK_CHUNK_SIZE):
+        chunk = orders[chunk_start:chunk_start + ORDER_BULK_CHUNK_SIZE]
+        existing_ids = (
+            find_existing_order_ids(platform, list({order.order_id for order in chunk} - seen_ids))
+            if read_before_write else set()
+        )
+        
+        rows = []
+        for order in chunk:
+            if order.order_id in seen_ids or order.order_id in existing_ids:
+                skipped_count += 1
+                seen_ids.add(order.order_id)
+                continue
+            seen_ids.add(order.order_id)
+            
+            rows.append({
+                'order_id': order.order_id,
+                'employee_id': employee_id,
+                'platform': platform,
+                'account_name': account_name_for(order),
+                'symbol': order.symbol,
+                'side': order.side,
+                'quantity': order.quantity,
+                'price': order.price,
+                'total_usdt': order.total_usdt,
+                'fees_usdt': order.fees_usdt,
+                'status': order.status,
+                'executed_at': order.executed_at
+            })
+        
+        # Строки, которые база отбросила по уникальности (ордер уже сохранён
+        # раньше или его успел записать параллельный запрос), считаются дублями
+        inserted = bulk_insert_orders(rows)
+        created_count += inserted
+        skipped_count += len(rows) - inserted
+    
+    return created_count, skipped_count
+
+class OrderWatermarks:
+    """
+    Отсекает ордера, уже загруженные из прежних выгрузок аккаунта, до проверки дублей в БД.
+    
+    Выгрузка аккаунта содержит все его ордера за свой период, поэтому после
+    загрузки интервал [самый ранний, самый поздний ордер аккаунта в файле]
+    считается загруженным полностью. Ордера строго внутри сохранённого
+    интервала пропускаются без запросов к базе; ордера на его границах
+    (в ту же секунду могли появиться новые) и вне его проверяются как обычно.
+    Пересекающиеся интервалы объединяются; если новая выгрузка с прежним
+    интервалом не пересекается, сохраняется более поздний из них.
+    
+    Использование (в одной транзакции с записью ордеров):
+        watermarks = OrderWatermarks(platform, force_full)
+        orders = watermarks.filter(orders, account_name_for)
+        ... insert_new_orders(orders, ...)
+        watermarks.save()
+    """
+    
+    def __init__(self, platform, force_full=False):
+        self.platform = platform
+        self.force_full = force_full
+        self.skipped = 0
+        self._seen = {}  # account_name -> [самый ранний, самый поздний] ордер этой загрузки
+        self._covered = {
+            watermark.account_name: (watermark.covered_from, watermark.covered_to)
+            for watermark in IngestionWatermark.query.filter_by(platform=platform)
+        }
+    
+    def filter(self, orders, account_name_for):
+        """Запоминает время ордеров по аккаунтам и возвращает ордера, которые нужно проверить в БД"""
+        kept = []
+        for order in orders:
+            # Время ордера с неразборчивой датой выставлено при разборе — интервал по нему не считаем
+            if order.undated:
+                kept.append(order)
+                continue
+            account_name = account_name_for(order)
+            executed_at = order.executed_at
+            seen = self._seen.get(account_name)
+            if seen is None:
+                self._seen[account_name] = [executed_at, executed_at]
+            elif executed_at < seen[0]:
+                seen[0] = executed_at
+            elif executed_at > seen[1]:
+                seen[1] = executed_at
+            
+            covered = self._covered.get(account_name)
+            if not self.force_full and covered and covered[0] < executed_at < covered[1]:
+                self.skipped += 1
+                continue
+            kept.append(order)
+        return kept
+    
+    def save(self):
+        """Расширяет загруженные интервалы аккаунтов в текущей транзакции (без commit)"""
+        if not self._seen:
+            return
+        # Строки аккаунтов создаются без ошибки, если их параллельно создал другой запрос
+        bulk_rows = [
+            {'platform': self.platform, 'account_name': account_name, 'covered_from': low, 'covered_to': high}
+            for account_name, (low, high) in self._seen.items()
+            if account_name not in self._covered
+        ]
+        if bulk_rows:
+            db.session.execute(insert_ignoring_conflicts(IngestionWatermark.__table__), bulk_rows)
+        
+        watermarks = IngestionWatermark.query.filter(
+            IngestionWatermark.platform == self.platform,
+            IngestionWatermark.account_name.in_(list(self._seen))
+        ).all()
+        for watermark in watermarks:
+            low, high = self._seen[watermark.account_name]
+            if low <= watermark.covered_to and high >= watermark.covered_from:
+                watermark.covered_from = min(watermark.covered_from, low)
+                watermark.covered_to = max(watermark.covered_to, high)
+            elif high > watermark.covered_to:
+                watermark.covered_from = low
+                watermark.covered_to = high
+        
+        if self.skipped:
+            logger.info(f"{self.platform}: пропущено {self.skipped} ордеров из уже загруженных интервалов")
+
 # API Endpoints
 @app.route('/')
 def index():
@@ -1018,6 +975,7 @@ def delete_account(account_id):
             return jsonify({'error': 'Аккаунт не найден'}), 404
         db.session.delete(account)
         db.session.commit()
+        schedule_profit_refresh()
         return jsonify({'message': 'Аккаунт удален'})
     except Exception as e:
         db.session.rollback()
@@ -1102,13 +1060,17 @@ def safe_int(value, default=0):
     except (ValueError, TypeError):
         return default
 
-def save_report_file(file, platform, report_id):
+def save_report_file(file, platform, report_id, account_id=None):
     """Сохраняет файл выгрузки для отчета"""
     if not file or not file.filename:
         return None
         
-    # Создаем безопасное имя файла
-    filename = secure_filename(f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{file.filename}")
+    # Создаем безопасное имя файла (с ID аккаунта, чтобы одноимённые выгрузки
+    # разных аккаунтов одной смены не перезаписали друг друга)
+    prefix = datetime.now().strftime('%Y%m%d_%H%M%S')
+    if account_id is not None:
+        prefix = f"{prefix}_{platform}_{account_id}"
+    filename = secure_filename(f"{prefix}_{file.filename}")
     file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
     
     # Сохраняем файл
@@ -1217,7 +1179,10 @@ def create_report():
                 shift_end_time=datetime.strptime(form['shift_end_time'], '%Y-%m-%dT%H:%M') if form.get('shift_end_time') else None
             )
             db.session.add(report)
+            db.session.flush()
+            record_report_balances(report)
             db.session.commit()
+            schedule_profit_refresh()
             
             # Обрабатываем файлы выгрузок с автоматической проверкой времени
             files_data = {}
@@ -1228,20 +1193,17 @@ def create_report():
             if file_paths['bliss_file']:
                 files_data['bliss'] = os.path.join(app.config['UPLOAD_FOLDER'], file_paths['bliss_file'])
             
-            # Обрабатываем файлы с проверкой времени
+            # Ставим обработку файлов с проверкой времени в очередь
             if files_data and report.shift_start_time and report.shift_end_time:
-                file_stats = process_shift_files(
-                    report.id,
-                    report.employee_id,
-                    report.shift_start_time,
-                    report.shift_end_time,
-                    files_data
-                )
+                # Файлы обрабатываются фоновой задачей, ход обработки — /api/jobs/<job_id>
+                job = enqueue_shift_files_job(report, files_data, parse_bool(form.get('force_full', False)))
                 
                 return jsonify({
                     'id': report.id, 
                     'message': 'Report created successfully',
-                    'file_processing': file_stats
+                    'job_id': job.id,
+                    'job_status': job.status,
+                    'file_processing': job_queue.describe(job)['result']
                 })
             else:
                 # Привязываем ордера к сотруднику на основе времени смены
@@ -1322,7 +1284,10 @@ def create_report():
                 shift_end_time=datetime.strptime(data['shift_end_time'], '%Y-%m-%dT%H:%M') if data.get('shift_end_time') else None
             )
             db.session.add(report)
+            db.session.flush()
+            record_report_balances(report)
             db.session.commit()
+            schedule_profit_refresh()
             
             # Обрабатываем файлы выгрузок с автоматической проверкой времени
             files_data = {}
@@ -1333,20 +1298,17 @@ def create_report():
             if data.get('bliss_file'):
                 files_data['bliss'] = data['bliss_file']
             
-            # Обрабатываем файлы с проверкой времени
+            # Ставим обработку файлов с проверкой времени в очередь
             if files_data and report.shift_start_time and report.shift_end_time:
-                file_stats = process_shift_files(
-                    report.id,
-                    report.employee_id,
-                    report.shift_start_time,
-                    report.shift_end_time,
-                    files_data
-                )
+                # Файлы обрабатываются фоновой задачей, ход обработки — /api/jobs/<job_id>
+                job = enqueue_shift_files_job(report, files_data, parse_bool(data.get('force_full', False)))
                 
                 return jsonify({
                     'id': report.id, 
                     'message': 'Report created successfully',
-                    'file_processing': file_stats
+                    'job_id': job.id,
+                    'job_status': job.status,
+                    'file_processing': job_queue.describe(job)['result']
                 })
             else:
                 # Привязываем ордера к сотруднику на основе времени смены
@@ -1381,20 +1343,40 @@ def delete_report(report_id):
         report = db.session.get(ShiftReport, report_id)
         if not report:
             return jsonify({'error': 'Отчет не найден'}), 404
+        invalidate_later_report_profits(report)
+        AccountBalanceLedger.query.filter_by(report_id=report.id).delete(synchronize_session=False)
         db.session.delete(report)
         db.session.commit()
+        schedule_profit_refresh()
         return jsonify({'message': 'Отчет удален'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Ошибка при удалении отчета: {str(e)}'}), 500
 
-def calculate_employee_stats(reports, employees, db):
-    """Вычисляет статистику по сотрудникам для дашборда (кол-во заявок, прибыль и т.д.)."""
+def profit_calculator():
+    """
+    Калькулятор прибыли текущего запроса (utils.ProfitCalculator): каждый отчёт считается
+    один раз, посчитанное переиспользуется между запросами через profit_cache.
+    Вне запроса (фоновые задачи, скрипты) поколение не сверялось до чтения
+    данных, поэтому кэш процесса не используется.
+    """
+    if 'profit_calculator' not in g:
+        if has_request_context() and 'profit_cache_generation' in g:
+            g.profit_calculator = ProfitCalculator(db.session, profit_cache, profit_cache_generation())
+        else:
+            g.profit_calculator = ProfitCalculator(db.session)
+    return g.profit_calculator
+
+def calculate_employee_stats(reports, employees, db, profits):
+    """
+    Вычисляет статистику по сотрудникам для дашборда (кол-во заявок, прибыль и т.д.).
+    profits — суммы прибыли по сотрудникам из report_profit_sums(..., by_employee=True).
+    """
     stats = []
     for emp in employees:
         emp_reports = [r for r in reports if r.employee_id == emp.id]
         emp_requests = sum((r.bybit_requests or 0) + (r.htx_requests or 0) + (r.bliss_requests or 0) for r in emp_reports)
-        emp_profit = sum(calculate_report_profit(db.session, r)['profit'] for r in emp_reports)
+        emp_profit = profits.get(emp.id, {}).get('profit', 0.0)
         emp_shifts = len(emp_reports)
         avg_profit_per_shift = emp_profit / emp_shifts if emp_shifts else 0
         stats.append({
@@ -1412,21 +1394,18 @@ def calculate_last_reports(db, last_reports_query):
     """Формирует список последних смен с расчетом прибыли и балансов по площадкам для дашборда."""
     last_reports = []
     for r in last_reports_query:
-        profit_data = calculate_report_profit(db.session, r)
-        try:
-            balances = json.loads(r.balances_json or '{}')
-        except json.JSONDecodeError:
-            balances = {}
+        profit_data = profit_calculator().profit(r)
+        balances = report_balances(r)
         emp = db.session.get(Employee, r.employee_id)
         employee_name = emp.name if emp else '—'
         platform_stats = {}
         for platform in ['bybit','htx','bliss','gate']:
-            accounts_list = balances.get(platform, [])
+            accounts_list = balances.accounts(platform)
             count = len(accounts_list)
             sum_delta = 0
             for acc in accounts_list:
-                prev = find_prev_balance(db.session, acc.get('account_id') or acc.get('id'), platform, r)
-                cur = float(acc.get('balance', 0)) if acc.get('balance') not in (None, '') else 0
+                prev = profit_calculator().prev_balance(acc.account_id, platform, r)
+                cur = acc.balance or 0
                 sum_delta += cur - prev
             platform_stats[platform] = {'count': count, 'delta': round(sum_delta,2)}
         profit = sum(platform_stats[p]['delta'] for p in platform_stats)
@@ -1473,28 +1452,27 @@ def get_dashboard_data():
         ShiftReport.shift_date >= start_date,
         ShiftReport.shift_date <= end_date
     ).all()
+    profit_calculator().prepare_profits(reports)
     # --- Общая прибыль за выбранный период (оставляем для других целей) ---
-    total_profit = sum(calculate_report_profit(db.session, r)['salary_profit'] for r in reports)
+    total_profit = report_profit_sums(
+        ShiftReport.shift_date >= start_date,
+        ShiftReport.shift_date <= end_date
+    )['salary_profit']
     # --- Общий объем: сумма всех end_balance по всем аккаунтам на конец последней смены ---
     accounts = Account.query.filter_by(is_active=True).all()
     last_report = max(reports, key=lambda r: (r.shift_date, 0 if r.shift_type=='morning' else 1), default=None)
     total_volume = 0.0
     if last_report:
-        try:
-            balances = json.loads(last_report.balances_json or '{}')
-        except:
-            balances = {}
+        balances = report_balances(last_report)
         for platform in ['bybit','htx','bliss','gate']:
-            if balances.get(platform):
-                for acc in balances[platform]:
-                    end = float(acc.get('end_balance', 0) or 0)
-                    total_volume += end
+            for acc in balances.accounts(platform):
+                total_volume += acc.end_balance or 0.0
     total_requests = sum((r.bybit_requests or 0) + (r.htx_requests or 0) + (r.bliss_requests or 0) for r in reports)
     morning_profit = 0
     evening_profit = 0
     reports_with_net = []
     for r in reports:
-        profit_data = calculate_report_profit(db.session, r)
+        profit_data = profit_calculator().profit(r)
         net_profit = profit_data['project_profit']
         if r.shift_type == 'morning':
             morning_profit += net_profit
@@ -1532,9 +1510,14 @@ def get_dashboard_data():
         ShiftReport.shift_date >= month_start,
         ShiftReport.shift_date <= month_end
     ).all()
+    month_profits = report_profit_sums(
+        ShiftReport.shift_date >= month_start,
+        ShiftReport.shift_date <= month_end,
+        by_employee=True
+    )
     employees = Employee.query.filter_by(is_active=True).all()
-    employee_stats = calculate_employee_stats(month_reports, employees, db)
-    month_total_profit = sum(calculate_report_profit(db.session, r)['profit'] for r in month_reports)
+    employee_stats = calculate_employee_stats(month_reports, employees, db, month_profits)
+    month_total_profit = sum(totals['profit'] for totals in month_profits.values())
     month_total_requests = sum((r.bybit_requests or 0) + (r.htx_requests or 0) + (r.bliss_requests or 0) for r in month_reports)
     # --- LAST REPORTS (3 последних смены) ---
     last_reports_query = ShiftReport.query.order_by(ShiftReport.shift_date.desc(), ShiftReport.created_at.desc()).limit(3).all()
@@ -1572,7 +1555,11 @@ def settings_balances():
             # Ожидаем список балансов: [{platform, account_name, balance}]
             if not data.get('balances') or not isinstance(data['balances'], list):
                 return jsonify({'error': 'Необходимо передать список balances'}), 400
+            previous = {}
+            for b in InitialBalance.query.all():
+                previous.setdefault((b.platform, b.account_name), float(b.balance))
             InitialBalance.query.delete()
+            current = {}
             for item in data.get('balances', []):
                 if not item.get('platform') or not item.get('account_name'):
                     return jsonify({'error': 'Каждый баланс должен содержать platform и account_name'}), 400
@@ -1582,7 +1569,10 @@ def settings_balances():
                     balance=item['balance']
                 )
                 db.session.add(b)
+                current.setdefault((b.platform, b.account_name), safe_float(b.balance, None))
+            invalidate_initial_balance_profits(previous, current)
             db.session.commit()
+            schedule_profit_refresh()
             return jsonify({'message': 'Начальные балансы сохранены'})
         except Exception as e:
             db.session.rollback()
@@ -1621,8 +1611,8 @@ def calculate_employee_statistics(reports, emp, db):
     total_scam = float(sum(r.scam_amount or 0 for r in reports if getattr(r, 'scam_personal', False)))
     total_transfer = float(sum(r.dokidka_amount or 0 for r in reports))
     # Считаем прибыль по новой логике
-    total_project_profit = sum(calculate_report_profit(db.session, r)['project_profit'] for r in reports)
-    total_salary_profit = sum(calculate_report_profit(db.session, r)['salary_profit'] for r in reports)
+    total_project_profit = sum(profit_calculator().profit(r)['project_profit'] for r in reports)
+    total_salary_profit = sum(profit_calculator().profit(r)['salary_profit'] for r in reports)
     # Используем индивидуальный процент сотрудника, если задан, иначе 30%
     salary_percent = emp.salary_percent if emp.salary_percent is not None else 30.0
     salary = max(0, total_salary_profit * (salary_percent / 100))
@@ -1662,14 +1652,19 @@ def statistics():
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
     employees = Employee.query.filter_by(is_active=True).all()
+    # Отчёты всех сотрудников за период читаются и считаются за один проход
+    reports = ShiftReport.query.filter(
+        ShiftReport.employee_id.in_([emp.id for emp in employees]),
+        ShiftReport.shift_date >= start_date,
+        ShiftReport.shift_date <= end_date
+    ).order_by(ShiftReport.id).all()
+    profit_calculator().prepare_profits(reports)
+    reports_by_employee = {}
+    for r in reports:
+        reports_by_employee.setdefault(r.employee_id, []).append(r)
     stats = []
     for emp in employees:
-        reports = ShiftReport.query.filter(
-            ShiftReport.employee_id == emp.id,
-            ShiftReport.shift_date >= start_date,
-            ShiftReport.shift_date <= end_date
-        ).all()
-        stats.append(calculate_employee_statistics(reports, emp, db))
+        stats.append(calculate_employee_statistics(reports_by_employee.get(emp.id, []), emp, db))
     return jsonify(stats)
 
 @app.route('/logout')
@@ -1847,8 +1842,10 @@ def create_order():
         if not employee:
             return jsonify({'error': 'Сотрудник не найден'}), 404
         
-        # Проверяем, что ордер еще не существует
-        existing_order = Order.query.filter_by(order_id=data['order_id']).first()
+        # Проверяем, что ордер еще не существует на этой площадке
+        existing_order = Order.query.filter_by(
+            platform=data.get('platform', 'bybit'), order_id=data['order_id']
+        ).first()
         if existing_order:
             return jsonify({'error': 'Ордер уже существует'}), 409
         
@@ -1880,6 +1877,171 @@ def create_order():
         db.session.rollback()
         return jsonify({'error': f'Ошибка создания ордера: {str(e)}'}), 500
 
+# Сколько ордеров принимается одним пакетом и сколько часов хранится ответ по ключу идемпотентности
+ORDER_BATCH_MAX_ITEMS = int(os.environ.get('ORDER_BATCH_MAX_ITEMS', 1000))
+ORDER_BATCH_KEY_TTL_HOURS = int(os.environ.get('ORDER_BATCH_KEY_TTL_HOURS', 24))
+_order_batch_last_prune = 0.0
+
+def prune_order_batches():
+    """Удаляет просроченные ключи идемпотентности (не чаще раза в час на процесс)"""
+    global _order_batch_last_prune
+    now = time.monotonic()
+    if now - _order_batch_last_prune < 3600:
+        return
+    _order_batch_last_prune = now
+    deadline = datetime.utcnow() - timedelta(hours=ORDER_BATCH_KEY_TTL_HOURS)
+    db.session.execute(db.delete(OrderBatch).where(OrderBatch.created_at < deadline))
+
+def build_batch_order_row(item, known_employee_ids):
+    """
+    Проверяет ордер из пакета и готовит строку для вставки.
+
+    Returns:
+        tuple: (строка, None) или (None, текст ошибки)
+    """
+    if not isinstance(item, dict):
+        return None, 'Ордер должен быть объектом'
+    for field in ['order_id', 'employee_id', 'symbol', 'side', 'quantity', 'price', 'total_usdt']:
+        if not item.get(field):
+            return None, f'Отсутствует обязательное поле: {field}'
+    try:
+        employee_id = int(item['employee_id'])
+    except (TypeError, ValueError):
+        return None, 'Некорректный employee_id'
+    if employee_id not in known_employee_ids:
+        return None, 'Сотрудник не найден'
+    try:
+        executed_at = datetime.fromisoformat(item['executed_at']) if item.get('executed_at') else datetime.utcnow()
+    except (TypeError, ValueError):
+        return None, 'Некорректная дата executed_at'
+    return {
+        'order_id': str(item['order_id']),
+        'employee_id': employee_id,
+        'platform': item.get('platform', 'bybit'),
+        'account_name': item.get('account_name', ''),
+        'symbol': item['symbol'],
+        'side': item['side'],
+        'quantity': item['quantity'],
+        'price': item['price'],
+        'total_usdt': item['total_usdt'],
+        'fees_usdt': item.get('fees_usdt', 0),
+        'status': item.get('status', 'filled'),
+        'executed_at': executed_at
+    }, None
+
+@app.route('/api/orders/batch', methods=['POST'])
+def create_orders_batch():
+    """
+    Пакетное создание ордеров от расширения Bybit.
+
+    Тело: {"idempotency_key": "...", "orders": [{...}, ...]} (ключ можно
+    передать и заголовком Idempotency-Key). Сотрудники проверяются одним
+    запросом на пакет, дубли — одним запросом IN, все новые ордера пишутся
+    одной транзакцией. Повтор пакета с тем же ключом возвращает сохранённый
+    ответ, ничего не записывая.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Нет данных'}), 400
+
+        key = str(request.headers.get('Idempotency-Key') or data.get('idempotency_key') or '').strip()
+        if not key:
+            return jsonify({'error': 'Отсутствует ключ идемпотентности (idempotency_key)'}), 400
+        if len(key) > 100:
+            return jsonify({'error': 'Ключ идемпотентности длиннее 100 символов'}), 400
+
+        items = data.get('orders')
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'Не переданы ордера (orders)'}), 400
+        if len(items) > ORDER_BATCH_MAX_ITEMS:
+            return jsonify({'error': f'Слишком много ордеров в пакете: {len(items)} (максимум {ORDER_BATCH_MAX_ITEMS})'}), 413
+
+        stored = OrderBatch.query.filter_by(idempotency_key=key).first()
+        if stored:
+            return jsonify(dict(json.loads(stored.response_json), replayed=True))
+
+        # Один запрос на всех сотрудников пакета
+        employee_ids = set()
+        for item in items:
+            try:
+                employee_ids.add(int(item.get('employee_id')))
+            except (AttributeError, TypeError, ValueError):
+                pass
+        known_employee_ids = set(db.session.execute(
+            db.select(Employee.id).where(Employee.id.in_(employee_ids))
+        ).scalars()) if employee_ids else set()
+
+        results = []
+        rows = []
+        for index, item in enumerate(items):
+            row, error = build_batch_order_row(item, known_employee_ids)
+            order_id = row['order_id'] if row else (item.get('order_id') if isinstance(item, dict) else None)
+            if error:
+                results.append({'index': index, 'order_id': order_id, 'status': 'invalid', 'error': error})
+            else:
+                results.append({'index': index, 'order_id': order_id, 'status': 'created'})
+                rows.append((index, row))
+
+        # Номер ордера уникален в пределах площадки: дубли ищутся по (platform, order_id),
+        # чтобы вернуть статус каждого ордера
+        seen_keys = set()
+        for chunk_start in range(0, len(rows), ORDER_BULK_CHUNK_SIZE):
+            chunk = rows[chunk_start:chunk_start + ORDER_BULK_CHUNK_SIZE]
+            chunk_ids = {}
+            for _, row in chunk:
+                if (row['platform'], row['order_id']) not in seen_keys:
+                    chunk_ids.setdefault(row['platform'], set()).add(row['order_id'])
+            existing_keys = {
+                (platform, order_id)
+                for platform, order_ids in chunk_ids.items()
+                for order_id in find_existing_order_ids(platform, list(order_ids))
+            }
+
+            new_rows = []
+            for index, row in chunk:
+                row_key = (row['platform'], row['order_id'])
+                if row_key in seen_keys or row_key in existing_keys:
+                    results[index]['status'] = 'duplicate'
+                else:
+                    new_rows.append(row)
+                seen_keys.add(row_key)
+
+            inserted = bulk_insert_orders(new_rows)
+            if inserted < len(new_rows):
+                # Часть ордеров успела записать параллельная загрузка: они уже в базе
+                logger.warning("Пакет %s: база пропустила %d ордеров как дубли", key, len(new_rows) - inserted)
+
+        response = {
+            'idempotency_key': key,
+            'created': sum(1 for r in results if r['status'] == 'created'),
+            'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+            'invalid': sum(1 for r in results if r['status'] == 'invalid'),
+            'results': results
+        }
+
+        prune_order_batches()
+        db.session.add(OrderBatch(idempotency_key=key, response_json=json.dumps(response, ensure_ascii=False)))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Тот же пакет параллельно принял другой запрос — отдаём его ответ
+            db.session.rollback()
+            stored = OrderBatch.query.filter_by(idempotency_key=key).first()
+            if not stored:
+                raise
+            return jsonify(dict(json.loads(stored.response_json), replayed=True))
+
+        logger.info(
+            "Пакет ордеров %s: создано %d, дублей %d, с ошибками %d",
+            key, response['created'], response['duplicates'], response['invalid']
+        )
+        return jsonify(dict(response, replayed=False))
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Ошибка пакетного создания ордеров: {str(e)}'}), 500
+
 @app.route('/api/orders/<int:order_id>', methods=['PUT'])
 def update_order(order_id):
     """Обновляет статус ордера"""
@@ -2047,6 +2209,8 @@ def upload_orders():
         employee_id = request.form.get('employee_id')
         platform = request.form.get('platform')
         account_name = request.form.get('account_name')
+        # force_full — проверить все ордера файла, не пропуская уже загруженные интервалы
+        force_full = parse_bool(request.form.get('force_full', False))
         
         if not employee_id or not platform or not account_name:
             return jsonify({'error': 'Не указаны обязательные поля'}), 400
@@ -2055,12 +2219,10 @@ def upload_orders():
         start_date_str = request.form.get('start_date')
         end_date_str = request.form.get('end_date')
         
-        print(f"\nDEBUG UPLOAD: Параметры запроса:")
-        print(f"DEBUG UPLOAD: employee_id = {employee_id}")
-        print(f"DEBUG UPLOAD: platform = {platform}")
-        print(f"DEBUG UPLOAD: account_name = {account_name}")
-        print(f"DEBUG UPLOAD: start_date_str = {start_date_str}")
-        print(f"DEBUG UPLOAD: end_date_str = {end_date_str}")
+        logger.debug(
+            f"Загрузка ордеров: employee_id={employee_id}, platform={platform}, "
+            f"account_name={account_name}, период {start_date_str} - {end_date_str}"
+        )
         
         start_date = None
         end_date = None
@@ -2069,7 +2231,6 @@ def upload_orders():
         if start_date_str:
             try:
                 start_date = datetime.strptime(start_date_str, '%Y-%m-%dT%H:%M')
-                print(f"DEBUG UPLOAD: start_date = {start_date}")
             except ValueError:
                 return jsonify({'error': 'Неверный формат начальной даты'}), 400
         
@@ -2077,7 +2238,6 @@ def upload_orders():
         if end_date_str:
             try:
                 end_date = datetime.strptime(end_date_str, '%Y-%m-%dT%H:%M')
-                print(f"DEBUG UPLOAD: end_date = {end_date}")
             except ValueError:
                 return jsonify({'error': 'Неверный формат конечной даты'}), 400
         
@@ -2125,53 +2285,38 @@ def upload_orders():
         filename = f"{timestamp}_{safe_name}"
         filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         
-        print(f"DEBUG UPLOAD: Сохраняем файл: {filepath}")
+        logger.debug(f"Загрузка ордеров: сохраняем файл {filepath}")
         file.save(filepath)
         
-        # Обрабатываем файл с фильтрацией по времени, передаем оригинальное имя для определения типа
-        orders_data = parse_orders_file(filepath, platform, start_date, end_date, original_filename)
-        print(f"DEBUG UPLOAD: Получено {len(orders_data)} ордеров из файла")
-        
-        # Сохраняем ордера в базу данных
-        created_orders = []
-        skipped_orders = []
-        
-        for order_data in orders_data:
-            # Проверяем, что ордер еще не существует
-            existing_order = Order.query.filter_by(
-                order_id=order_data['order_id'],
-                platform=platform
-            ).first()
-            if existing_order:
-                skipped_orders.append(order_data['order_id'])
-                continue
-            
-            # Создаем новый ордер
-            order = Order(
-                order_id=order_data['order_id'],
-                employee_id=employee_id,
-                platform=platform,
-                account_name=order_data.get('account_name') or account_name,  # Используем account_name из order_data, если есть
-                symbol=order_data['symbol'],
-                side=order_data['side'],
-                quantity=order_data['quantity'],
-                price=order_data['price'],
-                total_usdt=order_data['total_usdt'],
-                fees_usdt=order_data.get('fees_usdt', 0),
-                status=order_data.get('status', 'filled'),
-                executed_at=order_data['executed_at']
+        # Обрабатываем файл потоково с фильтрацией по времени: в памяти одновременно
+        # только одна пачка ордеров, дубли проверяются и новые ордера вставляются пачками
+        created_count = 0
+        skipped_count = 0
+        total_parsed = 0
+        seen_ids = set()
+        watermarks = OrderWatermarks(platform, force_full)
+        account_name_for = lambda order: account_name
+        
+        for orders_batch in iter_orders_file(filepath, platform, start_date, end_date):
+            total_parsed += len(orders_batch)
+            created, skipped = insert_new_orders(
+                watermarks.filter(orders_batch, account_name_for), platform, employee.id,
+                account_name_for,
+                seen_ids
             )
-            
-            db.session.add(order)
-            created_orders.append(order_data['order_id'])
-            print(f"DEBUG UPLOAD: Создан ордер {order_data['order_id']}")
-        
+            created_count += created
+            skipped_count += skipped
+
+        logger.debug(f"Загрузка ордеров: получено {total_parsed} ордеров из файла")
+        watermarks.save()
         db.session.commit()
         
+        # Ордера из уже загруженных интервалов — тоже дубли, только найденные без запросов к БД
+        skipped_count += watermarks.skipped
+        
         # Формируем сообщение о результате
-        message = f'Загружено {len(created_orders)} ордеров, пропущено {len(skipped_orders)} дублей'
+        message = f'Загружено {created_count} ордеров, пропущено {skipped_count} дублей'
         if start_date or end_date:
-            total_parsed = len(orders_data)
             message += f', обработано {total_parsed} ордеров из файла'
             if start_date:
                 message += f' с {start_date.strftime("%d.%m.%Y %H:%M")}'
@@ -2180,9 +2325,10 @@ def upload_orders():
         
         return jsonify({
             'success': True,
-            'count': len(created_orders),
-            'skipped': len(skipped_orders),
-            'total_parsed': len(orders_data),
+            'count': created_count,
+            'skipped': skipped_count,
+            'skipped_by_watermark': watermarks.skipped,
+            'total_parsed': total_parsed,
             'message': message
         })
         
@@ -2190,6 +2336,36 @@ def upload_orders():
         db.session.rollback()
         return jsonify({'error': f'Ошибка обработки файла: {str(e)}'}), 500
 
+@app.route('/api/orders/columns', methods=['POST'])
+def resolve_order_columns():
+    """Показывает, как колонки загруженного файла сопоставляются с полями ордера"""
+    try:
+        platform = (request.form.get('platform') or '').lower()
+        if platform not in COLUMN_RULES:
+            return jsonify({'error': 'Неизвестная платформа'}), 400
+        
+        if 'file' not in request.files or request.files['file'].filename == '':
+            return jsonify({'error': 'Файл не загружен'}), 400
+        
+        file = request.files['file']
+        if not allowed_file(file.filename):
+            return jsonify({'error': 'Неподдерживаемый тип файла'}), 400
+        
+        # Файл нужен только для чтения заголовка, в uploads его не сохраняем
+        file_ext = os.path.splitext(file.filename)[1].lower()
+        fd, filepath = tempfile.mkstemp(suffix=file_ext)
+        os.close(fd)
+        try:
+            file.save(filepath)
+            columns = read_order_header(filepath, platform)
+        finally:
+            os.remove(filepath)
+        
+        return jsonify(describe_columns(platform, columns))
+        
+    except Exception as e:
+        return jsonify({'error': f'Ошибка чтения файла: {str(e)}'}), 500
+
 @app.route('/api/platform-balances', methods=['GET'])
 def get_platform_balances():
     """Возвращает текущие балансы по всем площадкам"""
@@ -2213,10 +2389,7 @@ def get_platform_balances():
         account_balances = {}  # {platform: {account_name: {balance, last_update_info}}}
         
         for report in all_reports:
-            try:
-                balances = json.loads(report.balances_json or '{}')
-            except json.JSONDecodeError:
-                continue
+            balances = report_balances(report)
                 
             employee = db.session.get(Employee, report.employee_id)
             employee_name = employee.name if employee else 'Неизвестный сотрудник'
@@ -2225,21 +2398,14 @@ def get_platform_balances():
                 if platform not in account_balances:
                     account_balances[platform] = {}
                     
-                platform_accounts = balances.get(platform, [])
-                for acc in platform_accounts:
-                    account_name = acc.get('account_name', 'Неизвестный аккаунт')
+                for acc in balances.accounts(platform):
+                    account_name = acc.account_name or 'Неизвестный аккаунт'
                     
                     # Если для этого аккаунта ещё нет записи, добавляем её
                     if account_name not in account_balances[platform]:
-                        try:
-                            balance_str = acc.get('end_balance', '0')
-                            balance = float(balance_str) if balance_str and balance_str != '' else 0.0
-                        except (ValueError, TypeError):
-                            balance = 0.0
-                            
                         account_balances[platform][account_name] = {
-                            'balance': balance,
-                            'account_id': acc.get('account_id') or acc.get('id'),
+                            'balance': acc.end_balance or 0.0,
+                            'account_id': acc.account_id,
                             'last_update': {
                                 'date': report.shift_date.isoformat(),
                                 'shift_type': report.shift_type,
@@ -2323,41 +2489,29 @@ def get_employee_profile(employee_id):
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
             end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
         
-        print(f"🔍 Ищем отчеты за период: {start_date} - {end_date}")
-        
         # Получаем сотрудника
         employee = Employee.query.get_or_404(employee_id)
         
-        # Сначала проверим все отчеты этого сотрудника
-        all_reports = ShiftReport.query.filter(
-            ShiftReport.employee_id == employee_id
-        ).order_by(ShiftReport.shift_date.desc()).all()
-        
         # Получаем все отчеты сотрудника за период
         reports = ShiftReport.query.filter(
             ShiftReport.employee_id == employee_id,
             ShiftReport.shift_date >= start_date,
             ShiftReport.shift_date <= end_date
         ).order_by(ShiftReport.shift_date.desc()).all()
+        profit_calculator().prepare(reports)
         
-        # Отладочная информация
-        print(f"🔍 Профиль сотрудника {employee.name} (ID: {employee_id})")
-        print(f"📅 Период: {start_date} - {end_date}")
-        print(f"📊 Всего отчетов у сотрудника: {len(all_reports)}")
-        if all_reports:
-            print("📋 Все отчеты сотрудника:")
-            for r in all_reports:
-                print(f"   - {r.shift_date} ({r.shift_type}) - {r.total_requests} заявок")
-        print(f"📊 Найдено отчетов за период: {len(reports)}")
-        for i, report in enumerate(reports):
-            print(f"  📋 Отчет {i+1}: {report.shift_date} ({report.shift_type})")
-            print(f"    Всего заявок: {report.total_requests}")
-            print(f"    Bybit: {report.bybit_requests}, HTX: {report.htx_requests}, Bliss: {report.bliss_requests}")
-            print(f"    Балансы JSON: {report.balances_json[:100]}...")
-            profit_data = calculate_report_profit(db.session, report)
-            print(f"    Прибыль: {profit_data}")
-            print(f"    Скам: {report.scam_amount}, Докидка: {report.dokidka_amount}")
-            print("    ---")
+        logger.debug(
+            f"Профиль сотрудника {employee.name} (ID: {employee_id}), период {start_date} - {end_date}: "
+            f"найдено отчетов {len(reports)}"
+        )
+        # Подробный дамп отчетов собирается только при включённом DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, report in enumerate(reports):
+                logger.debug(
+                    f"Отчет {i+1}: {report.shift_date} ({report.shift_type}), заявок {report.total_requests} "
+                    f"(Bybit: {report.bybit_requests}, HTX: {report.htx_requests}, Bliss: {report.bliss_requests}), "
+                    f"скам {report.scam_amount}, докидка {report.dokidka_amount}, балансы {report.balances_json[:100]}..."
+                )
         
         # Автоматически привязываем ордера к отчетам сотрудника
         from utils import link_orders_to_employee
@@ -2367,10 +2521,10 @@ def get_employee_profile(employee_id):
                 linked_count = link_orders_to_employee(db.session, report)
                 total_linked += linked_count
                 if linked_count > 0:
-                    print(f"🔗 Привязано {linked_count} ордеров к отчету от {report.shift_date}")
+                    logger.debug(f"Привязано {linked_count} ордеров к отчету от {report.shift_date}")
         
         if total_linked > 0:
-            print(f"🔗 Всего привязано {total_linked} ордеров к отчетам сотрудника")
+            logger.debug(f"Всего привязано {total_linked} ордеров к отчетам сотрудника")
         
         # Получаем все ордера сотрудника за период
         orders = Order.query.filter(
@@ -2379,18 +2533,16 @@ def get_employee_profile(employee_id):
             Order.executed_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time())
         ).all()
         
-        print("🔧 Начинаем расчет основной статистики...")
+        logger.debug("Начинаем расчет основной статистики...")
         try:
             # Основная статистика
             basic_stats = calculate_employee_statistics(reports, employee, db)
-            print(f"✅ Основная статистика: {basic_stats}")
+            logger.debug(f"Основная статистика: {basic_stats}")
         except Exception as e:
-            print(f"❌ Ошибка при расчете основной статистики: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Ошибка при расчете основной статистики: {str(e)}")
             basic_stats = {}
         
-        print("🔧 Начинаем расчет детальной статистики по отчетам...")
+        logger.debug("Начинаем расчет детальной статистики по отчетам...")
         # Детальная статистика по отчетам
         report_details = []
         total_project_profit = 0
@@ -2398,48 +2550,39 @@ def get_employee_profile(employee_id):
         platform_profits = {'bybit': 0, 'htx': 0, 'bliss': 0, 'gate': 0}
         
         for i, report in enumerate(reports):
-            print(f"🔧 Обрабатываем отчет {i+1}/{len(reports)}: {report.shift_date}")
+            logger.debug(f"Обрабатываем отчет {i+1}/{len(reports)}: {report.shift_date}")
             try:
-                profit_data = calculate_report_profit(db.session, report)
-                print(f"✅ Прибыль рассчитана: {profit_data}")
+                profit_data = profit_calculator().profit(report)
+                logger.debug(f"Прибыль рассчитана: {profit_data}")
                 total_project_profit += profit_data['project_profit']
                 total_salary_profit += profit_data['salary_profit']
             except Exception as e:
-                print(f"❌ Ошибка при расчете прибыли для отчета {report.shift_date}: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception(f"Ошибка при расчете прибыли для отчета {report.shift_date}: {str(e)}")
                 profit_data = {'project_profit': 0, 'salary_profit': 0, 'profit': 0, 'scam': 0, 'dokidka': 0, 'internal': 0}
             
             # Парсим балансы
-            print(f"🔧 Парсим балансы для отчета {report.shift_date}...")
-            try:
-                balances = json.loads(report.balances_json or '{}')
-                print(f"✅ Балансы распарсены: {len(balances)} платформ")
-            except Exception as e:
-                print(f"❌ Ошибка при парсинге балансов: {str(e)}")
-                balances = {}
+            logger.debug(f"Парсим балансы для отчета {report.shift_date}...")
+            balances = report_balances(report)
+            logger.debug(f"Балансы распарсены: {len(balances.platforms())} платформ")
             
             # Считаем прибыль по платформам
-            print(f"🔧 Считаем прибыль по платформам...")
+            logger.debug("Считаем прибыль по платформам...")
             platform_deltas = {}
             try:
                 for platform in ['bybit', 'htx', 'bliss', 'gate']:
-                    accounts_list = balances.get(platform, [])
                     delta = 0
-                    for acc in accounts_list:
-                        prev = find_prev_balance(db.session, acc.get('account_id') or acc.get('id'), platform, report)
-                        cur = float(acc.get('balance', 0)) if acc.get('balance') not in (None, '') else 0
+                    for acc in balances.accounts(platform):
+                        prev = profit_calculator().prev_balance(acc.account_id, platform, report)
+                        cur = acc.balance or 0
                         delta += cur - prev
                     platform_deltas[platform] = delta
                     platform_profits[platform] += delta
-                print(f"✅ Прибыль по платформам рассчитана: {platform_deltas}")
+                logger.debug(f"Прибыль по платформам рассчитана: {platform_deltas}")
             except Exception as e:
-                print(f"❌ Ошибка при расчете прибыли по платформам: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception(f"Ошибка при расчете прибыли по платформам: {str(e)}")
                 platform_deltas = {'bybit': 0, 'htx': 0, 'bliss': 0, 'gate': 0}
             
-            print(f"🔧 Формируем детали отчета...")
+            logger.debug("Формируем детали отчета...")
             try:
                 report_details.append({
                     'id': report.id,
@@ -2456,16 +2599,14 @@ def get_employee_profile(employee_id):
                     'dokidka_amount': float(report.dokidka_amount or 0),
                     'internal_transfer_amount': float(report.internal_transfer_amount or 0),
                     'platform_deltas': platform_deltas,
-                    'balances': balances
+                    'balances': balances.raw
                 })
-                print(f"✅ Детали отчета добавлены")
+                logger.debug("Детали отчета добавлены")
             except Exception as e:
-                print(f"❌ Ошибка при формировании деталей отчета: {str(e)}")
-                import traceback
-                traceback.print_exc()
+                logger.exception(f"Ошибка при формировании деталей отчета: {str(e)}")
         
-        print("🔧 Начинаем расчет статистики по ордерам...")
-        print(f"🔧 Найдено ордеров: {len(orders)}")
+        logger.debug("Начинаем расчет статистики по ордерам...")
+        logger.debug(f"Найдено ордеров: {len(orders)}")
         
         # Рассчитываем статистику на основе привязанных ордеров
         from utils import calculate_shift_stats_from_orders
@@ -2494,7 +2635,7 @@ def get_employee_profile(employee_id):
             'total_fees': sum(float(o.fees_usdt) for o in orders)
         })
         
-        print("🔧 Начинаем расчет временной статистики...")
+        logger.debug("Начинаем расчет временной статистики...")
         # Временная статистика
         time_stats = {}
         try:
@@ -2509,27 +2650,23 @@ def get_employee_profile(employee_id):
                     'active_days': len(set(r.shift_date for r in reports)),
                     'activity_ratio': len(set(r.shift_date for r in reports)) / ((last_report.shift_date - first_report.shift_date).days + 1)
                 }
-            print("✅ Временная статистика рассчитана")
+            logger.debug("Временная статистика рассчитана")
         except Exception as e:
-            print(f"❌ Ошибка при расчете временной статистики: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Ошибка при расчете временной статистики: {str(e)}")
             time_stats = {}
         
-        print("🔧 Начинаем расчет статистики по типам смен...")
+        logger.debug("Начинаем расчет статистики по типам смен...")
         # Статистика по типам смен
         try:
             shift_stats = {
                 'morning_shifts': len([r for r in reports if r.shift_type == 'morning']),
                 'evening_shifts': len([r for r in reports if r.shift_type == 'evening']),
-                'morning_profit': sum(calculate_report_profit(db.session, r)['salary_profit'] for r in reports if r.shift_type == 'morning'),
-                'evening_profit': sum(calculate_report_profit(db.session, r)['salary_profit'] for r in reports if r.shift_type == 'evening')
+                'morning_profit': sum(profit_calculator().profit(r)['salary_profit'] for r in reports if r.shift_type == 'morning'),
+                'evening_profit': sum(profit_calculator().profit(r)['salary_profit'] for r in reports if r.shift_type == 'evening')
             }
-            print("✅ Статистика по типам смен рассчитана")
+            logger.debug("Статистика по типам смен рассчитана")
         except Exception as e:
-            print(f"❌ Ошибка при расчете статистики по типам смен: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Ошибка при расчете статистики по типам смен: {str(e)}")
             shift_stats = {
                 'morning_shifts': 0,
                 'evening_shifts': 0,
@@ -2537,7 +2674,7 @@ def get_employee_profile(employee_id):
                 'evening_profit': 0
             }
         
-        print("🔧 Начинаем расчет средних показателей...")
+        logger.debug("Начинаем расчет средних показателей...")
         # Средние показатели
         avg_stats = {}
         try:
@@ -2550,21 +2687,19 @@ def get_employee_profile(employee_id):
                     'avg_htx_per_shift': sum(r.htx_requests or 0 for r in reports) / len(reports),
                     'avg_bliss_per_shift': sum(r.bliss_requests or 0 for r in reports) / len(reports)
                 }
-            print("✅ Средние показатели рассчитаны")
+            logger.debug("Средние показатели рассчитаны")
         except Exception as e:
-            print(f"❌ Ошибка при расчете средних показателей: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Ошибка при расчете средних показателей: {str(e)}")
             avg_stats = {}
         
-        print("🔧 Начинаем расчет лучших и худших показателей...")
+        logger.debug("Начинаем расчет лучших и худших показателей...")
         # Лучшие и худшие показатели
         best_worst = {}
         try:
             if reports:
-                profits = [calculate_report_profit(db.session, r)['salary_profit'] for r in reports]
-                best_report = max(reports, key=lambda r: calculate_report_profit(db.session, r)['salary_profit'])
-                worst_report = min(reports, key=lambda r: calculate_report_profit(db.session, r)['salary_profit'])
+                profits = [profit_calculator().profit(r)['salary_profit'] for r in reports]
+                best_report = max(reports, key=lambda r: profit_calculator().profit(r)['salary_profit'])
+                worst_report = min(reports, key=lambda r: profit_calculator().profit(r)['salary_profit'])
                 
                 best_worst = {
                     'best_profit': {
@@ -2582,14 +2717,12 @@ def get_employee_profile(employee_id):
                         'date': max(reports, key=lambda r: r.total_requests or 0).shift_date.isoformat()
                     }
                 }
-            print("✅ Лучшие и худшие показатели рассчитаны")
+            logger.debug("Лучшие и худшие показатели рассчитаны")
         except Exception as e:
-            print(f"❌ Ошибка при расчете лучших и худших показателей: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Ошибка при расчете лучших и худших показателей: {str(e)}")
             best_worst = {}
         
-        print("🔧 Формируем итоговый профиль...")
+        logger.debug("Формируем итоговый профиль...")
         # Формируем итоговый профиль
         try:
             profile = {
@@ -2615,34 +2748,37 @@ def get_employee_profile(employee_id):
                 'platform_profits': platform_profits
             }
             
-            print("✅ Итоговый профиль сформирован")
-            print("🔧 Отправляем ответ...")
+            logger.debug("Итоговый профиль сформирован")
+            logger.debug("Отправляем ответ...")
             return jsonify(profile)
         except Exception as e:
-            print(f"❌ Ошибка при формировании итогового профиля: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception(f"Ошибка при формировании итогового профиля: {str(e)}")
             return jsonify({'error': str(e)}), 500
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def process_shift_files(report_id, employee_id, shift_start_time, shift_end_time, files_data):
+def process_shift_files(report_id, employee_id, shift_start_time, shift_end_time, files_data, progress=None, force_full=False):
     """
     Обрабатывает файлы выгрузок для смены с автоматической проверкой времени
     
+    Каждый файл разбирается один раз, ордера распределяются по аккаунтам
+    сотрудника на площадке в памяти (см. ingest_platform_orders), и всё
+    записывается одной транзакцией.
+    
     Args:
         report_id: ID отчёта
         employee_id: ID сотрудника
         shift_start_time: время начала смены по МСК
         shift_end_time: время окончания смены по МСК
         files_data: словарь с файлами {platform: file_path}
+        progress: необязательный progress(done, total) — вызывается, когда
+            файлы разобраны (до записи ордеров)
+        force_full: не пропускать ордера из уже загруженных интервалов аккаунтов
     
     Returns:
         dict: статистика обработки файлов
     """
-    from utils import link_orders_to_employee
-    
     stats = {
         'total_orders': 0,
         'linked_orders': 0,
@@ -2666,46 +2802,53 @@ def process_shift_files(report_id, employee_id, shift_start_time, shift_end_time
         for account in employee_accounts:
             if account.platform not in platform_accounts:
                 platform_accounts[account.platform] = []
-            platform_accounts[account.platform].append(account.id)
+            platform_accounts[account.platform].append(account)
         
-        # Обрабатываем каждый файл
+        files = []
         for platform, file_path in files_data.items():
             if not file_path or not os.path.exists(file_path):
                 continue
-                
-            try:
-                print(f"Обрабатываем файл {platform}: {file_path}")
-                
-                # Проверяем, есть ли у сотрудника аккаунты на этой платформе
-                if platform not in platform_accounts:
-                    print(f"У сотрудника нет аккаунтов на платформе {platform}")
+            # Проверяем, есть ли у сотрудника аккаунты на этой платформе
+            if platform not in platform_accounts:
+                logger.info(f"У сотрудника нет аккаунтов на платформе {platform}")
+                continue
+            files.append((file_path, platform))
+        
+        # Разбираем каждый файл один раз, независимо от числа аккаунтов
+        parse_results = parse_shift_files(files, shift_start_time, shift_end_time)
+        if progress:
+            progress(len(files), len(files))
+        
+        try:
+            for (file_path, platform), (orders, error) in zip(files, parse_results):
+                if error is not None:
+                    error_msg = f"Ошибка обработки файла {platform}: {str(error)}"
+                    stats['errors'].append(error_msg)
+                    logger.error(error_msg)
                     continue
                 
-                # Обрабатываем файл для каждого аккаунта на этой платформе
-                for account_id in platform_accounts[platform]:
-                    account_stats = process_platform_file(
-                        file_path,
-                        platform,
-                        [account_id],  # Передаем только один аккаунт
-                        shift_start_time,
-                        shift_end_time,
-                        report_id,
-                        employee_id
-                    )
-                    
-                    stats['total_orders'] += account_stats.get('total_orders', 0)
-                    stats['linked_orders'] += account_stats.get('linked_orders', 0)
-                
-                if platform not in stats['platforms_processed']:
-                    stats['platforms_processed'].append(platform)
-                
-                print(f"Обработано {stats['total_orders']} ордеров для {platform}, создано {stats['linked_orders']} новых")
-                
-            except Exception as e:
-                error_msg = f"Ошибка обработки файла {platform}: {str(e)}"
-                stats['errors'].append(error_msg)
-                print(error_msg)
-                continue
+                platform_stats = ingest_platform_orders(
+                    orders,
+                    platform,
+                    platform_accounts[platform],
+                    shift_start_time,
+                    shift_end_time,
+                    employee_id,
+                    force_full
+                )
+                stats['total_orders'] += platform_stats['total_orders']
+                stats['linked_orders'] += platform_stats['linked_orders']
+                stats['platforms_processed'].append(platform)
+            
+            db.session.commit()
+        except Exception as e:
+            # Ордера всех файлов пишутся одной транзакцией: при ошибке не сохраняется ничего
+            db.session.rollback()
+            stats['linked_orders'] = 0
+            stats['platforms_processed'] = []
+            error_msg = f"Ошибка сохранения ордеров смены: {str(e)}"
+            stats['errors'].append(error_msg)
+            logger.error(error_msg)
         
         return stats
         
@@ -2713,6 +2856,100 @@ def process_shift_files(report_id, employee_id, shift_start_time, shift_end_time
         stats['errors'].append(f"Общая ошибка обработки файлов: {str(e)}")
         return stats
 
+
+@job_queue.handler('shift_files')
+def run_shift_files_job(payload, progress):
+    return process_shift_files(
+        payload['report_id'],
+        payload['employee_id'],
+        datetime.fromisoformat(payload['shift_start_time']),
+        datetime.fromisoformat(payload['shift_end_time']),
+        payload['files_data'],
+        progress,
+        payload.get('force_full', False)
+    )
+
+
+def enqueue_shift_files_job(report, files_data, force_full=False):
+    """Ставит в очередь обработку файлов выгрузок отчёта (process_shift_files)"""
+    return job_queue.enqueue('shift_files', {
+        'report_id': report.id,
+        'employee_id': report.employee_id,
+        'shift_start_time': report.shift_start_time.isoformat(),
+        'shift_end_time': report.shift_end_time.isoformat(),
+        'files_data': files_data,
+        'force_full': force_full
+    }, report_id=report.id)
+
+
+def ingest_platform_orders(orders, platform, accounts, shift_start_dt, shift_end_dt, employee_id, force_full=False):
+    """
+    Сохраняет ордера одного файла площадки в текущую транзакцию (без commit).
+    
+    Ордер привязывается к аккаунту сотрудника по имени аккаунта из выгрузки
+    (export_account, есть в выгрузках Bliss), а если его нет или такого
+    аккаунта у сотрудника нет — к выбранному (первому) аккаунту площадки.
+    
+    Args:
+        orders: разобранные ордера файла за смену
+        accounts: аккаунты сотрудника на площадке (Account)
+        force_full: не пропускать ордера из уже загруженных интервалов (OrderWatermarks)
+    
+    Returns:
+        dict: total_orders (ордеров в файле за смену), linked_orders (создано новых)
+    """
+    accounts_by_name = {account.account_name: account for account in accounts}
+    selected_account = accounts[0]
+    
+    # Ордера Bliss с неразборчивой датой получают текущее время и окном
+    # при разборе не фильтруются — отбрасываем их, если они вне смены
+    shift_orders = [order for order in orders if shift_start_dt <= order.executed_at <= shift_end_dt]
+    
+    account_name_for = lambda order: accounts_by_name.get(order.export_account, selected_account).account_name
+    watermarks = OrderWatermarks(platform, force_full)
+    created_count, _ = insert_new_orders(
+        watermarks.filter(shift_orders, account_name_for),
+        platform,
+        employee_id,
+        account_name_for,
+        set()
+    )
+    watermarks.save()
+    
+    if not orders:
+        logger.info(f"В файле {platform} нет ордеров за время смены {shift_start_dt} - {shift_end_dt}")
+    logger.info(f"Обработано {len(shift_orders)} ордеров для {platform}, создано {created_count} новых")
+    
+    return {
+        'total_orders': len(orders),
+        'linked_orders': created_count
+    }
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Статус, прогресс и результат фоновой задачи обработки выгрузок"""
+    try:
+        job = db.session.get(IngestionJob, job_id)
+        if not job:
+            return jsonify({'error': 'Задача не найдена'}), 404
+        return jsonify(job_queue.describe(job))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/admin/profit-cache', methods=['POST'])
+def get_profit_cache_stats():
+    """Статистика кэша прибыли процесса, обработавшего запрос (попадания, промахи, вытеснения). Требует пароль администратора в JSON."""
+    try:
+        data = request.get_json(silent=True)
+        if not validate_admin_password(data):
+            return jsonify({'error': 'Неверный пароль'}), 403
+        stats = profit_cache.stats()
+        stats['db_generation'] = read_cache_generation()
+        stats['balances_cache'] = balances_cache_stats()
+        return jsonify(stats)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/employee-accounts/<int:employee_id>', methods=['GET'])
 def get_employee_accounts(employee_id):
     """Возвращает все активные аккаунты, сгруппированные по площадкам"""
@@ -2748,7 +2985,8 @@ def validate_shift_time_and_files(shift_start_time, shift_end_time, files_data,
     Args:
         shift_start_time: время начала смены по МСК
         shift_end_time: время окончания смены по МСК
-        files_data: словарь с файлами {platform: file_path}
+        files_data: словарь с файлами {platform: (поток файла, имя файла)};
+            файлы читаются предпросмотром (preview_orders_file), без записи на диск
         employee_accounts: список аккаунтов сотрудника
     
     Returns:
@@ -2781,43 +3019,43 @@ def validate_shift_time_and_files(shift_start_time, shift_end_time, files_data,
     employee_platforms = set(acc.platform for acc in employee_accounts)
     
     # Проверяем соответствие файлов выгрузок аккаунтам сотрудника
-    for platform, file_path in files_data.items():
-        if not file_path or not os.path.exists(file_path):
-            continue
-            
+    for platform, (stream, filename) in files_data.items():
         if platform not in employee_platforms:
             validation_result['warnings'].append(
                 f'Файл выгрузки {platform} загружен, но у сотрудника нет аккаунтов на этой площадке'
             )
         
-        # Проверяем содержимое файла
+        # Проверяем содержимое файла: только время (и аккаунт выгрузки), без полного разбора
         try:
-            orders_data = parse_orders_file(
-                file_path, 
-                platform, 
-                shift_start_time, 
-                shift_end_time,
-                os.path.basename(file_path)
-            )
+            preview = preview_orders_file(stream, platform, filename, shift_start_time, shift_end_time)
             
-            # Проверяем, есть ли ордера в файле для аккаунтов сотрудника
+            # Ордера файла привязываются к аккаунтам сотрудника на площадке (см. ingest_platform_orders),
+            # в выгрузках с колонкой аккаунта (Bliss) — по совпадению имени
             employee_account_names = [acc.account_name for acc in employee_accounts if acc.platform == platform]
-            relevant_orders = [
-                order for order in orders_data 
-                if order.get('account_name') in employee_account_names
-            ]
+            found_accounts = preview['accounts']
+            matched_accounts = [name for name in found_accounts if name in employee_account_names]
             
             validation_result['file_validation'][platform] = {
-                'total_orders': len(orders_data),
-                'employee_orders': len(relevant_orders),
+                'total_orders': preview['rows'],
+                'employee_orders': preview['in_window'],
                 'account_names': employee_account_names,
-                'has_orders_in_shift': len(relevant_orders) > 0
+                'has_orders_in_shift': preview['in_window'] > 0,
+                'undated_orders': preview['undated'],
+                'first_order_at': preview['first_order_at'].isoformat() if preview['first_order_at'] else None,
+                'last_order_at': preview['last_order_at'].isoformat() if preview['last_order_at'] else None,
+                'accounts_found': found_accounts,
+                'matched_accounts': matched_accounts
             }
             
-            if len(relevant_orders) == 0:
+            if preview['in_window'] == 0:
                 validation_result['warnings'].append(
                     f'В файле {platform} не найдено ордеров для аккаунтов сотрудника в указанное время смены'
                 )
+            elif found_accounts and not matched_accounts:
+                validation_result['warnings'].append(
+                    f'Аккаунты из файла {platform} ({", ".join(found_accounts)}) не совпадают с аккаунтами сотрудника, '
+                    f'ордера будут привязаны к аккаунту {employee_account_names[0] if employee_account_names else "площадки"}'
+                )
                 
         except Exception as e:
             validation_result['errors'].append(f'Ошибка обработки файла {platform}: {str(e)}')
@@ -2867,15 +3105,9 @@ def validate_shift():
                         if not validate_file_size(file):
                             return jsonify({'error': f'Файл {file.filename} слишком большой (максимум 16MB)'}), 400
                         
-                        # Сохраняем временный файл для валидации
-                        filename = secure_filename(file.filename)
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        filename = f"temp_{timestamp}_{filename}"
-                        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                        file.save(file_path)
-                        
+                        # Файл читается прямо из потока загрузки, временная копия не нужна
                         platform = key.replace('_file', '')
-                        files_data[platform] = file_path
+                        files_data[platform] = (file.stream, secure_filename(file.filename))
             
             # Валидируем
             validation_result = validate_shift_time_and_files(
@@ -2885,11 +3117,6 @@ def validate_shift():
                 employee_accounts
             )
             
-            # Удаляем временные файлы
-            for file_path in files_data.values():
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-            
             return jsonify(validation_result)
             
         else:
@@ -2925,7 +3152,7 @@ def create_shift_report():
         try:
             shift_start_dt = datetime.strptime(shift_start_time, '%Y-%m-%dT%H:%M')
             shift_end_dt = datetime.strptime(shift_end_time, '%Y-%m-%dT%H:%M')
-            print(f"DEBUG SHIFT: Время смены (МСК): {shift_start_dt} - {shift_end_dt}")
+            logger.debug(f"Время смены (МСК): {shift_start_dt} - {shift_end_dt}")
         except ValueError:
             return jsonify({'error': 'Неверный формат времени'}), 400
         
@@ -2983,7 +3210,10 @@ def create_shift_report():
         
         # Сохраняем отчет в базу
         db.session.add(report)
+        db.session.flush()
+        record_report_balances(report)
         db.session.commit()
+        schedule_profit_refresh()
         
         # Если скам отмечен как личный, сохраняем его в историю
         if report.scam_amount and report.scam_personal:
@@ -2997,83 +3227,218 @@ def create_shift_report():
             db.session.add(scam_history)
             db.session.commit()
         
-        # Обрабатываем файлы выгрузок и привязываем ордера
-        stats = {
-            'total_orders': 0,
-            'linked_orders': 0,
-            'platforms_processed': [],
-            'errors': []
-        }
-        
-        # Обрабатываем файлы для каждого аккаунта
+        # Сохраняем файлы выгрузок всех выбранных аккаунтов
+        platform_jobs = {}
         for platform in ['bybit', 'htx', 'bliss', 'gate']:
             if platform in selected_accounts and selected_accounts[platform]:
-                platform_stats = {
-                    'total_orders': 0,
-                    'linked_orders': 0,
-                    'errors': []
-                }
+                platform_jobs[platform] = []
                 
                 for account_id in selected_accounts[platform]:
                     file_key = f'file_{platform}_{account_id}'
                     if file_key in request.files:
                         file = request.files[file_key]
                         if file.filename:
+                            job = {'account_id': account_id, 'file_path': None, 'error': None}
                             try:
-                                # Сохраняем файл и получаем путь
-                                file_path = save_report_file(file, platform, report.id)
-                                if not file_path:
-                                    continue
-                                
-                                print(f"Обрабатываем файл {platform} для аккаунта {account_id}: {file_path}")
-                                
-                                # Обрабатываем файл и привязываем ордера для конкретного аккаунта
-                                account_stats = process_platform_file(
-                                    file_path, 
-                                    platform, 
-                                    [account_id],  # Передаем только один аккаунт
-                                    shift_start_dt, 
-                                    shift_end_dt,
-                                    report.id,
-                                    int(employee_id)
-                                )
-                                
-                                platform_stats['total_orders'] += account_stats.get('total_orders', 0)
-                                platform_stats['linked_orders'] += account_stats.get('linked_orders', 0)
-                                
-                                if account_stats.get('errors'):
-                                    platform_stats['errors'].extend(account_stats['errors'])
-                                
+                                job['file_path'] = save_report_file(file, platform, report.id, account_id)
                             except Exception as e:
-                                error_msg = f'Ошибка обработки файла {platform} для аккаунта {account_id}: {str(e)}'
-                                platform_stats['errors'].append(error_msg)
-                                print(error_msg)
-                
-                # Обновляем общую статистику
-                stats['total_orders'] += platform_stats['total_orders']
-                stats['linked_orders'] += platform_stats['linked_orders']
-                
-                if platform_stats['total_orders'] > 0:
-                    stats['platforms_processed'].append(platform.upper())
-                
-                if platform_stats['errors']:
-                    stats['errors'].extend(platform_stats['errors'])
+                                job['error'] = f'Ошибка обработки файла {platform} для аккаунта {account_id}: {str(e)}'
+                            if job['file_path'] or job['error']:
+                                platform_jobs[platform].append(job)
+        
+        if not any(platform_jobs.values()):
+            # Выгрузки не приложены — разбирать нечего, задача не создаётся
+            return jsonify({
+                'id': report.id,
+                'message': 'Report created successfully',
+                'job_id': None,
+                'job_status': None,
+                'stats': None
+            })
+        
+        # Файлы разбираются и ордера сохраняются фоновой задачей, ход обработки — /api/jobs/<job_id>
+        ingestion_job = job_queue.enqueue('shift_report_files', {
+            'employee_id': int(employee_id),
+            'shift_start_time': shift_start_dt.isoformat(),
+            'shift_end_time': shift_end_dt.isoformat(),
+            'platform_jobs': platform_jobs,
+            'force_full': parse_bool(request.form.get('force_full', False))
+        }, report_id=report.id)
         
         return jsonify({
             'id': report.id,
             'message': 'Report created successfully',
-            'stats': stats
+            'job_id': ingestion_job.id,
+            'job_status': ingestion_job.status,
+            'stats': job_queue.describe(ingestion_job)['result']
         })
         
     except Exception as e:
         return jsonify({'error': f'Ошибка создания отчёта: {str(e)}'}), 500
 
 
-def process_platform_file(file_path, platform, account_ids, shift_start_dt, shift_end_dt, report_id, employee_id):
-    """Обрабатывает файл выгрузки для конкретной площадки"""
-    print(f"\nDEBUG SHIFT: Обработка файла {platform}")
-    print(f"DEBUG SHIFT: Время смены {shift_start_dt} - {shift_end_dt}")
+def process_shift_report_files(platform_jobs, shift_start_dt, shift_end_dt, employee_id, progress=None, force_full=False):
+    """
+    Разбирает файлы выгрузок отчёта по смене и сохраняет ордера по аккаунтам.
+    
+    Args:
+        platform_jobs: {platform: [{'account_id', 'file_path', 'error'}]} — файлы,
+            сохранённые при создании отчёта
+        progress: необязательный progress(done, total) — вызывается после
+            сохранения ордеров каждого файла
+        force_full: не пропускать ордера из уже загруженных интервалов аккаунтов
+    
+    Returns:
+        dict: статистика обработки файлов
+    """
+    stats = {
+        'total_orders': 0,
+        'linked_orders': 0,
+        'platforms_processed': [],
+        'errors': []
+    }
+    
+    # Разбираем файлы параллельно в пуле процессов
+    parse_jobs = [
+        (platform, job)
+        for platform, jobs in platform_jobs.items()
+        for job in jobs
+        if job['file_path']
+    ]
+    parse_results = parse_shift_files(
+        [(job['file_path'], platform) for platform, job in parse_jobs],
+        shift_start_dt,
+        shift_end_dt
+    )
+    for (platform, job), (orders, error) in zip(parse_jobs, parse_results):
+        job['orders'] = orders
+        if error is not None:
+            job['error'] = f'Ошибка обработки файла {platform} для аккаунта {job["account_id"]}: {str(error)}'
+    
+    # Сохраняем ордера последовательно, в порядке площадок и аккаунтов
+    files_total = sum(len(jobs) for jobs in platform_jobs.values())
+    files_done = 0
+    for platform, jobs in platform_jobs.items():
+        platform_stats = {
+            'total_orders': 0,
+            'linked_orders': 0,
+            'errors': []
+        }
+        
+        for job in jobs:
+            files_done += 1
+            if job['error']:
+                platform_stats['errors'].append(job['error'])
+                logger.error(job['error'])
+                continue
+            
+            logger.debug(f"Сохраняем ордера {platform} для аккаунта {job['account_id']}: {job['file_path']}")
+            
+            # Привязываем ордера к конкретному аккаунту
+            account_stats = save_platform_orders(
+                [job['orders']],
+                platform,
+                [job['account_id']],  # Передаем только один аккаунт
+                shift_start_dt,
+                shift_end_dt,
+                int(employee_id),
+                force_full
+            )
+            
+            platform_stats['total_orders'] += account_stats.get('total_orders', 0)
+            platform_stats['linked_orders'] += account_stats.get('linked_orders', 0)
+            
+            if account_stats.get('errors'):
+                platform_stats['errors'].extend(account_stats['errors'])
+            
+            # save_platform_orders уже зафиксировал транзакцию
+            if progress:
+                progress(files_done, files_total)
+        
+        # Обновляем общую статистику
+        stats['total_orders'] += platform_stats['total_orders']
+        stats['linked_orders'] += platform_stats['linked_orders']
+        
+        if platform_stats['total_orders'] > 0:
+            stats['platforms_processed'].append(platform.upper())
+        
+        if platform_stats['errors']:
+            stats['errors'].extend(platform_stats['errors'])
+    
+    return stats
+
+
+@job_queue.handler('shift_report_files')
+def run_shift_report_files_job(payload, progress):
+    return process_shift_report_files(
+        payload['platform_jobs'],
+        datetime.fromisoformat(payload['shift_start_time']),
+        datetime.fromisoformat(payload['shift_end_time']),
+        payload['employee_id'],
+        progress,
+        payload.get('force_full', False)
+    )
+
+
+def parse_shift_files(files, shift_start_dt, shift_end_dt):
+    """
+    Разбирает файлы выгрузок смены в пуле процессов (не больше SHIFT_PARSE_WORKERS).
+    
+    Args:
+        files: список (file_path, platform)
+    
+    Returns:
+        list: (ордера, ошибка) для каждого файла в порядке files
+    """
+    request_stats = current_parse_stats()
+    
+    def collect(result):
+        # Счётчики разбора из процесса пула добавляем к счётчикам запроса
+        orders, stats = result
+        if request_stats is not None:
+            request_stats.merge(stats)
+        return orders, None
+    
+    def parse_inline(file_path, platform):
+        try:
+            return collect(parse_orders_in_window(file_path, platform, shift_start_dt, shift_end_dt))
+        except Exception as e:
+            return None, e
+    
+    workers = min(SHIFT_PARSE_WORKERS, len(files))
+    if workers <= 1:
+        return [parse_inline(file_path, platform) for file_path, platform in files]
+    
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=SHIFT_PARSE_CONTEXT) as pool:
+            futures = [
+                pool.submit(parse_orders_in_window, file_path, platform, shift_start_dt, shift_end_dt)
+                for file_path, platform in files
+            ]
+            for (file_path, platform), future in zip(files, futures):
+                try:
+                    results.append(collect(future.result()))
+                except BrokenProcessPool:
+                    # Процесс пула упал (например, по памяти) — разбираем файл здесь
+                    results.append(parse_inline(file_path, platform))
+                except Exception as e:
+                    results.append((None, e))
+    except OSError as e:
+        logger.warning(f"Пул процессов недоступен, файлы разбираются последовательно: {str(e)}")
+        results.extend(parse_inline(file_path, platform) for file_path, platform in files[len(results):])
+    
+    return results
+
+
+def save_platform_orders(orders_batches, platform, account_ids, shift_start_dt, shift_end_dt, employee_id, force_full=False):
+    """
+    Сохраняет разобранные ордера файла выгрузки за смену и привязывает их к аккаунту.
     
+    Args:
+        orders_batches: пачки ордеров (списки ParsedOrder), например из iter_orders_file
+        force_full: не пропускать ордера из уже загруженных интервалов (OrderWatermarks)
+    """
     stats = {
         'total_orders': 0,
         'linked_orders': 0,
@@ -3089,14 +3454,6 @@ def process_platform_file(file_path, platform, account_ids, shift_start_dt, shif
             stats['errors'].append(f'Не найдены аккаунты с ID: {account_ids}')
             return stats
         
-        # Читаем файл в зависимости от платформы
-        orders = parse_orders_file(file_path, platform)
-        if not orders:
-            stats['errors'].append(f'Не удалось прочитать файл для платформы: {platform}')
-            return stats
-        
-        stats['total_orders'] = len(orders)
-        
         # Если в выгрузке отсутствует поле account_name, привяжем все ордера к текущему аккаунту
         # (передаём всегда только один account_id на вызов)
         if len(account_names) == 1:
@@ -3104,76 +3461,46 @@ def process_platform_file(file_path, platform, account_ids, shift_start_dt, shif
         else:
             default_account_name = None
         
-        # Приводим имена аккаунтов к нижнему регистру для сравнения
-        account_names_lower = [name.lower() for name in account_names]
-        
-        # Фильтруем ордера по аккаунту и времени
-        account_orders = []
+        # Пачка ордеров сохраняется и сбрасывается в БД, после чего не держится в памяти
+        total_orders = 0
+        shift_orders_count = 0
+        created_count = 0
+        seen_ids = set()
+        watermarks = OrderWatermarks(platform, force_full)
         
-        for order in orders:
-            # Время уже сконвертировано в parse_orders_file
-            order_time = order['executed_at']
-            print(f"\nDEBUG FILTER: ========== Проверка ордера {order['order_id']} ==========")
-            print(f"DEBUG FILTER: Время ордера (МСК): {order_time}")
-            print(f"DEBUG FILTER: Диапазон смены (МСК): {shift_start_dt} - {shift_end_dt}")
-            print(f"DEBUG FILTER: Время больше начала смены: {order_time >= shift_start_dt}")
-            print(f"DEBUG FILTER: Время меньше конца смены: {order_time <= shift_end_dt}")
+        for orders_batch in orders_batches:
+            total_orders += len(orders_batch)
             
-            # Проверяем попадание в диапазон смены
-            if shift_start_dt <= order_time <= shift_end_dt:  # попадает во временной диапазон
-                print(f"DEBUG FILTER: >>> Ордер {order['order_id']} ПОПАДАЕТ в смену <<<")
-                account_orders.append(order)
-            else:
-                print(f"DEBUG FILTER: >>> Ордер {order['order_id']} НЕ попадает в смену <<<")
-            print(f"DEBUG FILTER: ================================================\n")
+            # Ордера Bliss с неразборчивой датой получают текущее время и окном
+            # при разборе не фильтруются — отбрасываем их, если они вне смены
+            shift_orders = [order for order in orders_batch if shift_start_dt <= order.executed_at <= shift_end_dt]
+            shift_orders_count += len(shift_orders)
+            
+            # Всегда используем имя выбранного аккаунта
+            account_name_for = lambda order: default_account_name
+            created, _ = insert_new_orders(
+                watermarks.filter(shift_orders, account_name_for), platform, employee_id, account_name_for, seen_ids
+            )
+            created_count += created
         
-        # Сохраняем отфильтрованные ордера
-        created_count = 0
-        for order in account_orders:
-            try:
-                # Проверяем, что ордер еще не существует
-                existing_order = Order.query.filter_by(
-                    order_id=order['order_id'],
-                    platform=platform
-                ).first()
-                
-                if existing_order:
-                    print(f"Ордер уже существует: {order['order_id']}")
-                    continue
-                
-                # Создаем новый ордер
-                new_order = Order(
-                    order_id=order['order_id'],
-                    employee_id=employee_id,
-                    platform=platform,
-                    account_name=default_account_name,  # Всегда используем имя выбранного аккаунта
-                    symbol=order['symbol'],
-                    side=order['side'],
-                    quantity=order['quantity'],
-                    price=order['price'],
-                    total_usdt=order['total_usdt'],
-                    fees_usdt=order.get('fees_usdt', 0),
-                    status=order.get('status', 'filled'),
-                    executed_at=order['executed_at']
-                )
-                
-                db.session.add(new_order)
-                created_count += 1
-                print(f"Создан новый ордер: {order['order_id']} для аккаунта {order.get('account_name')}")
-                
-            except Exception as e:
-                print(f"Ошибка сохранения ордера {order.get('order_id')}: {str(e)}")
-                continue
+        watermarks.save()
+        
+        if not total_orders:
+            logger.info(f"В файле {platform} нет ордеров за время смены {shift_start_dt} - {shift_end_dt}")
+        
+        stats['total_orders'] = total_orders
         
         # Сохраняем изменения
         db.session.commit()
         
         stats['linked_orders'] = created_count
-        print(f"Обработано {len(account_orders)} ордеров для {platform}, создано {created_count} новых")
+        logger.info(f"Обработано {shift_orders_count} ордеров для {platform}, создано {created_count} новых")
         
         return stats
         
     except Exception as e:
+        # Откатываем уже сброшенные в БД пачки, чтобы не сохранить файл частично
+        db.session.rollback()
         stats['errors'].append(str(e))
         return stats
 
@@ -3231,7 +3558,7 @@ def get_salary_settings():
             'bonus_requests_threshold': settings.bonus_requests_threshold
         })
     except Exception as e:
-        print('Error getting salary settings:', e)
+        logger.error(f'Error getting salary settings: {e}')
         return jsonify({'error': 'Ошибка при получении настроек'}), 500
 
 @app.route('/api/settings/salary', methods=['POST'])
@@ -3258,7 +3585,7 @@ def update_salary_settings():
         db.session.commit()
         return jsonify({'success': True})
     except Exception as e:
-        print('Error updating salary settings:', e)
+        logger.error(f'Error updating salary settings: {e}')
         return jsonify({'error': 'Ошибка при обновлении настроек'}), 500
 
 
@@ -3287,7 +3614,30 @@ if __name__ == '__main__':
             app.logger.info('Индексы базы данных созданы успешно')
         except Exception as e:
             app.logger.warning(f'Ошибка при создании индексов: {str(e)}')
-    
+
+        # Журнал балансов для баз без миграции: заполняется из отчётов один раз
+        try:
+            backfilled = backfill_balance_ledger()
+            if backfilled:
+                app.logger.info(f'Журнал балансов заполнен из отчётов: {backfilled} строк')
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f'Ошибка при заполнении журнала балансов: {str(e)}')
+
+        # Счётчик поколения для кэша прибыли (в базах без миграции)
+        try:
+            ensure_cache_generation()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f'Ошибка при создании счётчика поколения кэша: {str(e)}')
+
+        # Прибыль отчётов, помеченных миграцией или изменениями балансов, пересчитывается в фоне
+        try:
+            schedule_profit_refresh()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.warning(f'Ошибка при постановке пересчёта прибыли: {str(e)}')
+
     # Настройки для продакшена
     debug_mode = os.environ.get('FLASK_ENV') == 'development'
     host = os.environ.get('FLASK_HOST', '127.0.0.1')
@@ -50,7 +50,7 @@ def apply_migration():
                     updated_at DATETIME,
                     PRIMARY KEY (id),
                     FOREIGN KEY(employee_id) REFERENCES employee (id),
-                    UNIQUE (order_id)
+                    CONSTRAINT uq_order_platform_order_id UNIQUE (platform, order_id)
                 )
             """))
             
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк чтения Excel-выгрузок: pd.read_excel целиком против потокового
+чтения листа (orders_parser.iter_excel_frames).
+
+Генерирует синтетическую выгрузку Bybit на N строк и сравнивает время
+и пиковую память обоих путей, а также совпадение разобранных ордеров.
+
+Использование:
+    python bench_excel_ingestion.py [количество_строк]
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pandas as pd
+from openpyxl import Workbook
+
+import orders_parser
+
+BYBIT_HEADER = [
+    'Order No.', 'p2p-convert', 'Type', 'Fiat Amount', 'Currency', 'Price', 'Currency',
+    'Coin Amount', 'Cryptocurrency', 'Transaction Fees', 'Cryptocurrency', 'Counterparty',
+    'Status', 'Time'
+]
+
+
+def generate_workbook(path, rows):
+    """Синтетическая выгрузка Bybit в формате .xlsx"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(BYBIT_HEADER)
+    start = datetime(2025, 7, 1)
+    for i in range(rows):
+        quantity = round(10 + (i % 500) * 1.37, 2)
+        price = round(78 + (i % 97) / 100, 2)
+        sheet.append([
+            str(1940000000000000000 + i), 'No', 'BUY' if i % 3 else 'SELL',
+            round(quantity * price, 2), 'RUB', price, 'RUB',
+            quantity, 'USDT', 0, 'USDT', f'user{i % 1000}',
+            'Completed' if i % 10 else 'Canceled',
+            (start + timedelta(seconds=37 * i)).strftime('%Y-%m-%d %H:%M:%S'),
+        ])
+    workbook.save(path)
+
+
+class OrdersDigest:
+    """Количество и контрольная сумма ордеров (чтобы не держать их все в памяти)"""
+
+    def __init__(self):
+        self.count = 0
+        self._hash = hashlib.sha256()
+
+    def update(self, orders):
+        for order in orders:
+            self.count += 1
+            self._hash.update(f"{order.order_id}|{order.total_usdt}|{order.executed_at}".encode())
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+
+def read_excel_path(path):
+    """Прежний путь: книга целиком через pd.read_excel"""
+    digest = OrdersDigest()
+    df = pd.read_excel(path)
+    digest.update(orders_parser.frame_to_orders(orders_parser.normalize_bybit_frame(df, 'bybit')))
+    return digest
+
+
+def streaming_path(path):
+    """Потоковое чтение листа с проекцией нужных колонок"""
+    digest = OrdersDigest()
+    for frame in orders_parser.iter_excel_frames(path, 'bybit'):
+        digest.update(orders_parser.frame_to_orders(orders_parser.normalize_bybit_frame(frame, 'bybit')))
+    return digest
+
+
+def measure(name, func, path):
+    start = time.perf_counter()
+    digest = func(path)
+    elapsed = time.perf_counter() - start
+
+    # Память меряем отдельным прогоном: tracemalloc заметно замедляет разбор
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<16} {elapsed:8.2f} с  пик памяти {peak / 1024 / 1024:8.1f} МБ  ордеров {digest.count}")
+    return digest
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'bybit_bench.xlsx')
+        print(f"Генерация выгрузки на {rows} строк...")
+        generate_workbook(path, rows)
+        print(f"Размер файла: {os.path.getsize(path) / 1024 / 1024:.1f} МБ\n")
+
+        old_digest = measure('read_excel', read_excel_path, path)
+        new_digest = measure('streaming', streaming_path, path)
+
+    print(f"\nРезультаты совпадают: {old_digest.hexdigest() == new_digest.hexdigest()}")
+
+
+if __name__ == '__main__':
+    main()
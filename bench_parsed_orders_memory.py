@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк памяти разобранных ордеров: прежние словари на ордер против
+ParsedOrder (__slots__, время как datetime).
+
+Генерирует синтетический нормализованный кадр Bybit на N строк (по умолчанию
+500 000), собирает из него ордера обоими способами и сравнивает память,
+которую занимают ордера, время сборки и размер pickle (так ордера
+передаются из пула процессов разбора).
+
+Использование:
+    python bench_parsed_orders_memory.py [количество_строк]
+"""
+
+import gc
+import pickle
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import orders_parser
+
+
+def generate_frame(rows):
+    """Синтетический нормализованный кадр ордеров, как после normalize_bybit_frame"""
+    index = np.arange(rows)
+    quantity = np.round(10 + (index % 500) * 1.37, 2)
+    price = np.round(78 + (index % 97) / 100, 2)
+    return pd.DataFrame({
+        'order_id': (1940000000000000000 + index).astype(str).astype(object),
+        'symbol': 'USDT',
+        'side': np.where(index % 3, 'buy', 'sell').astype(object),
+        'quantity': quantity,
+        'price': price,
+        'total_usdt': np.round(quantity * price, 2),
+        'status': np.where(index % 10, 'filled', 'canceled').astype(object),
+        'executed_at': pd.Timestamp('2025-07-01') + pd.to_timedelta(index * 37, unit='s'),
+        'windowed': True,
+    })
+
+
+def build_dicts(frame):
+    """Прежний формат: словарь из девяти ключей на ордер, время как pd.Timestamp"""
+    return [
+        {
+            'order_id': order_id,
+            'symbol': symbol,
+            'side': side,
+            'quantity': quantity,
+            'price': price,
+            'total_usdt': total_usdt,
+            'fees_usdt': 0,
+            'status': status,
+            'executed_at': executed_at
+        }
+        for order_id, symbol, side, quantity, price, total_usdt, status, executed_at in zip(
+            frame['order_id'].tolist(),
+            frame['symbol'].tolist(),
+            frame['side'].tolist(),
+            frame['quantity'].tolist(),
+            frame['price'].tolist(),
+            frame['total_usdt'].tolist(),
+            frame['status'].tolist(),
+            frame['executed_at'].tolist()
+        )
+    ]
+
+
+def build_parsed_orders(frame):
+    return orders_parser.frame_to_orders(frame)
+
+
+def measure(name, func, frame):
+    gc.collect()
+    start = time.perf_counter()
+    orders = func(frame)
+    elapsed = time.perf_counter() - start
+    del orders
+
+    # Память меряем отдельным прогоном: tracemalloc заметно замедляет сборку
+    gc.collect()
+    tracemalloc.start()
+    orders = func(frame)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pickled = len(pickle.dumps(orders, protocol=pickle.HIGHEST_PROTOCOL))
+    count = len(orders)
+    print(f"{name:<14} {elapsed:7.2f} с  занято {retained / 1024 / 1024:7.1f} МБ "
+          f"({retained / count:6.1f} Б на ордер)  пик {peak / 1024 / 1024:7.1f} МБ  "
+          f"pickle {pickled / 1024 / 1024:6.1f} МБ")
+    return retained
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    print(f"Генерация кадра на {rows} строк...\n")
+    frame = generate_frame(rows)
+
+    dicts = measure('dict', build_dicts, frame)
+    slots = measure('ParsedOrder', build_parsed_orders, frame)
+
+    print(f"\nПамять на ордер меньше в {dicts / slots:.1f} раза")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,217 @@
 // Content script для отслеживания ордеров на Bybit
+
+// Очередь отправки ордеров. Хранится в chrome.storage.local под одним ключом
+// (переживает перезагрузку страницы и недоступность сервера) и отправляется
+// пакетами в /api/orders/batch: по таймеру или когда набралось ORDER_BATCH_SIZE.
+// Пакет получает ключ идемпотентности до отправки и повторяется с тем же ключом,
+// поэтому повтор после обрыва соединения не создаёт дублей.
+const ORDER_QUEUE_STORAGE_KEY = 'orderUpload';
+const ORDER_BATCH_SIZE = 50;                 // ордеров в одном запросе
+const ORDER_FLUSH_INTERVAL_MS = 5000;        // как часто проверять очередь
+const ORDER_RETRY_BASE_MS = 5000;            // первая пауза после ошибки
+const ORDER_RETRY_MAX_MS = 5 * 60 * 1000;    // максимальная пауза между повторами
+const ORDER_SENT_IDS_LIMIT = 5000;           // сколько отправленных order_id помнить для дедупликации
+
+class OrderUploadQueue {
+  constructor(getServerUrl, callbacks = {}) {
+    this.getServerUrl = getServerUrl;
+    this.onFlushed = callbacks.onFlushed || (() => {});
+    this.onFailed = callbacks.onFailed || (() => {});
+    this.chain = Promise.resolve();
+    this.timer = null;
+    this.flushing = null;
+  }
+
+  static emptyState() {
+    return {
+      queue: [],          // ордера, ожидающие отправки
+      inflight: null,     // отправляемый пакет {key, orders}
+      sentIds: [],        // недавно отправленные order_id
+      failures: 0,        // ошибок подряд
+      nextRetryAt: 0,     // раньше этого времени (мс) не отправлять
+      lastError: null,
+      lastFlushAt: null
+    };
+  }
+
+  // Последовательно читает, изменяет и сохраняет состояние очереди
+  withState(fn) {
+    const run = this.chain.then(async () => {
+      const stored = await chrome.storage.local.get(ORDER_QUEUE_STORAGE_KEY);
+      const state = Object.assign(OrderUploadQueue.emptyState(), stored[ORDER_QUEUE_STORAGE_KEY]);
+      const result = await fn(state);
+      await chrome.storage.local.set({ [ORDER_QUEUE_STORAGE_KEY]: state });
+      return result;
+    });
+    this.chain = run.catch(() => {});
+    return run;
+  }
+
+  start() {
+    if (this.timer) return;
+    this.timer = setInterval(() => this.flush(), ORDER_FLUSH_INTERVAL_MS);
+    // Отправляем то, что осталось в очереди с прошлого раза
+    this.flush();
+  }
+
+  // Приводит ордер к полям /api/orders/batch (content.js собирает их по-разному)
+  normalize(order) {
+    const quantity = parseFloat(order.quantity) || 0;
+    const price = parseFloat(order.price) || 0;
+    return {
+      order_id: String(order.order_id || order.orderId || ''),
+      employee_id: order.employee_id || order.employeeId,
+      platform: order.platform || 'bybit',
+      account_name: order.account_name || order.accountName || '',
+      symbol: order.symbol,
+      side: order.side,
+      quantity: quantity,
+      price: price,
+      total_usdt: parseFloat(order.total_usdt) || quantity * price,
+      fees_usdt: parseFloat(order.fees_usdt) || 0,
+      status: order.status || 'filled',
+      executed_at: order.executed_at
+    };
+  }
+
+  // Ставит ордера в очередь, пропуская уже отправленные и ожидающие; возвращает число добавленных
+  async enqueue(orders) {
+    const added = await this.withState((state) => {
+      const known = new Set(state.sentIds);
+      state.queue.forEach(order => known.add(order.order_id));
+      if (state.inflight) state.inflight.orders.forEach(order => known.add(order.order_id));
+
+      let count = 0;
+      for (const order of orders) {
+        const normalized = this.normalize(order);
+        if (!normalized.order_id || known.has(normalized.order_id)) continue;
+        known.add(normalized.order_id);
+        state.queue.push(normalized);
+        count++;
+      }
+      if (state.queue.length >= ORDER_BATCH_SIZE) {
+        setTimeout(() => this.flush(), 0);
+      }
+      return count;
+    });
+    return added;
+  }
+
+  async depth() {
+    const state = await this.withState(state => state);
+    return state.queue.length + (state.inflight ? state.inflight.orders.length : 0);
+  }
+
+  // Отправляет очередь пакетами, пока она не опустеет или не случится ошибка
+  flush(serverUrl) {
+    if (!this.flushing) {
+      this.flushing = this.sendBatches(serverUrl).finally(() => {
+        this.flushing = null;
+      });
+    }
+    return this.flushing;
+  }
+
+  // Отправка по кнопке: не ждём окончания паузы после ошибки
+  async retryNow(serverUrl) {
+    await this.withState((state) => {
+      state.nextRetryAt = 0;
+    });
+    return this.flush(serverUrl);
+  }
+
+  async sendBatches(serverUrl) {
+    const summary = { sent: 0, error: null };
+    const url = serverUrl || this.getServerUrl();
+
+    while (true) {
+      const batch = await this.withState((state) => {
+        if (Date.now() < state.nextRetryAt) return null;
+        if (!state.inflight && state.queue.length > 0) {
+          state.inflight = { key: OrderUploadQueue.newKey(), orders: state.queue.splice(0, ORDER_BATCH_SIZE) };
+        }
+        return state.inflight;
+      });
+      if (!batch) return summary;
+
+      let response = null;
+      let error = null;
+      try {
+        if (!url) throw new Error('URL сервера не задан в настройках расширения');
+        response = await fetch(`${url}/api/orders/batch`, {
+          method: 'POST',
+          headers: {
+            'Content-Type': 'application/json',
+            'Idempotency-Key': batch.key
+          },
+          body: JSON.stringify({ idempotency_key: batch.key, orders: batch.orders })
+        });
+      } catch (e) {
+        error = e;
+      }
+
+      if (response && response.ok) {
+        const data = await response.json();
+        await this.withState((state) => {
+          const sentIds = state.sentIds.concat(batch.orders.map(order => order.order_id));
+          state.sentIds = sentIds.slice(-ORDER_SENT_IDS_LIMIT);
+          state.inflight = null;
+          state.failures = 0;
+          state.nextRetryAt = 0;
+          state.lastError = null;
+          state.lastFlushAt = Date.now();
+        });
+        (data.results || []).filter(item => item.status === 'invalid').forEach(item => {
+          console.error('❌ Сервер отклонил ордер:', item.order_id, item.error);
+        });
+        summary.sent += (data.created || 0) + (data.duplicates || 0);
+        console.log(`📦 Пакет ${batch.key} отправлен: создано ${data.created}, дублей ${data.duplicates}, с ошибками ${data.invalid}`);
+        this.onFlushed(data);
+        continue;
+      }
+
+      if (response && response.status === 400) {
+        // Повтор не поможет: сервер отклонил сам пакет
+        const errorText = await response.text();
+        console.error('❌ Сервер отклонил пакет ордеров:', errorText);
+        await this.withState((state) => {
+          state.inflight = null;
+          state.lastError = `HTTP 400: ${errorText}`;
+        });
+        summary.error = `HTTP 400`;
+        continue;
+      }
+
+      // Сервер недоступен или перегружен: повторим тот же пакет позже
+      const message = error ? error.message : `HTTP ${response.status}`;
+      const retryIn = await this.withState((state) => {
+        state.failures += 1;
+        const delay = Math.min(ORDER_RETRY_BASE_MS * 2 ** (state.failures - 1), ORDER_RETRY_MAX_MS);
+        const jittered = Math.round(delay * (0.5 + Math.random() / 2));
+        state.nextRetryAt = Date.now() + jittered;
+        state.lastError = message;
+        return { delay: jittered, failures: state.failures };
+      });
+      console.warn(`⏳ Не удалось отправить пакет ордеров (${message}), повтор через ${Math.round(retryIn.delay / 1000)} с`);
+      this.onFailed(message, retryIn);
+      summary.error = message;
+      return summary;
+    }
+  }
+
+  static newKey() {
+    if (self.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+  }
+}
+
+// Сканирование страницы: изменения DOM копятся и разбираются пачкой не чаще
+// раза в ORDER_SCAN_THROTTLE_MS, когда браузер свободен (requestIdleCallback).
+// Разбираются только добавленные или изменённые поддеревья, а не вся страница.
+const ORDER_SCAN_THROTTLE_MS = 200;
+const ORDER_SCAN_IDLE_TIMEOUT_MS = 1000;     // не откладывать разбор дольше этого
+const ORDER_ROW_SELECTOR = 'tr, [role="row"], .ant-table-row, .rc-table-row, [data-row-key]';
+
 class BybitOrderTracker {
   constructor() {
     this.settings = {
@@ -9,6 +222,25 @@ class BybitOrderTracker {
     };
     this.observer = null;
     this.processedOrders = new Set();
+    this.pendingScanRoots = new Set();
+    this.scanScheduled = false;
+    this.lastScanAt = 0;
+    // Текст уже разобранных элементов: неизменившиеся строки не разбираются повторно
+    this.scannedRows = new WeakMap();
+    this.scannedElements = new WeakMap();
+    this.uploadQueue = new OrderUploadQueue(() => this.settings.serverUrl, {
+      onFlushed: (result) => {
+        if (result.created > 0) {
+          this.showSuccessNotification(`Сохранено ордеров: ${result.created}`);
+        }
+      },
+      onFailed: (message, retry) => {
+        // Уведомляем только о первой ошибке подряд, дальше очередь повторяет молча
+        if (retry.failures === 1) {
+          this.showErrorNotification(`Сервер недоступен (${message}), ордера сохранены в очереди`);
+        }
+      }
+    });
     this.init();
   }
 
@@ -24,9 +256,15 @@ class BybitOrderTracker {
       } else if (message.action === 'loadExistingOrders') {
         this.loadExistingOrders(message.settings).then(sendResponse);
         return true; // Асинхронный ответ
+      } else if (message.action === 'flushOrderQueue') {
+        this.uploadQueue.retryNow().then(sendResponse);
+        return true; // Асинхронный ответ
       }
     });
 
+    // Очередь отправляется и при выключенном отслеживании: в ней могут остаться ордера
+    this.uploadQueue.start();
+
     // Начинаем отслеживание
     this.startTracking();
   }
@@ -102,44 +340,115 @@ class BybitOrderTracker {
   }
 
   setupObserver() {
-    // Наблюдаем за изменениями в DOM
+    // Наблюдаем за изменениями в DOM: в колбэке только запоминаем изменённые
+    // поддеревья, разбор — пачкой в scanPendingRoots
     this.observer = new MutationObserver((mutations) => {
-      mutations.forEach((mutation) => {
+      for (const mutation of mutations) {
         if (mutation.type === 'childList') {
-          this.checkForNewOrders();
+          mutation.addedNodes.forEach(node => this.queueScanRoot(node));
+        } else {
+          this.queueScanRoot(mutation.target);
         }
-      });
+      }
     });
 
-    // Начинаем наблюдение
+    // Начинаем наблюдение (characterData — смена статуса в уже показанной строке)
     this.observer.observe(document.body, {
       childList: true,
-      subtree: true
+      subtree: true,
+      characterData: true
     });
 
-    // Первоначальная проверка
-    this.checkForNewOrders();
+    // Первоначальная проверка всей страницы
+    this.queueScanRoot(document.body);
   }
 
-  checkForNewOrders() {
-    // Ищем таблицы с ордерами
-    const orderTables = document.querySelectorAll('[data-testid="order-table"], .order-table, table');
-    
-    orderTables.forEach(table => {
-      const rows = table.querySelectorAll('tr');
-      rows.forEach(row => {
-        this.processOrderRow(row);
-      });
+  queueScanRoot(node) {
+    const element = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+    if (!element) return;
+    // Изменение внутри строки ордера: перепроверяем строку целиком
+    this.pendingScanRoots.add(element.closest(ORDER_ROW_SELECTOR) || element);
+    this.scheduleScan();
+  }
+
+  scheduleScan() {
+    if (this.scanScheduled) return;
+    this.scanScheduled = true;
+    const wait = Math.max(0, this.lastScanAt + ORDER_SCAN_THROTTLE_MS - Date.now());
+    setTimeout(() => {
+      if (window.requestIdleCallback) {
+        requestIdleCallback(deadline => this.scanPendingRoots(deadline), { timeout: ORDER_SCAN_IDLE_TIMEOUT_MS });
+      } else {
+        this.scanPendingRoots(null);
+      }
+    }, wait);
+  }
+
+  scanPendingRoots(deadline) {
+    this.scanScheduled = false;
+    this.lastScanAt = Date.now();
+    if (!this.observer) {
+      this.pendingScanRoots.clear();
+      return;
+    }
+
+    const batch = this.pendingScanRoots;
+    this.pendingScanRoots = new Set();
+    const roots = Array.from(batch);
+
+    for (let i = 0; i < roots.length; i++) {
+      if (deadline && !deadline.didTimeout && deadline.timeRemaining() < 1) {
+        // Время простоя кончилось: остальное — в следующий раз
+        roots.slice(i).forEach(root => this.pendingScanRoots.add(root));
+        this.scheduleScan();
+        return;
+      }
+      const root = roots[i];
+      if (root.isConnected && !this.hasAncestorIn(root, batch)) {
+        this.checkForNewOrders(root);
+      }
+    }
+  }
+
+  // Поддерево уже покрыто разбором одного из предков из той же пачки
+  hasAncestorIn(element, roots) {
+    for (let node = element.parentElement; node; node = node.parentElement) {
+      if (roots.has(node)) return true;
+    }
+    return false;
+  }
+
+  // Элементы поддерева root (включая сам root), подходящие под селектор
+  findWithin(root, selector) {
+    const found = Array.from(root.querySelectorAll(selector));
+    if (root.matches && root.matches(selector)) {
+      found.unshift(root);
+    }
+    return found;
+  }
+
+  // Элемент уже разобран с тем же текстом — пропускаем без повторного извлечения данных
+  isUnchanged(element, scanned) {
+    const text = element.textContent;
+    if (scanned.get(element) === text) return true;
+    scanned.set(element, text);
+    return false;
+  }
+
+  checkForNewOrders(root = document) {
+    // Ищем строки таблиц с ордерами
+    this.findWithin(root, 'tr').forEach(row => {
+      this.processOrderRow(row);
     });
 
     // Ищем div-элементы с ордерами (для современных веб-приложений)
-    this.checkForDivOrders();
+    this.checkForDivOrders(root);
 
     // Ищем уведомления о завершении ордеров
-    this.checkOrderNotifications();
+    this.checkOrderNotifications(root);
   }
 
-    checkForDivOrders() {
+    checkForDivOrders(root = document) {
     // Сначала ищем элементы с высокой вероятностью содержания ордеров
     const prioritySelectors = [
       'tbody tr',                 // Строки в tbody (самый вероятный)
@@ -151,8 +460,7 @@ class BybitOrderTracker {
     
     // Проверяем приоритетные селекторы
     for (const selector of prioritySelectors) {
-      const elements = document.querySelectorAll(selector);
-      console.log(`Проверяем селектор ${selector}: найдено ${elements.length} элементов`);
+      const elements = this.findWithin(root, selector);
       
       elements.forEach(element => {
         const elementText = element.textContent;
@@ -198,7 +506,7 @@ class BybitOrderTracker {
     ];
 
     otherSelectors.forEach(selector => {
-      const elements = document.querySelectorAll(selector);
+      const elements = this.findWithin(root, selector);
       elements.forEach(element => {
         const elementText = element.textContent;
         if (this.isLikelyOrderElement(elementText)) {
@@ -242,7 +550,7 @@ class BybitOrderTracker {
     try {
       // Ищем элементы с информацией об ордере
       const cells = row.querySelectorAll('td');
-      if (cells.length < 5) return;
+      if (cells.length < 5 || this.isUnchanged(row, this.scannedRows)) return;
 
       // Извлекаем данные ордера
       const orderData = this.extractOrderData(cells);
@@ -267,7 +575,7 @@ class BybitOrderTracker {
       const textLength = elementText.length;
       
       // Игнорируем элементы интерфейса
-      if (textLength < 20 || textLength > 1000) {
+      if (textLength < 20 || textLength > 1000 || this.isUnchanged(element, this.scannedElements)) {
         return;
       }
       
@@ -610,9 +918,9 @@ class BybitOrderTracker {
     return result;
   }
 
-  checkOrderNotifications() {
+  checkOrderNotifications(root = document) {
     // Ищем уведомления о завершении ордеров
-    const notifications = document.querySelectorAll('.notification, .toast, .alert, [role="alert"]');
+    const notifications = this.findWithin(root, '.notification, .toast, .alert, [role="alert"]');
     
     notifications.forEach(notification => {
       const text = notification.textContent.toLowerCase();
@@ -658,58 +966,16 @@ class BybitOrderTracker {
   }
 
   async sendOrderToServer(orderData) {
+    // Ордер ставится в очередь и уходит на сервер пакетом (см. OrderUploadQueue)
     try {
-      console.log('🚀 Отправляем ордер на сервер:', orderData);
-      console.log('🔗 URL сервера:', `${this.settings.serverUrl}/api/orders`);
-      
-      // Проверяем, что URL сервера задан
-      if (!this.settings.serverUrl) {
-        throw new Error('URL сервера не задан в настройках расширения');
-      }
-      
-      // Проверяем соединение с сервером
-      console.log('🔍 Проверяем соединение с сервером...');
-      
-      const response = await fetch(`${this.settings.serverUrl}/api/orders`, {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify(orderData)
-      });
-
-      console.log('📡 Ответ сервера - статус:', response.status);
-      
-      if (response.ok) {
-        const responseData = await response.json();
-        console.log('✅ Ордер успешно сохранен:', responseData);
-        this.showSuccessNotification('Ордер сохранен в системе');
-        return true;
-      } else {
-        const errorText = await response.text();
-        console.error('❌ Ошибка сохранения ордера:', response.status, errorText);
-        this.showErrorNotification(`Ошибка сохранения ордера: ${response.status}`);
-        return false;
+      const added = await this.uploadQueue.enqueue([orderData]);
+      if (added) {
+        console.log('📥 Ордер поставлен в очередь отправки:', orderData.order_id);
       }
+      return true;
     } catch (error) {
-      console.error('💥 Ошибка отправки ордера:', error);
-      
-      // Детальная диагностика ошибки
-      let errorMessage = 'Ошибка соединения с сервером';
-      
-      if (error.name === 'TypeError' && error.message.includes('Failed to fetch')) {
-        errorMessage = 'Сервер недоступен. Проверьте:\n1. Запущен ли сервер на ' + this.settings.serverUrl + '\n2. Правильность URL в настройках расширения\n3. Не блокирует ли браузер запросы';
-        console.error('🔥 Сервер недоступен! Проверьте:');
-        console.error('   1. Запущен ли сервер на:', this.settings.serverUrl);
-        console.error('   2. Правильность URL в настройках расширения');
-        console.error('   3. Не блокирует ли браузер запросы');
-      } else if (error.name === 'TypeError' && error.message.includes('NetworkError')) {
-        errorMessage = 'Сетевая ошибка. Проверьте интернет-соединение';
-      } else if (error.message.includes('URL сервера не задан')) {
-        errorMessage = 'Настройте URL сервера в расширении';
-      }
-      
-      this.showErrorNotification(errorMessage);
+      console.error('💥 Ошибка постановки ордера в очередь:', error);
+      this.showErrorNotification('Ошибка сохранения ордера в очередь');
       return false;
     }
   }
@@ -910,78 +1176,59 @@ class BybitOrderTracker {
       if (allOrders.length === 0) {
         // Дополнительная отладка - показываем что нашли на странице
         console.log('Отладка: ищем любые элементы с текстом, содержащим ключевые слова...');
-        const allElements = document.querySelectorAll('*');
+        // Один проход по странице: textContent каждого элемента считается один раз
+        const currencyElements = [];
         let foundElements = 0;
         
-        allElements.forEach(el => {
-          const text = el.textContent.toLowerCase();
+        document.querySelectorAll('*').forEach(el => {
+          const rawText = el.textContent;
+          const text = rawText.toLowerCase();
           if ((text.includes('order') || text.includes('trade') || text.includes('buy') || text.includes('sell') ||
                text.includes('продажа') || text.includes('покупка') || text.includes('usdt') || text.includes('rub')) && 
               text.length > 10 && text.length < 500) {
             console.log('Найден элемент с потенциальными данными ордера:', el.tagName, el.className, text.substring(0, 100));
             foundElements++;
           }
+          if (rawText.includes('RUB') || rawText.includes('USDT')) {
+            currencyElements.push(el);
+          }
         });
         
         console.log(`Найдено ${foundElements} элементов с потенциальными данными ордеров`);
         
-        // Специальная отладка для Bybit - ищем элементы с RUB или USDT
+        // Специальная отладка для Bybit - элементы с RUB или USDT
         console.log('Специальная отладка для Bybit:');
-        const bybitElements = document.querySelectorAll('*');
-        bybitElements.forEach(el => {
-          const text = el.textContent;
-          if (text.includes('RUB') || text.includes('USDT')) {
-            console.log('Элемент с валютой:', el.tagName, el.className, text.substring(0, 150));
-          }
+        currencyElements.forEach(el => {
+          console.log('Элемент с валютой:', el.tagName, el.className, el.textContent.substring(0, 150));
         });
         
         this.showNotification(`Ордера не найдены на странице. Найдено ${foundElements} потенциальных элементов.`, 'error');
         return { success: false, error: `Ордера не найдены на странице. Найдено ${foundElements} потенциальных элементов.` };
       }
       
-      // Отправляем ордера на сервер
-      let successCount = 0;
-      let errorCount = 0;
-      
-      for (const orderData of allOrders) {
-        try {
-          const response = await fetch(`${settings.serverUrl}/api/orders`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-            body: JSON.stringify(orderData)
-          });
-
-          if (response.ok) {
-            successCount++;
-            // Добавляем в обработанные, чтобы избежать дублирования
-            this.processedOrders.add(orderData.order_id);
-          } else {
-            errorCount++;
-            console.error('Ошибка сохранения ордера:', orderData.order_id, response.status);
-          }
-        } catch (error) {
-          errorCount++;
-          console.error('Ошибка отправки ордера:', orderData.order_id, error);
-        }
-      }
+      // Ставим ордера в очередь и сразу отправляем её пакетами
+      const queuedCount = await this.uploadQueue.enqueue(allOrders);
+      allOrders.forEach(orderData => this.processedOrders.add(orderData.order_id || orderData.orderId));
+      const result = await this.uploadQueue.retryNow(settings.serverUrl);
+      const pending = await this.uploadQueue.depth();
       
       // Показываем результат
-      if (successCount > 0) {
-        this.showSuccessNotification(`Загружено ${successCount} ордеров!`);
-        if (errorCount > 0) {
-          this.showErrorNotification(`${errorCount} ордеров не удалось загрузить`);
-        }
-      } else {
-        this.showErrorNotification('Не удалось загрузить ни одного ордера');
+      if (result.sent > 0) {
+        this.showSuccessNotification(`Загружено ${result.sent} ордеров!`);
+      }
+      if (pending > 0) {
+        this.showErrorNotification(`${pending} ордеров ждут отправки в очереди${result.error ? ': ' + result.error : ''}`);
+      } else if (result.sent === 0) {
+        this.showSuccessNotification('Все найденные ордера уже были отправлены');
       }
       
       return { 
-        success: successCount > 0, 
-        count: successCount,
+        success: !result.error, 
+        count: result.sent,
         total: allOrders.length,
-        errors: errorCount
+        queued: queuedCount,
+        pending: pending,
+        error: result.error
       };
       
     } catch (error) {
@@ -994,6 +1241,7 @@ class BybitOrderTracker {
   updateTracking() {
     if (this.observer) {
       this.observer.disconnect();
+      this.observer = null;
     }
     
     if (this.settings.trackingEnabled && this.settings.employeeId) {
@@ -6,7 +6,9 @@ function debugBybitOrderExtraction() {
   
   // 1. Ищем все элементы с валютами
   console.log('\n1. Поиск элементов с валютами:');
+  // Оба поиска (валюты и ключевые слова) делаются за один проход по странице
   const currencyElements = [];
+  const keywordElements = [];
   document.querySelectorAll('*').forEach(el => {
     const text = el.textContent;
     if ((text.includes('RUB') || text.includes('USDT') || text.includes('BTC')) && 
@@ -18,29 +20,25 @@ function debugBybitOrderExtraction() {
         className: el.className
       });
     }
-  });
-  
-  console.log(`Найдено ${currencyElements.length} элементов с валютами`);
-  currencyElements.slice(0, 10).forEach((item, index) => {
-    console.log(`${index + 1}. ${item.tag}.${item.className}: ${item.text.substring(0, 100)}`);
-  });
-  
-  // 2. Ищем элементы с ключевыми словами
-  console.log('\n2. Поиск элементов с ключевыми словами:');
-  const keywordElements = [];
-  document.querySelectorAll('*').forEach(el => {
-    const text = el.textContent.toLowerCase();
-    if ((text.includes('продажа') || text.includes('покупка') || text.includes('buy') || text.includes('sell')) && 
+    const lowerText = text.toLowerCase();
+    if ((lowerText.includes('продажа') || lowerText.includes('покупка') || lowerText.includes('buy') || lowerText.includes('sell')) && 
         text.length > 10 && text.length < 300) {
       keywordElements.push({
         element: el,
-        text: el.textContent,
+        text: text,
         tag: el.tagName,
         className: el.className
       });
     }
   });
   
+  console.log(`Найдено ${currencyElements.length} элементов с валютами`);
+  currencyElements.slice(0, 10).forEach((item, index) => {
+    console.log(`${index + 1}. ${item.tag}.${item.className}: ${item.text.substring(0, 100)}`);
+  });
+  
+  // 2. Ищем элементы с ключевыми словами
+  console.log('\n2. Поиск элементов с ключевыми словами:');
   console.log(`Найдено ${keywordElements.length} элементов с ключевыми словами`);
   keywordElements.slice(0, 10).forEach((item, index) => {
     console.log(`${index + 1}. ${item.tag}.${item.className}: ${item.text.substring(0, 100)}`);
@@ -154,37 +154,34 @@ function findBybitOrders() {
     console.log('\n❌ ОРДЕРА НЕ НАЙДЕНЫ');
     console.log('\n🔍 ДОПОЛНИТЕЛЬНАЯ ДИАГНОСТИКА:');
     
-    // Ищем элементы с валютами
+    // Ищем элементы с валютами и с направлением сделки за один проход по странице
     const currencyElements = [];
+    const directionElements = [];
     document.querySelectorAll('*').forEach(el => {
       const text = el.textContent;
-      if ((text.includes('USDT') || text.includes('RUB')) && text.length > 10 && text.length < 300) {
+      if (text.length <= 10 || text.length >= 300) return;
+      if (text.includes('USDT') || text.includes('RUB')) {
         currencyElements.push({
           text: text.substring(0, 100),
           tag: el.tagName,
           className: el.className
         });
       }
-    });
-    
-    console.log(`Найдено ${currencyElements.length} элементов с валютами:`);
-    currencyElements.slice(0, 10).forEach((item, index) => {
-      console.log(`${index + 1}. ${item.tag}.${item.className}: ${item.text}`);
-    });
-    
-    // Ищем элементы с направлением сделки
-    const directionElements = [];
-    document.querySelectorAll('*').forEach(el => {
-      const text = el.textContent.toLowerCase();
-      if ((text.includes('продажа') || text.includes('покупка')) && text.length > 10 && text.length < 300) {
+      const lowerText = text.toLowerCase();
+      if (lowerText.includes('продажа') || lowerText.includes('покупка')) {
         directionElements.push({
-          text: el.textContent.substring(0, 100),
+          text: text.substring(0, 100),
           tag: el.tagName,
           className: el.className
         });
       }
     });
     
+    console.log(`Найдено ${currencyElements.length} элементов с валютами:`);
+    currencyElements.slice(0, 10).forEach((item, index) => {
+      console.log(`${index + 1}. ${item.tag}.${item.className}: ${item.text}`);
+    });
+    
     console.log(`\nНайдено ${directionElements.length} элементов с направлением сделки:`);
     directionElements.slice(0, 10).forEach((item, index) => {
       console.log(`${index + 1}. ${item.tag}.${item.className}: ${item.text}`);
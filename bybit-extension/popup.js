@@ -7,6 +7,8 @@ document.addEventListener('DOMContentLoaded', function() {
   const saveButton = document.getElementById('saveSettings');
   const testButton = document.getElementById('testConnection');
   const loadOrdersButton = document.getElementById('loadExistingOrders');
+  const flushQueueButton = document.getElementById('flushQueue');
+  const queueStatusDiv = document.getElementById('queueStatus');
   const statusDiv = document.getElementById('status');
 
   // Загружаем сохраненные настройки
@@ -14,11 +16,20 @@ document.addEventListener('DOMContentLoaded', function() {
   
   // Загружаем список сотрудников
   loadEmployees();
+  
+  // Показываем очередь отправки и обновляем при каждом её изменении
+  updateQueueStatus();
+  chrome.storage.onChanged.addListener((changes, area) => {
+    if (area === 'local' && changes.orderUpload) {
+      renderQueueStatus(changes.orderUpload.newValue);
+    }
+  });
 
   // Обработчики событий
   saveButton.addEventListener('click', saveSettings);
   testButton.addEventListener('click', testConnection);
   loadOrdersButton.addEventListener('click', loadExistingOrders);
+  flushQueueButton.addEventListener('click', flushQueue);
 
   async function loadSettings() {
     try {
@@ -107,6 +118,53 @@ document.addEventListener('DOMContentLoaded', function() {
     }
   }
 
+  async function updateQueueStatus() {
+    const result = await chrome.storage.local.get('orderUpload');
+    renderQueueStatus(result.orderUpload);
+  }
+
+  function renderQueueStatus(state) {
+    const queued = state ? state.queue.length + (state.inflight ? state.inflight.orders.length : 0) : 0;
+    
+    if (queued === 0) {
+      queueStatusDiv.textContent = 'Очередь отправки пуста';
+      queueStatusDiv.className = 'queue-status';
+      return;
+    }
+    
+    let text = `В очереди на отправку: ${queued} ордеров`;
+    if (state.lastError) {
+      text += `\nПоследняя ошибка: ${state.lastError}`;
+    }
+    if (state.nextRetryAt > Date.now()) {
+      text += `\nПовтор в ${new Date(state.nextRetryAt).toLocaleTimeString()}`;
+    }
+    queueStatusDiv.textContent = text;
+    queueStatusDiv.style.whiteSpace = 'pre-line';
+    queueStatusDiv.className = 'queue-status pending';
+  }
+
+  async function flushQueue() {
+    try {
+      const [tab] = await chrome.tabs.query({ active: true, currentWindow: true });
+      if (!tab) {
+        showStatus('Откройте страницу Bybit для отправки очереди', 'error');
+        return;
+      }
+      
+      showStatus('Отправляем очередь...', 'info');
+      const result = await chrome.tabs.sendMessage(tab.id, { action: 'flushOrderQueue' });
+      
+      if (result && !result.error) {
+        showStatus(`Отправлено ${result.sent} ордеров`, 'success');
+      } else {
+        showStatus('Очередь не отправлена: ' + (result?.error || 'Неизвестная ошибка'), 'error');
+      }
+    } catch (error) {
+      showStatus('Откройте страницу Bybit для отправки очереди', 'error');
+    }
+  }
+
   function showStatus(message, type) {
     statusDiv.textContent = message;
     statusDiv.className = `status ${type}`;
@@ -149,6 +207,8 @@ document.addEventListener('DOMContentLoaded', function() {
         
         if (response && response.success) {
           showStatus(`Загружено ${response.count} ордеров!`, 'success');
+        } else if (response && response.pending > 0) {
+          showStatus(`${response.pending} ордеров в очереди, отправка повторится автоматически`, 'info');
         } else {
           showStatus('Ошибка загрузки ордеров: ' + (response?.error || 'Неизвестная ошибка'), 'error');
         }
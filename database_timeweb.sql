@@ -106,7 +106,7 @@ CREATE TABLE account_balance_history (
 -- Таблица ордеров
 CREATE TABLE `order` (
     id INT AUTO_INCREMENT PRIMARY KEY,
-    order_id VARCHAR(100) NOT NULL UNIQUE,
+    order_id VARCHAR(100) NOT NULL,
     employee_id INT NOT NULL,
     platform VARCHAR(20) NOT NULL DEFAULT 'bybit',
     account_name VARCHAR(100) NOT NULL,
@@ -120,6 +120,7 @@ CREATE TABLE `order` (
     executed_at DATETIME NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_order_platform_order_id (platform, order_id),
     FOREIGN KEY (employee_id) REFERENCES employee(id)
 );
 
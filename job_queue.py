@@ -0,0 +1,247 @@
+"""
+Фоновая очередь задач обработки выгрузок.
+
+Задачи хранятся в таблице БД приложения (модель передаётся при создании
+очереди), поэтому переживают перезапуск и видны всем процессам gunicorn.
+Пул рабочих потоков запускается рядом с веб-приложением в каждом процессе
+(при первом запросе, уже после fork). Задачу выполняет тот поток, который
+первым сменит её статус queued → running условным UPDATE, поэтому одна
+задача выполняется один раз, какой бы процесс её ни увидел.
+
+Переменные окружения:
+    JOB_WORKERS         рабочих потоков на процесс, по умолчанию 2;
+                        0 — задача выполняется сразу в запросе, как раньше
+    JOB_POLL_INTERVAL   как часто свободный поток проверяет таблицу (секунды)
+    JOB_STALE_SECONDS   задача в статусе running, не сообщавшая о прогрессе
+                        дольше этого срока, считается брошенной (процесс упал)
+                        и возвращается в очередь
+    JOB_MAX_ATTEMPTS    сколько раз задача может быть взята в работу; брошенная
+                        задача, исчерпавшая попытки, помечается failed
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+from logging_setup import get_logger
+from orders_parser import collect_parse_stats
+
+logger = get_logger(__name__)
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 10 * 60))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class JobQueue:
+    """
+    Очередь задач поверх таблицы БД.
+
+    Использование:
+        job_queue = JobQueue(app, db, IngestionJob)
+
+        @job_queue.handler('shift_files')
+        def run(payload, progress):
+            ...
+            return {'total_orders': ...}
+
+        job = job_queue.enqueue('shift_files', {...}, report_id=report.id)
+    """
+
+    def __init__(self, app, db, model, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL):
+        self.app = app
+        self.db = db
+        self.model = model
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._last_stale_check = 0.0
+
+    @property
+    def inline(self):
+        return self.workers <= 0
+
+    def handler(self, kind):
+        """
+        Регистрирует обработчик задач вида kind.
+
+        Обработчик получает payload (dict) и progress(done, total) и возвращает
+        результат, сериализуемый в JSON. progress сохраняет прогресс в таблицу
+        через общую сессию, поэтому вызывать его можно только когда в сессии
+        нет незафиксированных изменений обработчика. Заодно progress отмечает,
+        что задача жива (heartbeat_at): долгий обработчик должен вызывать его
+        чаще, чем раз в JOB_STALE_SECONDS, иначе задачу сочтут брошенной.
+        """
+        def register(func):
+            self._handlers[kind] = func
+            return func
+        return register
+
+    def enqueue(self, kind, payload, report_id=None):
+        """Ставит задачу в очередь; при JOB_WORKERS=0 сразу выполняет её"""
+        if kind not in self._handlers:
+            raise ValueError(f'Неизвестный тип задачи: {kind}')
+        job = self.model(
+            kind=kind,
+            status=QUEUED,
+            report_id=report_id,
+            payload_json=json.dumps(payload, ensure_ascii=False)
+        )
+        self.db.session.add(job)
+        self.db.session.commit()
+
+        if self.inline:
+            if self._claim(job.id):
+                self._run(job)
+        else:
+            self.start()
+            self._wakeup.set()
+        return job
+
+    def describe(self, job):
+        """Состояние задачи для API"""
+        return {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'report_id': job.report_id,
+            'progress': {'done': job.progress_done or 0, 'total': job.progress_total or 0},
+            'result': json.loads(job.result_json) if job.result_json else None,
+            'error': job.error,
+            'attempts': job.attempts or 0,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None
+        }
+
+    def start(self):
+        """Запускает рабочие потоки в текущем процессе (после fork — заново)"""
+        if self.inline or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            with self.app.app_context():
+                try:
+                    self.model.__table__.create(self.db.engine, checkfirst=True)
+                except Exception as e:
+                    # Таблицу параллельно создал другой процесс
+                    logger.debug(f"Таблица задач не создана: {str(e)}")
+            self._wakeup = threading.Event()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+            self._pid = os.getpid()
+            logger.info(f"Запущено рабочих потоков фоновых задач: {self.workers}")
+
+    def _worker_loop(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self._requeue_stale()
+                    job_id = self._next_queued_id()
+                    job = self._claim(job_id) if job_id is not None else None
+                    if job is not None:
+                        self._run(job)
+                        continue
+            except Exception:
+                logger.exception("Ошибка рабочего потока фоновых задач")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _next_queued_id(self):
+        return self.db.session.execute(
+            select(self.model.id).where(self.model.status == QUEUED).order_by(self.model.id).limit(1)
+        ).scalar()
+
+    def _claim(self, job_id):
+        """Переводит задачу queued → running; None, если её уже забрал другой поток"""
+        model = self.model
+        now = datetime.utcnow()
+        claimed = self.db.session.execute(
+            update(model)
+            .where(model.id == job_id, model.status == QUEUED)
+            .values(status=RUNNING, started_at=now, heartbeat_at=now, attempts=model.attempts + 1)
+        ).rowcount
+        self.db.session.commit()
+        return self.db.session.get(model, job_id) if claimed else None
+
+    def _requeue_stale(self):
+        """
+        Возвращает в очередь задачи, брошенные упавшим процессом (не чаще раза в минуту).
+        Брошенной считается задача без отметки прогресса дольше JOB_STALE_SECONDS;
+        исчерпавшая JOB_MAX_ATTEMPTS попыток помечается failed, чтобы задача,
+        роняющая процесс, не выполнялась бесконечно.
+        """
+        now = time.monotonic()
+        if now - self._last_stale_check < 60:
+            return
+        self._last_stale_check = now
+        model = self.model
+        utcnow = datetime.utcnow()
+        stale = (
+            model.status == RUNNING,
+            func.coalesce(model.heartbeat_at, model.started_at) < utcnow - timedelta(seconds=JOB_STALE_SECONDS)
+        )
+        failed = self.db.session.execute(
+            update(model)
+            .where(*stale, model.attempts >= JOB_MAX_ATTEMPTS)
+            .values(
+                status=FAILED,
+                error=f'Задача брошена после {JOB_MAX_ATTEMPTS} попыток выполнения',
+                finished_at=utcnow
+            )
+        ).rowcount
+        requeued = self.db.session.execute(
+            update(model).where(*stale).values(status=QUEUED)
+        ).rowcount
+        self.db.session.commit()
+        if failed:
+            logger.error(f"Брошенных задач, исчерпавших попытки: {failed}")
+        if requeued:
+            logger.warning(f"Возвращено в очередь брошенных задач: {requeued}")
+
+    def _run(self, job):
+        session = self.db.session
+        handler = self._handlers.get(job.kind)
+        started = time.perf_counter()
+
+        def progress(done, total):
+            job.progress_done = done
+            job.progress_total = total
+            job.heartbeat_at = datetime.utcnow()
+            session.commit()
+
+        try:
+            if handler is None:
+                raise ValueError(f'Неизвестный тип задачи: {job.kind}')
+            with collect_parse_stats() as stats:
+                result = handler(json.loads(job.payload_json or '{}'), progress)
+            job.result_json = json.dumps(result, ensure_ascii=False, default=str)
+            job.status = DONE
+            logger.info(
+                "Задача %s (%s) выполнена: файлов %d, строк разобрано %d, оставлено %d, разбор %.2f с, всего %.2f с",
+                job.id, job.kind, stats.files, stats.rows_parsed, stats.rows_kept, stats.seconds,
+                time.perf_counter() - started
+            )
+        except Exception as e:
+            session.rollback()
+            job.status = FAILED
+            job.error = str(e)
+            logger.exception(f"Задача {job.id} ({job.kind}) завершилась ошибкой")
+        job.finished_at = datetime.utcnow()
+        session.commit()
@@ -0,0 +1,58 @@
+"""
+Настройка логирования приложения.
+
+Логгеры заводятся по модулям (get_logger(__name__)), уровни задаются
+переменными окружения:
+    LOG_LEVEL          общий уровень, по умолчанию INFO
+    LOG_FILE           файл лога (дополнительно к выводу в консоль)
+    LOG_LEVELS         уровни отдельных логгеров, например "orders_parser=DEBUG,utils=WARNING"
+"""
+
+import logging
+import os
+import threading
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def _level(name, default=logging.INFO):
+    level = logging.getLevelName(str(name).strip().upper())
+    return level if isinstance(level, int) else default
+
+
+def setup_logging():
+    """Настраивает корневой логгер и уровни модулей из окружения (один раз)"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        root = logging.getLogger()
+        if not root.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            root.addHandler(handler)
+        log_file = os.environ.get('LOG_FILE')
+        if log_file:
+            try:
+                os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
+                file_handler = logging.FileHandler(log_file, encoding='utf-8')
+                file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+                root.addHandler(file_handler)
+            except OSError as e:
+                root.warning(f"Не удалось открыть файл лога {log_file}: {str(e)}")
+        root.setLevel(_level(os.environ.get('LOG_LEVEL', 'INFO')))
+
+        for item in os.environ.get('LOG_LEVELS', '').split(','):
+            name, _, level = item.partition('=')
+            if name.strip() and level.strip():
+                logging.getLogger(name.strip()).setLevel(_level(level))
+        _configured = True
+
+
+def get_logger(name):
+    setup_logging()
+    return logging.getLogger(name)
+
@@ -0,0 +1,116 @@
+"""add account balance ledger table
+
+Revision ID: a4c9e2f7b318
+Revises: 8d1f3a6b2e47
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c9e2f7b318'
+down_revision = '8d1f3a6b2e47'
+branch_labels = None
+depends_on = None
+
+# Копии констант app.py на момент миграции
+SHIFT_TYPE_RANKS = {'morning': 0, 'evening': 1}
+BALANCE_PLATFORMS = ['bybit', 'htx', 'bliss', 'gate']
+BACKFILL_PAGE_SIZE = 500
+
+shift_report = sa.table('shift_report',
+    sa.column('id', sa.Integer),
+    sa.column('shift_date', sa.Date),
+    sa.column('shift_type', sa.String),
+    sa.column('balances_json', sa.Text)
+)
+
+
+def _number(value, cast):
+    if value is None or value == '':
+        return None
+    try:
+        return cast(value)
+    except (ValueError, TypeError):
+        return None
+
+
+def _ledger_rows(report):
+    """Строки журнала из balances_json отчёта (как app.balance_ledger_rows)"""
+    try:
+        balances = json.loads(report.balances_json or '{}')
+    except (ValueError, TypeError):
+        return []
+    if not isinstance(balances, dict):
+        return []
+
+    rows = []
+    for platform in BALANCE_PLATFORMS:
+        seen = set()
+        for acc in balances.get(platform) or []:
+            if not isinstance(acc, dict):
+                continue
+            account_id = _number(acc.get('account_id') or acc.get('id'), int)
+            if account_id is None or account_id in seen:
+                continue
+            seen.add(account_id)
+            rows.append({
+                'report_id': report.id,
+                'account_id': account_id,
+                'platform': platform,
+                'shift_date': report.shift_date,
+                'shift_type': report.shift_type,
+                'shift_rank': SHIFT_TYPE_RANKS.get(report.shift_type, 0),
+                'start_balance': _number(acc.get('start_balance'), float),
+                'end_balance': _number(acc.get('end_balance'), float),
+                'balance': _number(acc.get('balance'), float)
+            })
+    return rows
+
+
+def upgrade():
+    ledger = op.create_table('account_balance_ledger',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('report_id', sa.Integer(), nullable=False),
+        sa.Column('account_id', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(length=20), nullable=False),
+        sa.Column('shift_date', sa.Date(), nullable=False),
+        sa.Column('shift_type', sa.String(length=20), nullable=False),
+        sa.Column('shift_rank', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('start_balance', sa.Numeric(precision=20, scale=8), nullable=True),
+        sa.Column('end_balance', sa.Numeric(precision=20, scale=8), nullable=True),
+        sa.Column('balance', sa.Numeric(precision=20, scale=8), nullable=True),
+        sa.ForeignKeyConstraint(['report_id'], ['shift_report.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('report_id', 'platform', 'account_id', name='uq_balance_ledger_report_account')
+    )
+    op.create_index('ix_account_balance_ledger_report_id', 'account_balance_ledger', ['report_id'])
+    op.create_index('ix_balance_ledger_lookup', 'account_balance_ledger',
+                    ['account_id', 'platform', 'shift_date', 'shift_rank'])
+
+    # Заполняем журнал из уже сохранённых отчётов
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        reports = bind.execute(
+            sa.select(shift_report)
+            .where(shift_report.c.id > last_id)
+            .order_by(shift_report.c.id)
+            .limit(BACKFILL_PAGE_SIZE)
+        ).fetchall()
+        if not reports:
+            break
+        rows = [row for report in reports for row in _ledger_rows(report)]
+        if rows:
+            op.bulk_insert(ledger, rows)
+        last_id = reports[-1].id
+
+
+def downgrade():
+    op.drop_index('ix_balance_ledger_lookup', table_name='account_balance_ledger')
+    op.drop_index('ix_account_balance_ledger_report_id', table_name='account_balance_ledger')
+    op.drop_table('account_balance_ledger')
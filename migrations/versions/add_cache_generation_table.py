@@ -0,0 +1,30 @@
+"""add cache generation table
+
+Revision ID: e2b8f4c6a913
+Revises: c7e1d5a9f204
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8f4c6a913'
+down_revision = 'c7e1d5a9f204'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    generation = op.create_table('cache_generation',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('value', sa.Integer(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('name')
+    )
+    # Строка, которую сверяет кэш прибыли (app.PROFIT_CACHE_GENERATION)
+    op.bulk_insert(generation, [{'name': 'profit', 'value': 0}])
+
+
+def downgrade():
+    op.drop_table('cache_generation')
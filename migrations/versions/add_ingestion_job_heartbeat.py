@@ -0,0 +1,27 @@
+"""add ingestion job heartbeat
+
+Revision ID: f5a3c8d1b706
+Revises: e2b8f4c6a913
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f5a3c8d1b706'
+down_revision = 'e2b8f4c6a913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Выполняющиеся задачи без отметки считаются живыми от started_at (см. JobQueue._requeue_stale)
+    with op.batch_alter_table('ingestion_job') as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('ingestion_job') as batch_op:
+        batch_op.drop_column('heartbeat_at')
@@ -0,0 +1,41 @@
+"""add ingestion job table
+
+Revision ID: 9b2e4f6a8c10
+Revises: 7f4c8d9e1a23
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e4f6a8c10'
+down_revision = '7f4c8d9e1a23'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingestion_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='queued'),
+        sa.Column('report_id', sa.Integer(), nullable=True),
+        sa.Column('payload_json', sa.Text(), nullable=False),
+        sa.Column('result_json', sa.Text(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('progress_done', sa.Integer(), server_default='0'),
+        sa.Column('progress_total', sa.Integer(), server_default='0'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP')),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_ingestion_job_status', 'ingestion_job', ['status'])
+
+
+def downgrade():
+    op.drop_index('ix_ingestion_job_status', table_name='ingestion_job')
+    op.drop_table('ingestion_job')
@@ -0,0 +1,33 @@
+"""add ingestion watermark table
+
+Revision ID: 5e8b2c4d7a31
+Revises: 3c7a1d5e9f02
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8b2c4d7a31'
+down_revision = '3c7a1d5e9f02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ingestion_watermark',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(length=20), nullable=False),
+        sa.Column('account_name', sa.String(length=100), nullable=False),
+        sa.Column('covered_from', sa.DateTime(), nullable=False),
+        sa.Column('covered_to', sa.DateTime(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('platform', 'account_name', name='uq_ingestion_watermark_account')
+    )
+
+
+def downgrade():
+    op.drop_table('ingestion_watermark')
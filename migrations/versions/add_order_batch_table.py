@@ -0,0 +1,33 @@
+"""add order batch table
+
+Revision ID: 3c7a1d5e9f02
+Revises: 9b2e4f6a8c10
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7a1d5e9f02'
+down_revision = '9b2e4f6a8c10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_batch',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('idempotency_key', sa.String(length=100), nullable=False),
+        sa.Column('response_json', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('idempotency_key')
+    )
+    op.create_index('ix_order_batch_created_at', 'order_batch', ['created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_order_batch_created_at', table_name='order_batch')
+    op.drop_table('order_batch')
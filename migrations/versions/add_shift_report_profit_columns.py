@@ -0,0 +1,37 @@
+"""add stored profit columns to shift_report
+
+Revision ID: c7e1d5a9f204
+Revises: a4c9e2f7b318
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7e1d5a9f204'
+down_revision = 'a4c9e2f7b318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Уже сохранённые отчёты помечаются на пересчёт: прибыль досчитает фоновая задача report_profits
+    with op.batch_alter_table('shift_report') as batch_op:
+        batch_op.add_column(sa.Column('profit', sa.Numeric(precision=15, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('project_profit', sa.Numeric(precision=15, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('salary_profit', sa.Numeric(precision=15, scale=2), nullable=True))
+        batch_op.add_column(sa.Column('profit_dirty', sa.Boolean(), nullable=False, server_default=sa.true()))
+        batch_op.add_column(sa.Column('profit_revision', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.create_index('ix_shift_report_profit_dirty', ['profit_dirty'])
+
+
+def downgrade():
+    with op.batch_alter_table('shift_report') as batch_op:
+        batch_op.drop_index('ix_shift_report_profit_dirty')
+        batch_op.drop_column('profit_revision')
+        batch_op.drop_column('profit_dirty')
+        batch_op.drop_column('salary_profit')
+        batch_op.drop_column('project_profit')
+        batch_op.drop_column('profit')
@@ -0,0 +1,93 @@
+"""order unique key on (platform, order_id)
+
+Revision ID: 8d1f3a6b2e47
+Revises: 5e8b2c4d7a31
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d1f3a6b2e47'
+down_revision = '5e8b2c4d7a31'
+branch_labels = None
+depends_on = None
+
+
+def _order_table(unique_columns, constraint_name):
+    """Описание таблицы order для пересоздания в SQLite (batch mode)"""
+    return sa.Table('order', sa.MetaData(),
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('order_id', sa.String(length=100), nullable=False),
+        sa.Column('employee_id', sa.Integer(), nullable=False),
+        sa.Column('platform', sa.String(length=20), nullable=False),
+        sa.Column('account_name', sa.String(length=100), nullable=False),
+        sa.Column('symbol', sa.String(length=20), nullable=False),
+        sa.Column('side', sa.String(length=10), nullable=False),
+        sa.Column('quantity', sa.Numeric(precision=15, scale=8), nullable=False),
+        sa.Column('price', sa.Numeric(precision=15, scale=8), nullable=False),
+        sa.Column('total_usdt', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.Column('fees_usdt', sa.Numeric(precision=15, scale=2), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('executed_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.ForeignKeyConstraint(['employee_id'], ['employee.id']),
+        sa.UniqueConstraint(*unique_columns, name=constraint_name)
+    )
+
+
+def _drop_unique_on(columns):
+    """Удаляет уникальные ограничения и индексы таблицы order ровно по columns (имена берутся из базы)"""
+    inspector = sa.inspect(op.get_bind())
+    dropped = set()
+    for constraint in inspector.get_unique_constraints('order'):
+        if constraint['column_names'] == columns and constraint['name'] and constraint['name'] not in dropped:
+            op.drop_constraint(constraint['name'], 'order', type_='unique')
+            dropped.add(constraint['name'])
+    for index in inspector.get_indexes('order'):
+        if index.get('unique') and index['column_names'] == columns and index['name'] not in dropped:
+            op.drop_index(index['name'], table_name='order')
+            dropped.add(index['name'])
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'order' not in sa.inspect(bind).get_table_names():
+        return
+
+    if bind.dialect.name == 'sqlite':
+        # В SQLite ограничение UNIQUE (order_id) безымянное и удаляется только пересозданием таблицы
+        with op.batch_alter_table(
+            'order',
+            copy_from=_order_table(['platform', 'order_id'], 'uq_order_platform_order_id'),
+            recreate='always'
+        ):
+            # Таблица пересоздаётся по copy_from; индекс по employee_id удалён в 6ea14ce19836
+            pass
+        return
+
+    _drop_unique_on(['order_id'])
+    op.create_unique_constraint('uq_order_platform_order_id', 'order', ['platform', 'order_id'])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if 'order' not in sa.inspect(bind).get_table_names():
+        return
+
+    # Номера, повторяющиеся на разных площадках, не дадут вернуть глобальную уникальность
+    if bind.dialect.name == 'sqlite':
+        with op.batch_alter_table(
+            'order',
+            copy_from=_order_table(['order_id'], None),
+            recreate='always'
+        ):
+            pass
+        return
+
+    op.drop_constraint('uq_order_platform_order_id', 'order', type_='unique')
+    op.create_unique_constraint('uq_order_order_id', 'order', ['order_id'])
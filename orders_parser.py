@@ -0,0 +1,1145 @@
+"""
+Векторизованный разбор выгрузок ордеров площадок.
+
+Сопоставление колонок файла с полями ордера выполняется один раз на файл,
+после чего все поля строятся операциями над колонками pandas, а не
+построчным обходом df.iterrows().
+"""
+
+import contextlib
+import contextvars
+import csv
+import hashlib
+import os
+import re
+import time
+import zipfile
+from datetime import datetime
+from itertools import repeat
+
+import parse_cache
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
+
+# Опциональный импорт pandas
+try:
+    import pandas as pd
+    PANDAS_AVAILABLE = True
+except ImportError:
+    PANDAS_AVAILABLE = False
+    pd = None
+
+# Смещение времени площадки относительно МСК (в часах)
+TIMEZONE_OFFSETS = {
+    'bybit': 3,   # Bybit время в UTC+0, МСК это UTC+3 → добавляем 3 часа
+    'htx': -5,    # HTX время в UTC+8, МСК это UTC+3 → вычитаем 5 часов
+    'bliss': 3,   # Bliss время в UTC+0, МСК это UTC+3 → добавляем 3 часа
+    'gate': 0     # Gate.io: пока без смещения (можно настроить позже)
+}
+
+# Формат времени в выгрузках Bybit и HTX
+BYBIT_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+HTX_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Правила сопоставления колонок Bybit: колонка относится к первому полю,
+# в шаблонах которого нашлась подстрока её названия
+BYBIT_COLUMN_RULES = [
+    ('order_id', ['order no', 'order id', 'orderid', 'order_id', 'номер']),
+    ('symbol', ['cryptocurrency', 'symbol', 'pair', 'пара', 'инструмент', 'currency', 'валюта']),
+    ('side', ['side', 'type', 'тип', 'направление']),
+    ('quantity', ['coin amount', 'coinamount', 'coin_amount']),
+    ('price', ['price', 'цена', 'курс']),
+    ('total_usdt', ['fiat amount', 'fiatamount', 'fiat_amount']),
+    ('status', ['status', 'статус']),
+    ('executed_at', ['time', 'date', 'время', 'дата', 'created']),
+]
+
+# Точные названия колонок выгрузки HTX
+HTX_COLUMNS = {
+    'Номер:': 'order_id',
+    'Монета': 'symbol',
+    'Тип': 'side',
+    'Количество': 'quantity',
+    'Цена за ед.': 'price',
+    'Общая цена': 'total_usdt',
+    'Статус': 'status',
+    'Время': 'executed_at',
+}
+
+# Колонки выгрузки Bliss; все они обязательны
+BLISS_COLUMNS = {
+    'Creation date': 'executed_at',
+    'Internal id': 'order_id',
+    'Organization user': 'account_name',
+    'Amount': 'total_usdt',
+    'Crypto amount': 'quantity',
+    'Status': 'status',
+    'Method': 'side',
+}
+BLISS_REQUIRED_COLUMNS = list(BLISS_COLUMNS)
+# Разделители, которые встречаются в выгрузках Bliss (в порядке приоритета)
+BLISS_SEPARATORS = [';', ',', '\t']
+BLISS_TIME_FORMAT = '%d.%m.%Y %H:%M:%S'
+
+# Формат времени в исходной выгрузке площадки (для отсечения строк по окну до разбора)
+RAW_TIME_FORMATS = {
+    'bybit': BYBIT_TIME_FORMAT,
+    'gate': BYBIT_TIME_FORMAT,
+    'htx': HTX_TIME_FORMAT,
+    'bliss': BLISS_TIME_FORMAT,
+}
+
+EMPTY_VALUES = ['nan', 'none', '']
+
+# Версия нормализации ордеров: увеличить при любом изменении результата разбора,
+# чтобы не читать устаревшие записи из кэша разбора
+PARSER_VERSION = 6
+
+# Размер пачки строк при потоковом чтении выгрузок
+STREAM_CHUNK_SIZE = 5000
+
+
+def _compile_contains_rules(rules):
+    """Собирает шаблоны подстрок каждого поля в одно регулярное выражение"""
+    return [
+        (field, re.compile('|'.join(re.escape(pattern) for pattern in patterns)))
+        for field, patterns in rules
+    ]
+
+
+# Реестр правил сопоставления колонок по площадкам:
+#   'contains' — колонка относится к первому полю, шаблон которого входит в её название
+#   'exact'    — колонка сопоставляется по точному названию
+COLUMN_RULES = {
+    'bybit': ('contains', _compile_contains_rules(BYBIT_COLUMN_RULES)),
+    'gate': ('contains', _compile_contains_rules(BYBIT_COLUMN_RULES)),
+    'htx': ('exact', HTX_COLUMNS),
+    'bliss': ('exact', BLISS_COLUMNS),
+}
+
+# Кэш сопоставлений: (площадка, отпечаток заголовка) → {поле: [колонки]}
+COLUMN_MAPPING_CACHE_SIZE = 256
+_column_mapping_cache = {}
+
+
+def header_fingerprint(columns):
+    """Отпечаток заголовка файла: SHA-1 от кортежа названий колонок"""
+    header = '\x1f'.join(repr(col) for col in columns)
+    return hashlib.sha1(header.encode('utf-8')).hexdigest()
+
+
+def _match_columns(kind, rules, columns):
+    """Один проход по колонкам заголовка: O(колонок), а не O(строк × колонок)"""
+    mapping = {}
+    for col in columns:
+        if kind == 'contains':
+            col_lower = str(col).lower().strip()
+            field = next((name for name, pattern in rules if pattern.search(col_lower)), None)
+        else:
+            field = rules.get(str(col).strip())
+        if field:
+            mapping.setdefault(field, []).append(col)
+    return mapping
+
+
+def resolve_columns(platform, columns):
+    """
+    Сопоставляет колонки файла с полями ордера по правилам площадки.
+
+    Результат кэшируется по отпечатку заголовка, поэтому для всех пачек
+    одного файла (и для повторных выгрузок того же формата) сопоставление
+    выполняется один раз. Возвращаемый словарь общий — не изменять.
+
+    Returns:
+        dict: {поле: [колонки в порядке файла]}
+    """
+    platform = platform.lower()
+    columns = tuple(columns)
+    key = (platform, header_fingerprint(columns))
+    mapping = _column_mapping_cache.get(key)
+    if mapping is None:
+        kind, rules = COLUMN_RULES[platform]
+        mapping = _match_columns(kind, rules, columns)
+        if len(_column_mapping_cache) >= COLUMN_MAPPING_CACHE_SIZE:
+            _column_mapping_cache.pop(next(iter(_column_mapping_cache)))
+        _column_mapping_cache[key] = mapping
+    return mapping
+
+
+def describe_columns(platform, columns):
+    """
+    Описание сопоставления колонок для отладки: какие колонки к каким полям
+    отнесены, какие проигнорированы и каких полей в файле нет.
+    """
+    platform = platform.lower()
+    columns = list(columns)
+    kind, rules = COLUMN_RULES[platform]
+    fields = [field for field, _ in rules] if kind == 'contains' else list(dict.fromkeys(rules.values()))
+    mapping = resolve_columns(platform, columns)
+    mapped = {col for cols in mapping.values() for col in cols}
+    return {
+        'platform': platform,
+        'fingerprint': header_fingerprint(columns),
+        'match': kind,
+        'mapping': {field: [str(col) for col in cols] for field, cols in mapping.items()},
+        'unmapped': [str(col) for col in columns if col not in mapped],
+        'missing': [field for field in fields if field not in mapping],
+    }
+
+
+def _text(column):
+    """Строковое представление колонки: str(value).strip() для каждого значения"""
+    return column.map(str).str.strip().astype(object)
+
+
+def _to_float(text):
+    """
+    Преобразует строки в float с семантикой float(): значения, которые
+    не смог разобрать pd.to_numeric, добираются построчно.
+    """
+    values = pd.to_numeric(text, errors='coerce')
+    failed = values.isna() & (text != '')
+    if failed.any():
+        def _py_float(value):
+            try:
+                return float(value)
+            except (ValueError, TypeError):
+                return float('nan')
+        values = values.copy()
+        values[failed] = text[failed].map(_py_float)
+    return values.astype(float)
+
+
+def _clean_number(text):
+    """Оставляет в значении только цифры и разделители, как re.sub(r'[^\\d.,]', '', ...)"""
+    cleaned = text.str.replace(r'[^\d.,]', '', regex=True).str.replace(',', '.', regex=False)
+    return _to_float(cleaned.astype(object))
+
+
+def _to_float_strict(text):
+    """
+    Как _to_float, но дополнительно возвращает маску строк, для которых
+    float() не выбросил бы исключение (литерал 'nan' считается разобранным).
+    """
+    values = _to_float(text)
+    parsed = values.notna() | text.str.lower().isin(['nan', '+nan', '-nan'])
+    return values, parsed
+
+
+def _parse_datetimes(text, date_format):
+    """
+    Разбирает колонку времени одним вызовом pd.to_datetime с явным форматом.
+    Значения в другом формате разбираются построчно, как раньше.
+    """
+    present = (text != '') & (text != 'nan')
+    parsed = pd.to_datetime(text.where(present, None), format=date_format, errors='coerce')
+    retry = present & parsed.isna()
+    if retry.any():
+        def _parse_one(value):
+            try:
+                return pd.to_datetime(value)
+            except Exception:
+                return pd.NaT
+        parsed = parsed.astype(object)
+        parsed[retry] = text[retry].map(_parse_one)
+        parsed = pd.to_datetime(parsed, errors='coerce')
+    return parsed
+
+
+def _overlay(current, update):
+    """Значение из более правой колонки перекрывает предыдущее, если оно задано"""
+    if current is None:
+        return update
+    return update.where(update.notna(), current)
+
+
+def _nullable(column):
+    """NaN → None для выдачи в поля ордеров"""
+    return column.astype(object).where(column.notna(), None)
+
+
+def to_moscow_time(executed_at, platform):
+    """Переводит колонку времени из часового пояса площадки в московское (TIMEZONE_OFFSETS)"""
+    offset_hours = TIMEZONE_OFFSETS.get(platform.lower(), 0)
+    if offset_hours:
+        return executed_at + pd.Timedelta(hours=offset_hours)
+    return executed_at
+
+
+def _time_window_mask(executed_at, start_date=None, end_date=None):
+    """Маска строк, попадающих в [start_date, end_date]"""
+    mask = pd.Series(True, index=executed_at.index)
+    if start_date:
+        mask &= ~(executed_at < start_date)
+    if end_date:
+        mask &= ~(executed_at > end_date)
+    return mask
+
+
+def _fill_missing_amounts(quantity, price, total):
+    """
+    Досчитывает недостающие цену и сумму: price = total / quantity,
+    затем total = price * quantity.
+    """
+    quantity_set = quantity.notna() & (quantity != 0)
+    fill_price = price.isna() & quantity_set & total.notna() & (total != 0)
+    price = price.where(~fill_price, total / quantity)
+    fill_total = total.isna() & price.notna() & (price != 0) & quantity_set
+    total = total.where(~fill_total, price * quantity)
+    return price, total
+
+
+class ParsedOrder:
+    """
+    Разобранный ордер выгрузки — внутреннее представление между разбором,
+    фильтрами и записью в БД. Благодаря __slots__ у ордера нет словаря
+    атрибутов; в словарь он превращается только на границе API (to_dict).
+
+    export_account — имя аккаунта из выгрузки (есть только у Bliss), undated —
+    дата не разобрана и executed_at — момент выдачи ордера (см. frame_to_orders).
+    """
+
+    __slots__ = ('order_id', 'symbol', 'side', 'quantity', 'price', 'total_usdt',
+                 'fees_usdt', 'status', 'executed_at', 'export_account', 'undated')
+
+    def __init__(self, order_id, symbol, side, quantity, price, total_usdt, status, executed_at,
+                 export_account=None, undated=False, fees_usdt=0):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.total_usdt = total_usdt
+        self.fees_usdt = fees_usdt
+        self.status = status
+        self.executed_at = executed_at
+        self.export_account = export_account
+        self.undated = undated
+
+    def __reduce__(self):
+        # Компактный pickle для пула процессов: позиционные аргументы без имён полей
+        return (ParsedOrder, (self.order_id, self.symbol, self.side, self.quantity, self.price,
+                              self.total_usdt, self.status, self.executed_at,
+                              self.export_account, self.undated, self.fees_usdt))
+
+    def __repr__(self):
+        return f"ParsedOrder({self.order_id!r}, {self.side!r}, {self.total_usdt!r}, {self.executed_at!r})"
+
+    def to_dict(self):
+        """Словарь ордера в прежнем формате: export_account и undated — только если заданы"""
+        record = {
+            'order_id': self.order_id,
+            'symbol': self.symbol,
+            'side': self.side,
+            'quantity': self.quantity,
+            'price': self.price,
+            'total_usdt': self.total_usdt,
+            'fees_usdt': self.fees_usdt,
+            'status': self.status,
+            'executed_at': self.executed_at
+        }
+        if self.export_account is not None:
+            record['export_account'] = self.export_account
+        if self.undated:
+            record['undated'] = True
+        return record
+
+
+def _build_records(frame):
+    """
+    Собирает список ParsedOrder из колонок. Если в выгрузке есть имя
+    аккаунта (Bliss), оно попадает в export_account; строки без времени
+    (колонка undated) помечаются undated=True.
+
+    Время отдаётся как datetime, а не pd.Timestamp: объект втрое меньше.
+    """
+    count = len(frame)
+    export_accounts = frame['export_account'].tolist() if 'export_account' in frame.columns else repeat(None, count)
+    undated = frame['undated'].tolist() if 'undated' in frame.columns else repeat(False, count)
+    return list(map(
+        ParsedOrder,
+        frame['order_id'].tolist(),
+        frame['symbol'].tolist(),
+        _nullable(frame['side']).tolist(),
+        frame['quantity'].tolist(),
+        _nullable(frame['price']).tolist(),
+        _nullable(frame['total_usdt']).tolist(),
+        frame['status'].tolist(),
+        frame['executed_at'].to_numpy(dtype='datetime64[us]').tolist(),
+        export_accounts,
+        undated
+    ))
+
+
+def _assemble_frame(index, fields, platform):
+    """
+    Общий финальный этап разбора: досчитывает цену/сумму, отбрасывает неполные
+    строки и переводит время в МСК.
+
+    Args:
+        index: индекс исходного DataFrame
+        fields: {поле: колонка или None, если в файле такой колонки нет}
+    """
+    def _column(name, default):
+        column = fields.get(name)
+        return column if column is not None else pd.Series(default, index=index, dtype=object)
+
+    nan_column = pd.Series(float('nan'), index=index)
+    frame = pd.DataFrame({
+        'order_id': _column('order_id', None),
+        'symbol': _column('symbol', None),
+        'side': _column('side', None),
+        'quantity': fields.get('quantity') if fields.get('quantity') is not None else nan_column,
+        'status': _column('status', None),
+    }, index=index)
+    frame['price'], frame['total_usdt'] = _fill_missing_amounts(
+        frame['quantity'],
+        fields.get('price') if fields.get('price') is not None else nan_column,
+        fields.get('total_usdt') if fields.get('total_usdt') is not None else nan_column
+    )
+    frame['symbol'] = frame['symbol'].fillna('USDT')
+    frame['status'] = frame['status'].fillna('filled')
+
+    # Пропускаем строки без ID, количества или цены/суммы
+    valid = (
+        frame['order_id'].notna() & (frame['order_id'] != '')
+        & frame['quantity'].notna()
+        & (frame['price'].notna() | frame['total_usdt'].notna())
+    )
+    skipped = int((~valid).sum())
+    if skipped:
+        logger.debug("Пропущено строк %s без необходимых данных: %d", platform, skipped)
+    frame = frame[valid]
+
+    # Строки без времени остаются NaT (время выставит frame_to_orders) и помечаются
+    # undated: в загруженные интервалы аккаунта (OrderWatermarks) они не попадают.
+    # В окно по времени они фильтруются по этому времени, как и раньше (windowed=True)
+    executed_at = fields.get('executed_at')
+    if executed_at is None:
+        executed_at = pd.Series(pd.NaT, index=index, dtype='datetime64[ns]')
+    executed_at = executed_at[valid]
+    frame['executed_at'] = to_moscow_time(executed_at, platform)
+    frame['windowed'] = True
+    frame['undated'] = executed_at.isna()
+
+    return frame
+
+
+def frame_to_orders(frame, start_date=None, end_date=None):
+    """
+    Фильтрует нормализованный кадр по окну [start_date, end_date] и возвращает
+    список ParsedOrder. Строки с windowed=False (Bliss с неразборчивой
+    датой) в окно не фильтруются, как и раньше.
+
+    Время строкам без времени (NaT в кадре) выставляется здесь, текущим
+    моментом, до фильтра по окну: строки Bybit/HTX/Gate без времени, как и
+    раньше, отбрасываются окном, которое закончилось до загрузки. Кадр может
+    быть прочитан из кэша разбора, и «текущее» время, сохранённое при разборе,
+    было бы временем давнего разбора.
+    """
+    if frame['executed_at'].isna().any():
+        frame = frame.assign(executed_at=frame['executed_at'].fillna(pd.Timestamp(datetime.now())))
+    if start_date or end_date:
+        frame = frame[_time_window_mask(frame['executed_at'], start_date, end_date) | ~frame['windowed']]
+    return _build_records(frame)
+
+
+def normalize_bybit_frame(df, platform='bybit'):
+    """
+    Разбирает DataFrame выгрузки Bybit (и Gate, который использует тот же формат).
+
+    Возвращает нормализованный кадр ордеров: колонки по BYBIT_COLUMN_RULES,
+    время — в МСК.
+    """
+    mapping = resolve_columns(platform, df.columns)
+    index = df.index
+
+    order_id = None
+    for col in mapping.get('order_id', []):
+        order_id = _text(df[col])
+
+    symbol = None
+    for col in mapping.get('symbol', []):
+        text = _text(df[col])
+        symbol = _overlay(symbol, text.str.upper().where(~text.str.lower().isin(EMPTY_VALUES), None))
+
+    side = None
+    for col in mapping.get('side', []):
+        lower = _text(df[col]).str.lower()
+        value = pd.Series(None, index=index, dtype=object)
+        value[lower.str.contains('sell|продажа|short', regex=True).astype(bool)] = 'sell'
+        value[lower.str.contains('buy|покупка|long', regex=True).astype(bool)] = 'buy'
+        side = _overlay(side, value)
+
+    amounts = {}
+    for field in ('quantity', 'price', 'total_usdt'):
+        for col in mapping.get(field, []):
+            amounts[field] = _overlay(amounts.get(field), _clean_number(_text(df[col])))
+
+    status = None
+    for col in mapping.get('status', []):
+        lower = _text(df[col]).str.lower()
+        value = pd.Series('filled', index=index, dtype=object)
+        value[lower.str.contains('pending|ожидание', regex=True).astype(bool)] = 'pending'
+        value[lower.str.contains('canceled|отменен', regex=True).astype(bool)] = 'canceled'
+        value[lower.str.contains('completed|завершен', regex=True).astype(bool)] = 'filled'
+        status = _overlay(status, value.where(~lower.isin(EMPTY_VALUES), None))
+
+    executed_at = None
+    for col in mapping.get('executed_at', []):
+        executed_at = _overlay(executed_at, _parse_datetimes(_text(df[col]), BYBIT_TIME_FORMAT))
+
+    return _assemble_frame(index, {
+        'order_id': order_id,
+        'symbol': symbol,
+        'side': side,
+        'quantity': amounts.get('quantity'),
+        'price': amounts.get('price'),
+        'total_usdt': amounts.get('total_usdt'),
+        'status': status,
+        'executed_at': executed_at
+    }, platform)
+
+
+def normalize_htx_frame(df, platform='htx'):
+    """
+    Разбирает DataFrame выгрузки HTX.
+
+    Возвращает нормализованный кадр ордеров: колонки по HTX_COLUMNS,
+    время — в МСК.
+    """
+    mapping = resolve_columns(platform, df.columns)
+    index = df.index
+
+    order_id = None
+    for col in mapping.get('order_id', []):
+        order_id = _text(df[col])
+
+    symbol = None
+    for col in mapping.get('symbol', []):
+        text = _text(df[col])
+        symbol = _overlay(symbol, text.str.upper().where(~text.str.lower().isin(EMPTY_VALUES), None))
+
+    side = None
+    for col in mapping.get('side', []):
+        text = _text(df[col])
+        value = pd.Series(None, index=index, dtype=object)
+        value[text.str.contains('Купить|купить', regex=True).astype(bool)] = 'buy'
+        value[text.str.contains('Продать|продать', regex=True).astype(bool)] = 'sell'
+        side = _overlay(side, value)
+
+    amounts = {}
+    for field in ('quantity', 'price', 'total_usdt'):
+        for col in mapping.get(field, []):
+            text = _text(df[col])
+            # Числа HTX могут быть с запятой вместо точки
+            text = text.where(text != 'nan', '').str.replace(',', '.', regex=False).astype(object)
+            amounts[field] = _overlay(amounts.get(field), _to_float(text))
+
+    status = None
+    for col in mapping.get('status', []):
+        text = _text(df[col])
+        value = pd.Series('filled', index=index, dtype=object)
+        value[text.str.contains('Ожидание|ожидание', regex=True).astype(bool)] = 'pending'
+        value[text.str.contains('Отменено|отменено', regex=True).astype(bool)] = 'canceled'
+        value[text.str.contains('Завершено|завершено', regex=True).astype(bool)] = 'filled'
+        status = _overlay(status, value.where(~text.str.lower().isin(EMPTY_VALUES), None))
+
+    executed_at = None
+    for col in mapping.get('executed_at', []):
+        executed_at = _overlay(executed_at, _parse_datetimes(_text(df[col]), HTX_TIME_FORMAT))
+
+    return _assemble_frame(index, {
+        'order_id': order_id,
+        'symbol': symbol,
+        'side': side,
+        'quantity': amounts.get('quantity'),
+        'price': amounts.get('price'),
+        'total_usdt': amounts.get('total_usdt'),
+        'status': status,
+        'executed_at': executed_at
+    }, platform)
+
+
+def sniff_bliss_separator(filepath):
+    """
+    Определяет разделитель выгрузки Bliss по строке заголовка.
+
+    Returns:
+        str или None, если ни с одним разделителем не нашлись нужные колонки
+    """
+    with open(filepath, 'r', encoding='utf-8') as f:
+        header = f.readline()
+    return _sniff_separator(header)
+
+
+def _sniff_separator(header):
+    """Разделитель, с которым в строке заголовка Bliss находятся все нужные колонки"""
+    for sep in BLISS_SEPARATORS:
+        columns = next(csv.reader([header], delimiter=sep, quotechar='"'), [])
+        if all(col in columns for col in BLISS_REQUIRED_COLUMNS):
+            return sep
+    return None
+
+
+def normalize_bliss_frame(df, platform='bliss'):
+    """
+    Разбирает DataFrame выгрузки Bliss.
+
+    Возвращает нормализованный кадр ордеров: строки с неразборчивой датой помечаются
+    windowed=False (в окно по времени не фильтруются) и undated, время им
+    выставляет frame_to_orders.
+    """
+    mapping = resolve_columns(platform, df.columns)
+    index = df.index
+
+    def _field(name):
+        return _text(df[mapping[name][0]])
+
+    order_id = _field('order_id')
+    account_name = _field('account_name')
+    amount = _field('total_usdt').str.replace(' ', '', regex=False).str.replace(',', '.', regex=False).astype(object)
+    crypto_amount = _field('quantity').str.replace(' ', '', regex=False).str.replace(',', '.', regex=False).astype(object)
+    status = _field('status').str.lower()
+    method = _field('side').str.lower()
+    creation_date = _field('executed_at')
+
+    # Время: при успешном разборе переводим в МСК
+    parsed = pd.to_datetime(creation_date.where(creation_date != '', None), format=BLISS_TIME_FORMAT, errors='coerce')
+    retry = (creation_date != '') & parsed.isna()
+    if retry.any():
+        def _strptime(value):
+            try:
+                return datetime.strptime(value, BLISS_TIME_FORMAT)
+            except (ValueError, TypeError):
+                return pd.NaT
+        parsed = parsed.astype(object)
+        parsed[retry] = creation_date[retry].map(_strptime)
+        parsed = pd.to_datetime(parsed, errors='coerce')
+    date_parsed = parsed.notna()
+    # Неразборчивое время остаётся NaT: его выставит frame_to_orders
+    executed_at = to_moscow_time(parsed, platform)
+
+    total_usdt, total_parsed = _to_float_strict(amount)
+    quantity, quantity_parsed = _to_float_strict(crypto_amount)
+
+    valid = total_parsed & quantity_parsed & (order_id != '') & (account_name != '')
+    skipped = int((~valid).sum())
+    if skipped:
+        logger.debug("BLISS: Пропущено строк: %d из %d", skipped, len(df))
+
+    side = pd.Series('buy', index=index, dtype=object)
+    side[method.isin(['sell', 'продажа', 'продать'])] = 'sell'
+
+    order_status = pd.Series('pending', index=index, dtype=object)
+    order_status[status.isin(['failed'])] = 'failed'
+    order_status[status.isin(['expired'])] = 'expired'
+    order_status[status.isin(['cancelled', 'canceled'])] = 'canceled'
+    order_status[status.isin(['success', 'completed', 'done'])] = 'filled'
+
+    frame = pd.DataFrame({
+        'order_id': order_id,
+        'symbol': 'USDT',
+        'side': side,
+        'quantity': quantity,
+        'price': (total_usdt / quantity).where(quantity > 0, 0.0),
+        'total_usdt': total_usdt,
+        'status': order_status,
+        'executed_at': executed_at,
+        'export_account': account_name,
+        'windowed': date_parsed,
+        'undated': ~date_parsed
+    }, index=index)
+    return frame[valid]
+
+
+# Векторные парсеры по площадкам (Gate использует формат Bybit)
+FRAME_PARSERS = {
+    'bybit': normalize_bybit_frame,
+    'gate': normalize_bybit_frame,
+    'htx': normalize_htx_frame,
+    'bliss': normalize_bliss_frame,
+}
+
+
+def _excel_value(value):
+    """
+    Значение ячейки в том виде, в каком его отдаёт pd.read_excel:
+    пустые ячейки → NaN, целые float → int.
+    """
+    if value is None or value == '':
+        return float('nan')
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _excel_header(values):
+    """Названия колонок как у pd.read_excel: пустые → 'Unnamed: i', повторы → 'имя.1'"""
+    columns = []
+    seen = {}
+    for i, value in enumerate(values):
+        name = f'Unnamed: {i}' if value is None or value == '' else value
+        if name in seen:
+            seen[name] += 1
+            name = f'{name}.{seen[name]}'
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def _mapped_positions(platform, columns, fields=None):
+    """Индексы колонок заголовка, которые нужны правилам площадки (или только полям fields)"""
+    mapped = {
+        col for field, cols in resolve_columns(platform, columns).items()
+        if fields is None or field in fields
+        for col in cols
+    }
+    return [i for i, col in enumerate(columns) if col in mapped]
+
+
+def _iter_xlsx_rows(filepath, platform, fields=None):
+    """
+    Строки первого листа .xlsx: заголовок целиком, дальше только колонки,
+    нужные правилам площадки (остальные ячейки даже не декодируются).
+    filepath — путь или двоичный файловый объект.
+    """
+    from xlsx_reader import XlsxSheetReader
+    with XlsxSheetReader(filepath) as reader:
+        header = next(reader.iter_rows(), None)
+        if header is None:
+            return
+        columns = _excel_header(header)
+        yield columns
+        rows = reader.iter_rows(_mapped_positions(platform, columns, fields))
+        next(rows, None)  # заголовок уже прочитан
+        yield from rows
+
+
+def _iter_xls_rows(filepath, platform, fields=None):
+    """Строки первого листа старого формата .xls (аналогично _iter_xlsx_rows)"""
+    import xlrd
+    if hasattr(filepath, 'read'):
+        filepath.seek(0)
+        book = xlrd.open_workbook(file_contents=filepath.read(), on_demand=True)
+    else:
+        book = xlrd.open_workbook(filepath, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        if sheet.nrows == 0:
+            return
+        columns = _excel_header(sheet.row_values(0))
+        yield columns
+        positions = _mapped_positions(platform, columns, fields)
+        for i in range(1, sheet.nrows):
+            cells = sheet.row(i)
+            row = []
+            for cell in (cells[p] if p < len(cells) else None for p in positions):
+                if cell is None:
+                    row.append(None)
+                    continue
+                if cell.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK, xlrd.XL_CELL_ERROR):
+                    row.append(None)
+                elif cell.ctype == xlrd.XL_CELL_DATE:
+                    row.append(xlrd.xldate.xldate_as_datetime(cell.value, book.datemode))
+                elif cell.ctype == xlrd.XL_CELL_BOOLEAN:
+                    row.append(bool(cell.value))
+                else:
+                    row.append(cell.value)
+            yield row
+    finally:
+        book.release_resources()
+
+
+def _iter_excel_rows(filepath, platform, fields=None):
+    """Выбирает читатель по содержимому файла: .xlsx — zip-архив, иначе старый .xls"""
+    if zipfile.is_zipfile(filepath):
+        return _iter_xlsx_rows(filepath, platform, fields)
+    return _iter_xls_rows(filepath, platform, fields)
+
+
+def iter_excel_frames(filepath, platform, chunksize=STREAM_CHUNK_SIZE, fields=None):
+    """
+    Потоково читает первый лист Excel-выгрузки пачками по chunksize строк.
+
+    Колонки сопоставляются по заголовку один раз, из строк читаются только
+    колонки, нужные правилам площадки. Значения ячеек приводятся к тому же
+    виду, что у pd.read_excel, поэтому дальше работает общий этап нормализации.
+    fields ограничивает чтение колонками указанных полей ордера.
+    """
+    rows = _iter_excel_rows(filepath, platform, fields)
+    try:
+        columns = next(rows, None)
+        if columns is None:
+            return
+        names = [columns[i] for i in _mapped_positions(platform, columns, fields)]
+
+        chunk = []
+        start = 0
+        for row in rows:
+            if all(value is None or value == '' for value in row):
+                continue
+            chunk.append([_excel_value(value) for value in row])
+            if len(chunk) >= chunksize:
+                yield pd.DataFrame(chunk, columns=names, index=pd.RangeIndex(start, start + len(chunk)), dtype=object)
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=names, index=pd.RangeIndex(start, start + len(chunk)), dtype=object)
+    finally:
+        rows.close()
+
+
+def iter_order_frames(filepath, platform, chunksize=STREAM_CHUNK_SIZE):
+    """
+    Читает выгрузку пачками по chunksize строк.
+
+    CSV читается потоково (все колонки как строки, чтобы разбор пачки не зависел
+    от типов, выведенных по соседним строкам), Excel — через iter_excel_frames.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+
+    if platform == 'bliss':
+        sep = sniff_bliss_separator(filepath)
+        if sep is None:
+            logger.warning(f"BLISS: В заголовке файла {filepath} не найдены колонки {BLISS_REQUIRED_COLUMNS}")
+            return
+        reader = pd.read_csv(filepath, sep=sep, encoding='utf-8', quotechar='"', header=0,
+                             usecols=BLISS_REQUIRED_COLUMNS, dtype=str, chunksize=chunksize)
+    elif ext in ['.csv']:
+        reader = pd.read_csv(filepath, dtype=str, chunksize=chunksize)
+    elif ext in ['.xlsx', '.xls']:
+        yield from iter_excel_frames(filepath, platform, chunksize)
+        return
+    else:
+        raise Exception(f"Неподдерживаемый формат файла: {ext}")
+
+    with reader:
+        for chunk in reader:
+            yield chunk
+
+
+def read_order_header(filepath, platform):
+    """Читает только заголовок выгрузки (список колонок), не загружая строки"""
+    ext = os.path.splitext(filepath)[1].lower()
+    if platform.lower() == 'bliss':
+        sep = sniff_bliss_separator(filepath) or BLISS_SEPARATORS[0]
+        return list(pd.read_csv(filepath, sep=sep, encoding='utf-8', quotechar='"', nrows=0).columns)
+    if ext in ['.csv']:
+        return list(pd.read_csv(filepath, nrows=0).columns)
+    if ext in ['.xlsx', '.xls']:
+        rows = _iter_excel_rows(filepath, platform)
+        try:
+            return next(rows, [])
+        finally:
+            rows.close()
+    raise Exception(f"Неподдерживаемый формат файла: {ext}")
+
+
+def raw_window_bounds(platform, start_date=None, end_date=None):
+    """
+    Переводит окно по МСК во время площадки: смещение часового пояса
+    переносится на границы, а не на каждую строку.
+    """
+    offset = pd.Timedelta(hours=TIMEZONE_OFFSETS.get(platform.lower(), 0))
+    return (
+        pd.Timestamp(start_date) - offset if start_date else None,
+        pd.Timestamp(end_date) - offset if end_date else None,
+    )
+
+
+def prefilter_time_window(df, platform, start_date=None, end_date=None):
+    """
+    Отбрасывает строки пачки, которые заведомо не попадут в окно
+    [start_date, end_date], до полного разбора.
+
+    Время разбирается только строго по формату площадки; строки, где это
+    не удалось, остаются — их судьбу решает полный разбор, поэтому результат
+    совпадает с фильтрацией после разбора. Если пачка отсортирована по времени
+    (по возрастанию или убыванию), окно вырезается бинарным поиском.
+    """
+    if not (start_date or end_date):
+        return df
+    columns = resolve_columns(platform, df.columns).get('executed_at', [])
+    if len(columns) != 1:
+        # Несколько колонок времени перекрывают друг друга — решает полный разбор
+        return df
+
+    text = _text(df[columns[0]])
+    times = pd.to_datetime(text.where(text != '', None), format=RAW_TIME_FORMATS[platform], errors='coerce')
+    lower, upper = raw_window_bounds(platform, start_date, end_date)
+
+    if not times.isna().any():
+        if times.is_monotonic_increasing:
+            lo = times.searchsorted(lower, side='left') if lower is not None else 0
+            hi = times.searchsorted(upper, side='right') if upper is not None else len(times)
+            return df.iloc[lo:hi]
+        if times.is_monotonic_decreasing:
+            ascending = times.iloc[::-1]
+            lo = ascending.searchsorted(lower, side='left') if lower is not None else 0
+            hi = ascending.searchsorted(upper, side='right') if upper is not None else len(times)
+            return df.iloc[len(times) - hi:len(times) - lo]
+
+    keep = times.isna()
+    within = pd.Series(True, index=df.index)
+    if lower is not None:
+        within &= times >= lower
+    if upper is not None:
+        within &= times <= upper
+    return df[keep | within]
+
+
+def iter_normalized_frames(filepath, platform, chunksize=STREAM_CHUNK_SIZE, start_date=None, end_date=None):
+    """
+    Нормализованные кадры ордеров по пачкам файла. Если задано окно, строки
+    вне его отсекаются по сырому времени до нормализации.
+    """
+    normalize = FRAME_PARSERS[platform]
+    for chunk in iter_order_frames(filepath, platform, chunksize):
+        if start_date or end_date:
+            chunk = prefilter_time_window(chunk, platform, start_date, end_date)
+            if chunk.empty:
+                continue
+        yield normalize(chunk, platform)
+
+
+class ParseStats:
+    """Счётчики разбора выгрузок: файлы, строки до и после фильтра по окну, время"""
+
+    def __init__(self):
+        self.files = 0
+        self.rows_parsed = 0
+        self.rows_kept = 0
+        self.seconds = 0.0
+
+    def merge(self, other):
+        self.files += other.files
+        self.rows_parsed += other.rows_parsed
+        self.rows_kept += other.rows_kept
+        self.seconds += other.seconds
+
+
+# Счётчики текущего запроса (см. start_parse_stats); None — не собираются
+_parse_stats = contextvars.ContextVar('parse_stats', default=None)
+
+
+def start_parse_stats():
+    """Начинает сбор счётчиков разбора в текущем контексте (запросе)"""
+    stats = ParseStats()
+    _parse_stats.set(stats)
+    return stats
+
+
+def current_parse_stats():
+    return _parse_stats.get()
+
+
+@contextlib.contextmanager
+def collect_parse_stats():
+    """
+    Собирает счётчики разбора внутри блока (например, фоновой задачи).
+    Если снаружи уже идёт сбор, счётчики блока добавляются и к нему.
+    """
+    stats = ParseStats()
+    token = _parse_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _parse_stats.reset(token)
+        outer = _parse_stats.get()
+        if outer is not None:
+            outer.merge(stats)
+
+
+def iter_orders_file(filepath, platform, start_date=None, end_date=None, chunksize=STREAM_CHUNK_SIZE):
+    """
+    Потоковый разбор выгрузки: отдаёт ордера пачками (списками ParsedOrder),
+    фильтр по времени применяется к каждой пачке сразу после разбора.
+
+    В памяти одновременно находится не больше одной пачки строк файла,
+    поэтому потребление памяти не зависит от размера выгрузки.
+
+    Нормализованные пачки кэшируются по содержимому файла (см. parse_cache):
+    повторный разбор тех же байтов читает пачки из кэша в том размере,
+    в котором они были записаны. При первом разборе с окном по времени файл
+    разбирается только в пределах окна и в кэш не пишется; полностью он
+    разбирается и кэшируется при повторном обращении. Первым обращением
+    считается и предпросмотр той же выгрузки (preview_orders_file).
+    """
+    if not os.path.exists(filepath):
+        logger.error(f"Ошибка: файл {filepath} не существует")
+        return
+
+    platform = platform.lower()
+    if platform not in FRAME_PARSERS:
+        return
+
+    windowed = bool(start_date or end_date)
+    frames = None
+    if parse_cache.cache_enabled():
+        key = parse_cache.cache_key(parse_cache.file_sha256(filepath), platform, PARSER_VERSION)
+        frames = parse_cache.read_frames(key)
+        if frames is None:
+            if not windowed or parse_cache.was_seen(key):
+                frames = parse_cache.write_through(key, iter_normalized_frames(filepath, platform, chunksize))
+            else:
+                parse_cache.mark_seen(key)
+    if frames is None:
+        frames = iter_normalized_frames(filepath, platform, chunksize, start_date, end_date)
+
+    # Время считается только внутри разбора, без обработки пачек потребителем
+    stats = _parse_stats.get()
+    started = time.perf_counter()
+    try:
+        for frame in frames:
+            orders = frame_to_orders(frame, start_date, end_date)
+            if stats is not None:
+                stats.rows_parsed += len(frame)
+                stats.rows_kept += len(orders)
+                stats.seconds += time.perf_counter() - started
+            if orders:
+                yield orders
+            started = time.perf_counter()
+    finally:
+        if stats is not None:
+            stats.files += 1
+            stats.seconds += time.perf_counter() - started
+
+
+def parse_orders_in_window(filepath, platform, start_date=None, end_date=None):
+    """
+    Разбирает выгрузку целиком в список ордеров за окно [start_date, end_date].
+    Функция верхнего уровня, чтобы её можно было запускать в пуле процессов.
+
+    Returns:
+        tuple: (список ордеров, ParseStats разбора этого файла)
+    """
+    stats = ParseStats()
+    token = _parse_stats.set(stats)
+    try:
+        orders = [order for orders in iter_orders_file(filepath, platform, start_date, end_date) for order in orders]
+    finally:
+        _parse_stats.reset(token)
+    return orders, stats
+
+
+# Поля, которые читает предпросмотр выгрузки: время, номер (для подсчёта строк)
+# и аккаунт выгрузки (есть только у Bliss)
+PREVIEW_FIELDS = ('executed_at', 'order_id', 'account_name')
+
+
+def _iter_preview_frames(source, platform, filename, chunksize):
+    """
+    Пачки выгрузки только с колонками PREVIEW_FIELDS.
+
+    source — двоичный файловый объект с позиционированием (поток загрузки),
+    формат определяется по расширению filename, как в iter_order_frames.
+    """
+    ext = os.path.splitext(filename)[1].lower()
+
+    if platform == 'bliss' or ext in ['.csv']:
+        source.seek(0)
+        if platform == 'bliss':
+            sep = _sniff_separator(source.readline().decode('utf-8'))
+            if sep is None:
+                raise Exception(f"В заголовке файла не найдены колонки {BLISS_REQUIRED_COLUMNS}")
+        else:
+            sep = ','
+        source.seek(0)
+        columns = list(pd.read_csv(source, sep=sep, encoding='utf-8', quotechar='"', nrows=0).columns)
+        mapping = resolve_columns(platform, columns)
+        usecols = [col for field in PREVIEW_FIELDS for col in mapping.get(field, [])]
+        source.seek(0)
+        reader = pd.read_csv(source, sep=sep, encoding='utf-8', quotechar='"', header=0,
+                             usecols=usecols, dtype=str, chunksize=chunksize)
+        with reader:
+            yield from reader
+    elif ext in ['.xlsx', '.xls']:
+        yield from iter_excel_frames(source, platform, chunksize, fields=PREVIEW_FIELDS)
+    else:
+        raise Exception(f"Неподдерживаемый формат файла: {ext}")
+
+
+def _preview_times(chunk, platform, columns):
+    """Время строк пачки по МСК; неразборчивое время → NaT"""
+    times = None
+    for col in columns:
+        text = _text(chunk[col])
+        if platform == 'bliss':
+            # Как в normalize_bliss_frame: только формат выгрузки Bliss
+            parsed = pd.to_datetime(text.where(text != '', None), format=BLISS_TIME_FORMAT, errors='coerce')
+        else:
+            parsed = _parse_datetimes(text, RAW_TIME_FORMATS[platform])
+        times = _overlay(times, parsed)
+    return to_moscow_time(times, platform)
+
+
+def preview_orders_file(source, platform, filename, start_date=None, end_date=None, chunksize=STREAM_CHUNK_SIZE):
+    """
+    Быстрая статистика выгрузки для проверки перед созданием отчёта.
+
+    Читает файл прямо из потока загрузки (на диск ничего не пишется):
+    заголовок и колонки времени, номера и аккаунта. Ордера не нормализуются,
+    суммы и статусы не разбираются. В кэш разбора предпросмотр не пишет, но
+    отмечает содержимое файла (parse_cache.mark_seen), чтобы разбор той же
+    выгрузки при создании отчёта сразу закэшировал её целиком.
+
+    Returns:
+        dict: rows (строк в файле), in_window (строк в окне [start_date, end_date]),
+        undated (строк с неразборчивым временем), first_order_at / last_order_at
+        (по МСК, None если время не найдено), accounts — для выгрузок с колонкой
+        аккаунта {аккаунт: {'rows': n, 'in_window': m}}, иначе пустой словарь
+    """
+    platform = platform.lower()
+    if platform not in FRAME_PARSERS:
+        raise Exception(f"Неподдерживаемая площадка: {platform}")
+
+    preview = {
+        'rows': 0,
+        'in_window': 0,
+        'undated': 0,
+        'first_order_at': None,
+        'last_order_at': None,
+        'accounts': {},
+    }
+    accounts = {}
+    for chunk in _iter_preview_frames(source, platform, filename, chunksize):
+        mapping = resolve_columns(platform, chunk.columns)
+        time_columns = mapping.get('executed_at', [])
+        if not time_columns:
+            raise Exception("В файле не найдена колонка времени ордера")
+
+        times = _preview_times(chunk, platform, time_columns)
+        dated = times.notna()
+        in_window = dated & _time_window_mask(times, start_date, end_date)
+
+        preview['rows'] += len(chunk)
+        preview['in_window'] += int(in_window.sum())
+        preview['undated'] += int((~dated).sum())
+        if dated.any():
+            first, last = times[dated].min(), times[dated].max()
+            if preview['first_order_at'] is None or first < preview['first_order_at']:
+                preview['first_order_at'] = first
+            if preview['last_order_at'] is None or last > preview['last_order_at']:
+                preview['last_order_at'] = last
+
+        account_columns = mapping.get('account_name', [])
+        if account_columns:
+            names = _text(chunk[account_columns[0]])
+            names = names.where(~names.str.lower().isin(EMPTY_VALUES), None)
+            counts = pd.DataFrame({'name': names, 'in_window': in_window}).groupby('name')['in_window'].agg(['size', 'sum'])
+            for name, row in counts.iterrows():
+                totals = accounts.setdefault(name, {'rows': 0, 'in_window': 0})
+                totals['rows'] += int(row['size'])
+                totals['in_window'] += int(row['sum'])
+
+    for key in ('first_order_at', 'last_order_at'):
+        if preview[key] is not None:
+            preview[key] = preview[key].to_pydatetime()
+    preview['accounts'] = accounts
+
+    if parse_cache.cache_enabled():
+        parse_cache.mark_seen(parse_cache.cache_key(parse_cache.stream_sha256(source), platform, PARSER_VERSION))
+    return preview
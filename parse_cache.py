@@ -0,0 +1,192 @@
+"""
+Кэш разобранных выгрузок ордеров.
+
+Ключ кэша — SHA-256 содержимого файла, площадка и версия парсера, поэтому
+повторный разбор тех же байтов (повторная загрузка той же выгрузки, несколько
+аккаунтов одной площадки) читает готовые нормализованные ордера с диска.
+
+Кэш хранится в uploads/parse_cache: каждая запись — последовательность
+pickle-кадров, которые пишутся и читаются по одной пачке. При превышении
+лимита размера удаляются давно не использованные записи (LRU по mtime).
+
+Разбор с окном по времени полностью разбирает файл только при повторном
+обращении к тем же байтам; первое обращение лишь оставляет метку (.seen).
+Метку оставляет и предпросмотр выгрузки при проверке смены
+(orders_parser.preview_orders_file), поэтому в обычном порядке «проверка →
+создание отчёта» файл кэшируется уже при создании отчёта.
+"""
+
+import hashlib
+import os
+import pickle
+import time
+
+from logging_setup import get_logger
+
+logger = get_logger(__name__)
+
+PARSE_CACHE_DIR = os.environ.get(
+    'PARSE_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads', 'parse_cache')
+)
+# Лимит суммарного размера кэша; 0 отключает кэш
+PARSE_CACHE_MAX_BYTES = int(float(os.environ.get('PARSE_CACHE_MAX_MB', 256)) * 1024 * 1024)
+CACHE_SUFFIX = '.pkl'
+SEEN_SUFFIX = '.seen'
+# Сколько хранится метка первого обращения к файлу (секунды)
+SEEN_MARKER_TTL = 24 * 3600
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def cache_enabled():
+    return PARSE_CACHE_MAX_BYTES > 0
+
+
+def stream_sha256(source):
+    """SHA-256 содержимого двоичного файлового объекта с начала (читается блоками)"""
+    digest = hashlib.sha256()
+    source.seek(0)
+    for block in iter(lambda: source.read(HASH_BLOCK_SIZE), b''):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def file_sha256(filepath):
+    """SHA-256 содержимого файла (читается блоками, без загрузки целиком)"""
+    with open(filepath, 'rb') as f:
+        return stream_sha256(f)
+
+
+def cache_key(digest, platform, parser_version):
+    return f"{digest}_{platform.lower()}_v{parser_version}"
+
+
+def _cache_path(key):
+    return os.path.join(PARSE_CACHE_DIR, key + CACHE_SUFFIX)
+
+
+def mark_seen(key):
+    """
+    Метка первого обращения к файлу (запись в кэш откладывается до повторного).
+    Ставится разбором с окном по времени и предпросмотром загрузки.
+    """
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(PARSE_CACHE_DIR, key + SEEN_SUFFIX), 'ab'):
+            pass
+    except OSError:
+        pass
+
+
+def was_seen(key):
+    return os.path.exists(os.path.join(PARSE_CACHE_DIR, key + SEEN_SUFFIX))
+
+
+def read_frames(key):
+    """
+    Возвращает генератор закэшированных кадров или None, если записи нет.
+    Попадание в кэш обновляет mtime записи (для LRU-вытеснения).
+    """
+    path = _cache_path(key)
+    try:
+        os.utime(path, None)
+    except OSError:
+        return None
+
+    def _frames():
+        try:
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        yield pickle.load(f)
+                    except EOFError:
+                        return
+        except (OSError, pickle.UnpicklingError, AttributeError, ImportError) as e:
+            # Испорченная запись: удаляем, следующий разбор перезапишет её
+            logger.warning(f"Ошибка чтения кэша разбора {path}: {str(e)}")
+            _remove(path)
+            raise
+
+    return _frames()
+
+
+def write_through(key, frames):
+    """
+    Пропускает кадры через себя, попутно записывая их в кэш.
+
+    Запись идёт во временный файл и становится видна только после того, как
+    все кадры прочитаны; прерванный разбор в кэше не остаётся. Ошибки записи
+    не мешают разбору — кэш просто не сохраняется.
+    """
+    path = _cache_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        f = open(tmp_path, 'wb')
+    except OSError as e:
+        logger.warning(f"Кэш разбора недоступен: {str(e)}")
+        f = None
+
+    try:
+        for frame in frames:
+            if f is not None:
+                try:
+                    pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+                except OSError as e:
+                    logger.warning(f"Ошибка записи кэша разбора: {str(e)}")
+                    f.close()
+                    f = None
+                    _remove(tmp_path)
+            yield frame
+
+        if f is not None:
+            f.close()
+            f = None
+            os.replace(tmp_path, path)
+            _remove(os.path.join(PARSE_CACHE_DIR, key + SEEN_SUFFIX))
+            evict()
+    finally:
+        if f is not None:
+            f.close()
+            _remove(tmp_path)
+
+
+def evict(max_bytes=None):
+    """
+    Удаляет давно не использованные записи, пока кэш не уложится в лимит,
+    и просроченные метки первого обращения.
+    """
+    if max_bytes is None:
+        max_bytes = PARSE_CACHE_MAX_BYTES
+    try:
+        names = os.listdir(PARSE_CACHE_DIR)
+    except OSError:
+        return
+
+    now = time.time()
+    entries = []
+    for name in names:
+        path = os.path.join(PARSE_CACHE_DIR, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if name.endswith(CACHE_SUFFIX):
+            entries.append((stat.st_mtime, stat.st_size, path))
+        elif name.endswith(SEEN_SUFFIX) and now - stat.st_mtime > SEEN_MARKER_TTL:
+            _remove(path)
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
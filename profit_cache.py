@@ -0,0 +1,136 @@
+"""
+Кэш прибыли и предыдущих балансов отчётов между запросами.
+
+Записи живут в памяти процесса и действительны в пределах одного поколения
+данных. Счётчик поколения хранится в базе (таблица cache_generation) и
+увеличивается в той же транзакции, что и запись ShiftReport, InitialBalance
+или Account через сессию (см. app.bump_generation_after_flush для записи
+через flush и app.bump_generation_on_bulk_write для массовых UPDATE/DELETE).
+В начале запроса, до чтения моделей, поколение сверяется с кэшем — один
+запрос по первичному ключу (app.sync_profit_cache_generation) — и при
+расхождении кэш очищается, поэтому рабочие процессы gunicorn не отдают
+значения, устаревшие после записи в другом процессе.
+
+Размер ограничен PROFIT_CACHE_SIZE записями; при переполнении вытесняются
+давно не использованные (LRU). LRUCache без поколений подходит кэшам, ключ
+которых сам меняется вместе с данными (см. report_balances.py).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+# Сколько записей держит кэш процесса; 0 отключает кэш
+PROFIT_CACHE_SIZE = int(os.environ.get('PROFIT_CACHE_SIZE', 20000))
+
+# Таблицы, запись в которые меняет прибыль и балансы отчётов
+WATCHED_TABLES = frozenset({'shift_report', 'initial_balance', 'account'})
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Ограниченный по числу записей LRU-кэш со счётчиками попаданий (потокобезопасный)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(key, value)
+
+    def _store(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pid': os.getpid(),
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+class GenerationCache(LRUCache):
+    """LRU-кэш, очищаемый при смене поколения данных"""
+
+    def __init__(self, maxsize):
+        super().__init__(maxsize)
+        self.generation = None
+        self.invalidations = 0
+
+    def sync(self, generation):
+        """Сверяет поколение данных; при расхождении очищает кэш. Возвращает generation"""
+        with self._lock:
+            if generation != self.generation:
+                if self._entries:
+                    self.invalidations += 1
+                    self._entries.clear()
+                self.generation = generation
+            return generation
+
+    def invalidate(self):
+        """Очищает кэш после записи в текущем процессе; поколение будет прочитано заново"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+            self.generation = None
+
+    def put(self, key, value, generation):
+        """
+        Сохраняет значение, посчитанное при поколении generation (результат sync).
+        Если поколение с тех пор сменилось, значение могло устареть и не сохраняется.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is None or generation != self.generation:
+                return
+            self._store(key, value)
+
+    def stats(self):
+        stats = super().stats()
+        with self._lock:
+            stats['generation'] = self.generation
+            stats['invalidations'] = self.invalidations
+        return stats
+
+
+# Общий кэш процесса: прибыль ('profit', id отчёта), предыдущие балансы
+# ('prev', id отчёта) и начальные балансы ('initial', площадка, id аккаунта)
+cache = GenerationCache(PROFIT_CACHE_SIZE)
@@ -0,0 +1,118 @@
+"""
+Разобранные балансы отчётов о сменах (ShiftReport.balances_json).
+
+Строку balances_json одного отчёта читают многие расчёты запроса: прибыль,
+последние смены дашборда, балансы площадок, профиль сотрудника, последний
+баланс аккаунта. report_balances() разбирает её один раз: суммы сразу
+приводятся к float, записи индексируются по (площадка, id аккаунта).
+
+Результат хранится в LRU-кэше процесса по ключу (id отчёта, updated_at):
+изменение отчёта меняет updated_at, поэтому устаревшая запись больше не
+запрашивается и со временем вытесняется. Разобранные значения общие для
+всех запросов процесса и не должны изменяться.
+"""
+
+import json
+import os
+
+from profit_cache import LRUCache
+
+# Сколько разобранных отчётов держит кэш процесса; 0 отключает кэш
+BALANCES_CACHE_SIZE = int(os.environ.get('BALANCES_CACHE_SIZE', 5000))
+
+
+def _amount(value):
+    """Сумма баланса: (float или None, если не задана; признак некорректного значения)"""
+    if value is None or value == '':
+        return None, False
+    try:
+        return float(value), False
+    except (ValueError, TypeError):
+        return None, True
+
+
+class AccountBalance:
+    """Баланс одного аккаунта в отчёте"""
+
+    __slots__ = ('account_id', 'key', 'account_name', 'balance', 'start_balance', 'end_balance', 'invalid')
+
+    def __init__(self, entry):
+        # id как записан в отчёте (account_id или id) и его целое значение для индекса
+        self.account_id = entry.get('account_id') or entry.get('id')
+        try:
+            self.key = int(self.account_id)
+        except (ValueError, TypeError):
+            self.key = None
+        self.account_name = entry.get('account_name')
+        self.balance, bad_balance = _amount(entry.get('balance'))
+        self.start_balance, bad_start = _amount(entry.get('start_balance'))
+        self.end_balance, bad_end = _amount(entry.get('end_balance'))
+        # Поля, значения которых не приводятся к числу (сами суммы тогда None)
+        self.invalid = tuple(
+            name for name, bad in (('balance', bad_balance), ('start_balance', bad_start), ('end_balance', bad_end)) if bad
+        )
+
+
+class ReportBalances:
+    """
+    Балансы отчёта: raw — разобранный balances_json (для ответов API),
+    accounts(площадка) — записи площадки в исходном порядке,
+    find(площадка, id) — первая запись аккаунта на площадке.
+    """
+
+    __slots__ = ('raw', '_platforms', '_index')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self._platforms = {}
+        self._index = {}
+        for platform, entries in raw.items():
+            if not isinstance(entries, list):
+                continue
+            accounts = tuple(AccountBalance(entry) for entry in entries if isinstance(entry, dict))
+            self._platforms[platform] = accounts
+            for acc in accounts:
+                if acc.key is not None:
+                    self._index.setdefault((platform, acc.key), acc)
+
+    def platforms(self):
+        return self._platforms.keys()
+
+    def accounts(self, platform):
+        return self._platforms.get(platform, ())
+
+    def find(self, platform, account_id):
+        try:
+            return self._index.get((platform, int(account_id)))
+        except (ValueError, TypeError):
+            return None
+
+
+def decode_balances(balances_json):
+    """Разбирает balances_json; некорректный JSON даёт пустые балансы"""
+    try:
+        raw = json.loads(balances_json or '{}')
+    except (ValueError, TypeError):
+        raw = {}
+    if not isinstance(raw, dict):
+        raw = {}
+    return ReportBalances(raw)
+
+
+_cache = LRUCache(BALANCES_CACHE_SIZE)
+
+
+def report_balances(report):
+    """Разобранные балансы отчёта из кэша процесса (разбор — при первом обращении к версии отчёта)"""
+    if report.id is None:
+        return decode_balances(report.balances_json)
+    key = (report.id, report.updated_at)
+    balances = _cache.get(key)
+    if balances is None:
+        balances = decode_balances(report.balances_json)
+        _cache.put(key, balances)
+    return balances
+
+
+def cache_stats():
+    return _cache.stats()
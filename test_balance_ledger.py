@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Тест поиска предыдущего баланса по журналу балансов (AccountBalanceLedger):
+из утреннего и вечернего отчётов одной даты предыдущим для следующей смены
+считается вечерний — порядок по shift_rank, а не по строке shift_type
+('morning' > 'evening'), и не по порядку создания отчётов.
+
+Запуск: python -m pytest test_balance_ledger.py или python test_balance_ledger.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+from datetime import date
+
+# Отдельная база, без кэша разбора и рабочих потоков
+_tmpdir = tempfile.mkdtemp(prefix='birch_ledger_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'test.db')
+os.environ['PARSE_CACHE_MAX_MB'] = '0'
+os.environ['JOB_WORKERS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as birch  # noqa: E402
+from utils import find_prev_balance  # noqa: E402
+
+
+def _report(employee_id, account_id, shift_date, shift_type, balance):
+    """Отчёт смены с балансом одного аккаунта Bybit и его строкой журнала"""
+    report = birch.ShiftReport(
+        employee_id=employee_id,
+        shift_date=shift_date,
+        shift_type=shift_type,
+        balances_json=json.dumps({'bybit': [{'account_id': account_id, 'balance': balance}]})
+    )
+    birch.db.session.add(report)
+    birch.db.session.flush()
+    birch.sync_balance_ledger(report)
+    return report
+
+
+def test_evening_report_is_previous_for_next_shift():
+    with birch.app.app_context():
+        birch.db.create_all()
+        employee = birch.Employee(name='Тест', telegram='@test')
+        birch.db.session.add(employee)
+        birch.db.session.flush()
+        account = birch.Account(employee_id=employee.id, platform='bybit', account_name='ledger_acc')
+        birch.db.session.add(account)
+        birch.db.session.add(birch.InitialBalance(platform='bybit', account_name='ledger_acc', balance=10))
+        birch.db.session.flush()
+
+        # Вечерний отчёт создан раньше утреннего той же даты
+        evening = _report(employee.id, account.id, date(2025, 7, 1), 'evening', 300)
+        morning = _report(employee.id, account.id, date(2025, 7, 1), 'morning', 200)
+        next_morning = _report(employee.id, account.id, date(2025, 7, 2), 'morning', 400)
+        birch.db.session.commit()
+
+        session = birch.db.session
+        assert find_prev_balance(session, account.id, 'bybit', next_morning) == 300
+        assert find_prev_balance(session, account.id, 'bybit', evening) == 200
+        # До первой смены — начальный баланс
+        assert find_prev_balance(session, account.id, 'bybit', morning) == 10
+
+
+if __name__ == '__main__':
+    test_evening_report_is_previous_for_next_shift()
+    print("✅ Предыдущий баланс берётся из вечернего отчёта той же даты")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Тест загруженных интервалов ордеров (OrderWatermarks): строка выгрузки без
+времени не должна расширять интервал аккаунта, иначе следующая выгрузка
+пропустит ордера из «дыры» как уже загруженные. При загрузке с окном по
+времени такие строки в окно не попадают.
+
+Запуск: python -m pytest test_order_watermarks.py или python test_order_watermarks.py
+"""
+
+import io
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+# Отдельная база и каталог загрузок, без кэша разбора и рабочих потоков
+_tmpdir = tempfile.mkdtemp(prefix='birch_watermarks_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'test.db')
+os.environ['PARSE_CACHE_MAX_MB'] = '0'
+os.environ['JOB_WORKERS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as birch  # noqa: E402
+
+HEADER = ('Order No.,p2p-convert,Type,Fiat Amount,Currency,Price,Currency,Coin Amount,'
+          'Cryptocurrency,Transaction Fees,Cryptocurrency,Counterparty,Status,Time\n')
+
+
+def _bybit_csv(rows):
+    """CSV выгрузки Bybit: rows — [(номер ордера, время или '')]"""
+    lines = [
+        f'{order_id},no,BUY,1000,RUB,80,RUB,12.5,USDT,0,USDT,User,Completed,{executed_at}\n'
+        for order_id, executed_at in rows
+    ]
+    return (HEADER + ''.join(lines)).encode('utf-8')
+
+
+def _upload(client, employee_id, rows, name, account_name='acc1', **window):
+    response = client.post('/api/orders/upload', data={
+        'employee_id': str(employee_id),
+        'platform': 'bybit',
+        'account_name': account_name,
+        'file': (io.BytesIO(_bybit_csv(rows)), name),
+        **window
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def _create_employee():
+    birch.app.config['UPLOAD_FOLDER'] = _tmpdir
+    with birch.app.app_context():
+        birch.db.create_all()
+        employee = birch.Employee(name='Тест', telegram='@test')
+        birch.db.session.add(employee)
+        birch.db.session.commit()
+        return employee.id
+
+
+def test_undated_row_does_not_extend_covered_interval():
+    employee_id = _create_employee()
+    client = birch.app.test_client()
+    # Первая выгрузка: два ордера 1 июля и строка без времени
+    _upload(client, employee_id, [
+        ('1001', '2025-07-01 09:00:00'),
+        ('1002', '2025-07-01 10:00:00'),
+        ('1003', '')
+    ], 'first.csv')
+
+    with birch.app.app_context():
+        watermark = birch.IngestionWatermark.query.filter_by(platform='bybit', account_name='acc1').one()
+        # Время строки без даты (момент загрузки) в интервал не попадает
+        assert watermark.covered_to < datetime(2025, 7, 2)
+
+    # Вторая выгрузка покрывает «дыру» между 1 июля и моментом первой загрузки
+    result = _upload(client, employee_id, [
+        ('1002', '2025-07-01 10:00:00'),
+        ('1004', '2025-07-05 12:00:00'),
+        ('1005', '2025-07-06 12:00:00')
+    ], 'second.csv')
+
+    assert result['skipped_by_watermark'] == 0
+    with birch.app.app_context():
+        imported = {order.order_id for order in birch.Order.query.filter_by(platform='bybit')}
+    assert {'1004', '1005'} <= imported
+
+
+def test_windowed_upload_drops_undated_rows():
+    employee_id = _create_employee()
+    client = birch.app.test_client()
+    _upload(client, employee_id, [
+        ('2001', '2025-07-01 09:00:00'),
+        ('2002', '2025-07-03 09:00:00'),
+        ('2003', ''),
+        ('2004', 'not a date')
+    ], 'window.csv', account_name='acc2', start_date='2025-07-01T00:00', end_date='2025-07-02T00:00')
+
+    with birch.app.app_context():
+        imported = {order.order_id for order in birch.Order.query.filter(birch.Order.order_id.like('200%'))}
+    # В окно попадает только ордер 1 июля: строки без времени отброшены, как и ордер вне окна
+    assert imported == {'2001'}
+
+
+if __name__ == '__main__':
+    test_undated_row_does_not_extend_covered_interval()
+    print("✅ Ордера из «дыры» загружены")
+    test_windowed_upload_drops_undated_rows()
+    print("✅ Строки без времени не попадают в окно загрузки")
@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 """
 Тестовый скрипт для проверки API ордеров
+
+test_orders_api обращается к запущенному серверу; тесты пакетной загрузки
+(/api/orders/batch) работают с приложением напрямую, на временной базе.
 """
 
+import os
+import sys
+import tempfile
 import requests
 import json
 from datetime import datetime
@@ -102,5 +108,104 @@ def test_orders_api():
     
     print("\n✨ Тестирование завершено!")
 
+def _local_app():
+    """Приложение на временной базе (если app ещё не импортирован) и id нового сотрудника"""
+    if 'app' not in sys.modules:
+        tmpdir = tempfile.mkdtemp(prefix='birch_orders_api_')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tmpdir, 'test.db')
+        os.environ['PARSE_CACHE_MAX_MB'] = '0'
+        os.environ['JOB_WORKERS'] = '0'
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app as birch
+    with birch.app.app_context():
+        birch.db.create_all()
+        employee = birch.Employee(name='Пакет', telegram='@batch')
+        birch.db.session.add(employee)
+        birch.db.session.commit()
+        return birch, employee.id
+
+
+def _batch_order(order_id, employee_id, **fields):
+    order = {
+        'order_id': order_id,
+        'employee_id': employee_id,
+        'platform': 'bybit',
+        'account_name': 'batch_acc',
+        'symbol': 'USDT',
+        'side': 'buy',
+        'quantity': 10,
+        'price': 80,
+        'total_usdt': 800,
+        'status': 'filled',
+        'executed_at': '2025-07-01T10:00:00'
+    }
+    order.update(fields)
+    return order
+
+
+def test_orders_batch_item_statuses():
+    """Статус каждого ордера пакета: created, duplicate (в пакете и в базе) и invalid"""
+    birch, employee_id = _local_app()
+    client = birch.app.test_client()
+
+    first = client.post('/api/orders/batch', json={
+        'idempotency_key': f'statuses-1-{employee_id}',
+        'orders': [_batch_order(f'B{employee_id}-1', employee_id)]
+    })
+    assert first.status_code == 200, first.get_json()
+
+    response = client.post('/api/orders/batch', json={
+        'idempotency_key': f'statuses-2-{employee_id}',
+        'orders': [
+            _batch_order(f'B{employee_id}-2', employee_id),
+            _batch_order(f'B{employee_id}-1', employee_id),  # уже в базе
+            _batch_order(f'B{employee_id}-2', employee_id),  # повтор внутри пакета
+            _batch_order(f'B{employee_id}-1', employee_id, platform='htx'),  # другая площадка — новый ордер
+            _batch_order(f'B{employee_id}-3', employee_id, price=None),
+            _batch_order(f'B{employee_id}-4', 10 ** 9),
+        ]
+    })
+    assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert [item['status'] for item in body['results']] == [
+        'created', 'duplicate', 'duplicate', 'created', 'invalid', 'invalid'
+    ]
+    assert [item['index'] for item in body['results']] == list(range(6))
+    assert body['results'][4]['error'] == 'Отсутствует обязательное поле: price'
+    assert body['results'][5]['error'] == 'Сотрудник не найден'
+    assert (body['created'], body['duplicates'], body['invalid']) == (2, 2, 2)
+
+    with birch.app.app_context():
+        stored = birch.Order.query.filter(birch.Order.order_id.like(f'B{employee_id}-%')).all()
+    assert sorted((order.platform, order.order_id) for order in stored) == [
+        ('bybit', f'B{employee_id}-1'), ('bybit', f'B{employee_id}-2'), ('htx', f'B{employee_id}-1')
+    ]
+
+
+def test_orders_batch_replay_returns_stored_response():
+    """Повтор пакета с тем же ключом возвращает сохранённый ответ и ничего не пишет"""
+    birch, employee_id = _local_app()
+    client = birch.app.test_client()
+    payload = {
+        'idempotency_key': f'replay-{employee_id}',
+        'orders': [_batch_order(f'R{employee_id}-1', employee_id), _batch_order(f'R{employee_id}-2', employee_id)]
+    }
+
+    first = client.post('/api/orders/batch', json=payload).get_json()
+    assert first.pop('replayed') is False
+    assert first['created'] == 2
+
+    # Ответ берётся по ключу, тело повтора не важно (здесь ключ передан заголовком)
+    replay = client.post('/api/orders/batch', json={
+        'orders': [_batch_order(f'R{employee_id}-3', employee_id)]
+    }, headers={'Idempotency-Key': payload['idempotency_key']}).get_json()
+    assert replay.pop('replayed') is True
+    assert replay == first
+
+    with birch.app.app_context():
+        count = birch.Order.query.filter(birch.Order.order_id.like(f'R{employee_id}-%')).count()
+    assert count == 2
+
+
 if __name__ == "__main__":
-    test_orders_api() 
\ No newline at end of file
+    test_orders_api()
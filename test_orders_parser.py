@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Тест разбора выгрузок ордеров (orders_parser): небольшая выгрузка каждой
+площадки и ордера, которые из неё получал прежний построчный разбор —
+сторона, статус, количество, цена, сумма и время по МСК.
+
+Запуск: python -m pytest test_orders_parser.py или python test_orders_parser.py
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+# Без кэша разбора: проверяется сам разбор
+os.environ['PARSE_CACHE_MAX_MB'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import orders_parser  # noqa: E402
+
+_tmpdir = tempfile.mkdtemp(prefix='birch_parser_')
+
+BYBIT_CSV = (
+    'Order No.,p2p-convert,Type,Fiat Amount,Currency,Price,Currency,Coin Amount,'
+    'Cryptocurrency,Transaction Fees,Cryptocurrency,Counterparty,Status,Time\n'
+    '1001,no,BUY,8000,RUB,80,RUB,100,USDT,0,USDT,Alice,Completed,2025-07-01 09:15:00\n'
+    '1002,no,SELL,4050,RUB,81,RUB,50,USDT,0,USDT,Bob,Completed,2025-07-01 10:30:00\n'
+    '1003,no,BUY,790,RUB,79,RUB,10,USDT,0,USDT,Carol,Pending,2025-07-01 23:45:00\n'
+    # Без количества, цены и суммы — строка пропускается
+    '1004,no,BUY,,RUB,,RUB,,USDT,0,USDT,Nobody,Completed,2025-07-01 11:00:00\n'
+)
+
+HTX_ROWS = [
+    {'Номер:': '2001', 'Тип': 'Продать', 'Тип заказа': 'Стандартный', 'Монета': 'USDT', 'Количество': 12.5,
+     'Цена за ед.': 80.0, 'Общая цена': 1000, 'Коммисия': 0, 'Валюта': 'RUB',
+     'Время': '2025-07-01 19:10:52', 'Статус': 'Завершено', 'Торговый партнер': 'X'},
+    {'Номер:': '2002', 'Тип': 'Купить', 'Тип заказа': 'Стандартный', 'Монета': 'USDT', 'Количество': 25,
+     'Цена за ед.': 79.0, 'Общая цена': 1975, 'Коммисия': 0, 'Валюта': 'RUB',
+     'Время': '2025-07-01 03:00:00', 'Статус': 'Отменено', 'Торговый партнер': 'Y'},
+    # Без количества и суммы — строка пропускается
+    {'Номер:': '2003', 'Тип': 'Продать', 'Тип заказа': 'Стандартный', 'Монета': 'USDT', 'Количество': None,
+     'Цена за ед.': 79.0, 'Общая цена': None, 'Коммисия': 0, 'Валюта': 'RUB',
+     'Время': '2025-07-01 04:00:00', 'Статус': 'Завершено', 'Торговый партнер': 'Z'},
+]
+
+BLISS_CSV = (
+    '"Creation date";"Finish date";"Internal id";"Organization user";"Requisite";"Method";'
+    '"Status";"Amount";"Currency";"Crypto amount";"Trader profit"\n'
+    '"01.07.2025 09:17:05";"01.07.2025 09:31:14";"3001";"Morro_1";1;"SBP";"Success";"4500";"RUB";"58,21";"1,8"\n'
+    '"01.07.2025 12:00:00";"";"3002";"Morro_1";2;"CARD";"Cancelled";"5900";"RUB";"76,7";"0"\n'
+    '"01.07.2025 13:00:00";"";"3003";"Morro_2";3;"SELL";"Expired";"1000";"RUB";"12,5";"0"\n'
+    # Сумма не число — строка пропускается
+    '"01.07.2025 14:00:00";"";"3004";"Morro_2";4;"SBP";"Success";"abc";"RUB";"12,5";"0"\n'
+)
+
+# (номер, сторона, статус, количество, цена, сумма, время по МСК)
+EXPECTED = {
+    'bybit': [
+        ('1001', 'buy', 'filled', 100.0, 80.0, 8000.0, datetime(2025, 7, 1, 12, 15)),
+        ('1002', 'sell', 'filled', 50.0, 81.0, 4050.0, datetime(2025, 7, 1, 13, 30)),
+        ('1003', 'buy', 'pending', 10.0, 79.0, 790.0, datetime(2025, 7, 2, 2, 45)),
+    ],
+    # Gate читает формат Bybit, но время без смещения
+    'gate': [
+        ('1001', 'buy', 'filled', 100.0, 80.0, 8000.0, datetime(2025, 7, 1, 9, 15)),
+        ('1002', 'sell', 'filled', 50.0, 81.0, 4050.0, datetime(2025, 7, 1, 10, 30)),
+        ('1003', 'buy', 'pending', 10.0, 79.0, 790.0, datetime(2025, 7, 1, 23, 45)),
+    ],
+    'htx': [
+        ('2001', 'sell', 'filled', 12.5, 80.0, 1000.0, datetime(2025, 7, 1, 14, 10, 52)),
+        ('2002', 'buy', 'canceled', 25.0, 79.0, 1975.0, datetime(2025, 6, 30, 22, 0)),
+    ],
+    'bliss': [
+        ('3001', 'buy', 'filled', 58.21, 4500 / 58.21, 4500.0, datetime(2025, 7, 1, 12, 17, 5)),
+        ('3002', 'buy', 'canceled', 76.7, 5900 / 76.7, 5900.0, datetime(2025, 7, 1, 15, 0)),
+        ('3003', 'sell', 'expired', 12.5, 80.0, 1000.0, datetime(2025, 7, 1, 16, 0)),
+    ],
+}
+
+
+def _fixture(platform):
+    """Путь к выгрузке площадки во временном каталоге"""
+    if platform == 'htx':
+        path = os.path.join(_tmpdir, 'htx.xlsx')
+        pd.DataFrame(HTX_ROWS).to_excel(path, index=False)
+        return path
+    path = os.path.join(_tmpdir, f'{platform}.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(BLISS_CSV if platform == 'bliss' else BYBIT_CSV)
+    return path
+
+
+def _parse(platform, start_date=None, end_date=None):
+    return [
+        order
+        for batch in orders_parser.iter_orders_file(_fixture(platform), platform, start_date, end_date)
+        for order in batch
+    ]
+
+
+@pytest.mark.parametrize('platform', sorted(EXPECTED))
+def test_orders_match_expected(platform):
+    orders = _parse(platform)
+    assert len(orders) == len(EXPECTED[platform])
+    for order, (order_id, side, status, quantity, price, total, executed_at) in zip(orders, EXPECTED[platform]):
+        assert order.order_id == order_id
+        assert order.side == side
+        assert order.status == status
+        assert order.quantity == pytest.approx(quantity)
+        assert order.price == pytest.approx(price)
+        assert order.total_usdt == pytest.approx(total)
+        assert order.executed_at == executed_at
+        assert order.symbol == 'USDT'
+        assert not order.undated
+
+
+def test_bliss_keeps_export_account():
+    assert [order.export_account for order in _parse('bliss')] == ['Morro_1', 'Morro_1', 'Morro_2']
+
+
+def test_bybit_columns_resolved_by_header():
+    header = BYBIT_CSV.splitlines()[0].split(',')
+    mapping = orders_parser.resolve_columns('bybit', header)
+    assert mapping['order_id'] == ['Order No.']
+    assert mapping['side'] == ['Type']
+    assert mapping['quantity'] == ['Coin Amount']
+    assert mapping['executed_at'] == ['Time']
+
+
+def test_time_window_applies_after_moscow_conversion():
+    # Окно задаётся по МСК: 1003 (02:45 2 июля по МСК) в окно 1 июля не попадает
+    orders = _parse('bybit', datetime(2025, 7, 1, 12, 0), datetime(2025, 7, 1, 23, 59))
+    assert [order.order_id for order in orders] == ['1001', '1002']
+
+
+if __name__ == '__main__':
+    for platform in sorted(EXPECTED):
+        test_orders_match_expected(platform)
+        print(f"✅ {platform}: ордера совпадают с ожидаемыми")
+    test_bliss_keeps_export_account()
+    test_bybit_columns_resolved_by_header()
+    test_time_window_applies_after_moscow_conversion()
+    print("✅ Сопоставление колонок и окно по времени")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Тест сохранённой прибыли отчётов: добавление или удаление более раннего
+отчёта и изменение начального баланса помечают прибыль более поздних отчётов
+тех же аккаунтов устаревшей (profit_dirty, profit_revision), а пересчёт
+(задача report_profits, при JOB_WORKERS=0 — сразу) записывает прибыль,
+совпадающую с расчётом по журналу балансов.
+
+Запуск: python -m pytest test_report_profits.py или python test_report_profits.py
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+# Отдельная база, без кэша разбора; задачи выполняются сразу
+_tmpdir = tempfile.mkdtemp(prefix='birch_profits_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmpdir, 'test.db')
+os.environ['PARSE_CACHE_MAX_MB'] = '0'
+os.environ['JOB_WORKERS'] = '0'
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import app as birch  # noqa: E402
+from utils import ProfitCalculator  # noqa: E402
+
+PASSWORD = os.environ.get('ADMIN_PASSWORD', 'Blalala2')
+
+
+def _setup():
+    """Сотрудник и аккаунт Bybit с начальным балансом 100"""
+    with birch.app.app_context():
+        birch.db.create_all()
+        employee = birch.Employee(name='Прибыль', telegram='@profit')
+        birch.db.session.add(employee)
+        birch.db.session.flush()
+        account = birch.Account(employee_id=employee.id, platform='bybit', account_name='profit_acc')
+        birch.db.session.add(account)
+        birch.db.session.add(birch.InitialBalance(platform='bybit', account_name='profit_acc', balance=100))
+        birch.db.session.commit()
+        return employee.id, account.id
+
+
+def _create_report(client, employee_id, account_id, shift_date, shift_type, balance):
+    response = client.post('/api/reports', json={
+        'employee_id': employee_id,
+        'shift_date': shift_date,
+        'shift_type': shift_type,
+        'balances_json': {'bybit': [{'account_id': account_id, 'account_name': 'profit_acc', 'balance': balance}]}
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()['id']
+
+
+def _stored(report_id):
+    """(сохранённая прибыль, profit_revision, profit_dirty) и прибыль, посчитанная заново"""
+    with birch.app.app_context():
+        report = birch.db.session.get(birch.ShiftReport, report_id)
+        expected = ProfitCalculator(birch.db.session).compute(report)
+        return (float(report.profit), report.profit_revision or 0, report.profit_dirty), expected['profit']
+
+
+def _last_refresh():
+    with birch.app.app_context():
+        job = birch.IngestionJob.query.filter_by(kind='report_profits').order_by(birch.IngestionJob.id.desc()).first()
+        return job and json.loads(job.result_json or 'null')
+
+
+def test_earlier_report_and_initial_balance_refresh_later_profit():
+    employee_id, account_id = _setup()
+    client = birch.app.test_client()
+
+    later_id = _create_report(client, employee_id, account_id, '2025-07-02', 'morning', 500)
+    (profit, revision, dirty), expected = _stored(later_id)
+    assert not dirty and profit == expected
+
+    # Более ранний отчёт меняет предыдущий баланс более позднего
+    earlier_id = _create_report(client, employee_id, account_id, '2025-07-01', 'evening', 300)
+    (new_profit, new_revision, dirty), expected = _stored(later_id)
+    assert new_revision == revision + 1
+    assert not dirty and new_profit == expected and new_profit != profit
+    assert _last_refresh() == {'refreshed': 1}
+
+    # Новый начальный баланс — предыдущий для самого раннего отчёта аккаунта
+    (earlier_profit, earlier_revision, _), _ = _stored(earlier_id)
+    response = client.post('/api/settings/balances', json={
+        'password': PASSWORD,
+        'balances': [{'platform': 'bybit', 'account_name': 'profit_acc', 'balance': 250}]
+    })
+    assert response.status_code == 200, response.get_json()
+    (updated_profit, updated_revision, dirty), expected = _stored(earlier_id)
+    assert updated_revision == earlier_revision + 1
+    assert not dirty and updated_profit == expected and updated_profit != earlier_profit
+
+    # Удаление раннего отчёта возвращает позднему начальный баланс как предыдущий
+    (_, revision, _), _ = _stored(later_id)
+    response = client.delete(f'/api/reports/{earlier_id}', json={'password': PASSWORD})
+    assert response.status_code == 200, response.get_json()
+    (final_profit, final_revision, dirty), expected = _stored(later_id)
+    assert final_revision == revision + 1
+    assert not dirty and final_profit == expected and final_profit != new_profit
+
+
+if __name__ == '__main__':
+    test_earlier_report_and_initial_balance_refresh_later_profit()
+    print("✅ Прибыль более поздних отчётов пересчитывается после изменений")
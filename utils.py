@@ -1,31 +1,45 @@
-import json
 # Модели импортируйте из app.py, если они определены там
 # from app import ShiftReport, InitialBalance, Account
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from datetime import date
 
-def find_prev_balance(session: Session, account_id, platform, cur_report) -> float:
+from logging_setup import get_logger
+from report_balances import report_balances
+
+logger = get_logger(__name__)
+
+def _ledger_account_id(account_id):
+    """id аккаунта в журнале балансов (целое) или None"""
+    try:
+        return int(account_id)
+    except (ValueError, TypeError):
+        return None
+
+def find_ledger_balance_before(session: Session, account_id, platform, shift_date, shift_type, exclude_report_id=None):
     """
-    Поиск предыдущего баланса для аккаунта на платформе до cur_report.
-    Сначала ищет в предыдущих отчётах, затем в InitialBalance (по id и имени).
+    Баланс последней записи журнала балансов аккаунта строго до смены
+    (shift_date, shift_type) — один запрос по индексу. None, если записи нет.
     """
+    from app import AccountBalanceLedger, shift_rank
+    ledger_account_id = _ledger_account_id(account_id)
+    if ledger_account_id is None:
+        return None
+    ledger = AccountBalanceLedger
+    query = session.query(ledger.balance).filter(
+        ledger.account_id == ledger_account_id,
+        ledger.platform == platform,
+        (ledger.shift_date < shift_date) |
+        ((ledger.shift_date == shift_date) & (ledger.shift_rank < shift_rank(shift_type)))
+    )
+    if exclude_report_id is not None:
+        query = query.filter(ledger.report_id != exclude_report_id)
+    prev = query.order_by(ledger.shift_date.desc(), ledger.shift_rank.desc(), ledger.report_id.desc()).first()
+    return float(prev.balance or 0) if prev is not None else None
+
+def find_initial_balance(session: Session, account_id, platform) -> float:
+    """Начальный баланс аккаунта (InitialBalance) по id или имени, иначе 0"""
     from app import InitialBalance, Account
-    prev_reports = session.query(type(cur_report)).filter(
-        type(cur_report).id != cur_report.id,
-        (type(cur_report).shift_date < cur_report.shift_date) |
-        ((type(cur_report).shift_date == cur_report.shift_date) & (type(cur_report).shift_type == 'morning') & (cur_report.shift_type == 'evening'))
-    ).order_by(type(cur_report).shift_date.desc(), type(cur_report).shift_type.desc()).all()
-    for r in prev_reports:
-        try:
-            b = json.loads(r.balances_json or '{}')
-        except:
-            b = {}
-        if b.get(platform):
-            for a in b[platform]:
-                if (a.get('account_id') or a.get('id')) == account_id:
-                    return float(a.get('balance', 0))
-    # Если нет предыдущего отчёта — ищем начальный баланс по id или имени
     ib = session.query(InitialBalance).filter_by(platform=platform).all()
     for bal in ib:
         if str(account_id) == str(getattr(bal, 'account_id', None)):
@@ -38,67 +52,108 @@ def find_prev_balance(session: Session, account_id, platform, cur_report) -> flo
                 return float(bal.balance)
     return 0.0
 
-def calculate_report_profit(session: Session, report) -> Dict[str, float]:
+def find_prev_balance(session: Session, account_id, platform, cur_report) -> float:
+    """
+    Поиск предыдущего баланса для аккаунта на платформе до cur_report.
+    Сначала ищет последнюю запись журнала балансов (AccountBalanceLedger) до смены
+    cur_report — один запрос по индексу, затем InitialBalance (по id и имени).
+    """
+    prev = find_ledger_balance_before(
+        session, account_id, platform, cur_report.shift_date, cur_report.shift_type, cur_report.id
+    )
+    if prev is not None:
+        return prev
+    # Если нет предыдущего отчёта — ищем начальный баланс по id или имени
+    return find_initial_balance(session, account_id, platform)
+
+def _report_adjustments(report):
+    """Докидка, внутренние переводы и скам отчёта"""
+    try:
+        dokidka = float(getattr(report, 'dokidka_amount', 0) or 0)
+        internal = float(getattr(report, 'internal_transfer_amount', 0) or 0)
+        scam = float(report.scam_amount or 0)
+    except (ValueError, TypeError):
+        dokidka = 0.0
+        internal = 0.0
+        scam = 0.0
+    return dokidka, internal, scam
+
+def stored_report_profit(report) -> Optional[Dict[str, float]]:
+    """
+    Прибыль отчёта из сохранённых столбцов ShiftReport в формате calculate_report_profit.
+    None, если отчёт помечен на пересчёт (profit_dirty) или прибыль ещё не сохранялась.
+    """
+    if getattr(report, 'profit_dirty', True) or getattr(report, 'profit', None) is None:
+        return None
+    dokidka, internal, scam = _report_adjustments(report)
+    return {
+        'profit': float(report.profit),
+        'project_profit': float(report.project_profit or 0),
+        'salary_profit': float(report.salary_profit or 0),
+        'scam': round(scam, 2),
+        'dokidka': round(dokidka, 2),
+        'internal': round(internal, 2)
+    }
+
+def calculate_report_profit(session: Session, report, prev_balance=None) -> Dict[str, float]:
     """
     Возвращает словарь с profit (дельта), project_profit (дельта-скам-докидка-внутренний), salary_profit (дельта-докидка-внутренний-скам если scam_personal)
     Теперь дельта считается как сумма (end_balance - start_balance) по всем аккаунтам всех платформ.
+    prev_balance(account_id, platform) — источник предыдущих балансов (по умолчанию find_prev_balance).
     """
-    try:
-        balances = json.loads(report.balances_json or '{}')
-    except:
-        balances = {}
+    balances = report_balances(report)
     
     profit = 0.0
     for platform in ['bybit','htx','bliss','gate']:
-        if balances.get(platform):
-            for acc in balances[platform]:
+        if balances.accounts(platform):
+            for acc in balances.accounts(platform):
                 try:
+                    if 'start_balance' in acc.invalid or 'end_balance' in acc.invalid:
+                        raise ValueError(f"некорректный баланс аккаунта {acc.account_id}")
                     # Пробуем разные варианты ключей для баланса
-                    start = float(acc.get('start_balance', 0) or 0)
-                    end = float(acc.get('end_balance', 0) or 0)
+                    start = acc.start_balance or 0.0
+                    end = acc.end_balance or 0.0
                     
                     # Если start_balance/end_balance не найдены, пробуем найти предыдущий баланс
                     if start == 0 and end == 0:
                         # Если есть только текущий баланс, считаем разницу с предыдущим
-                        current_balance = float(acc.get('balance', 0) or 0)
+                        if 'balance' in acc.invalid:
+                            raise ValueError(f"некорректный баланс аккаунта {acc.account_id}")
+                        current_balance = acc.balance or 0.0
                         if current_balance != 0:
-                            account_id = acc.get('account_id') or acc.get('id')
+                            account_id = acc.account_id
                             if account_id:
-                                prev_balance = find_prev_balance(session, account_id, platform, report)
-                                profit += current_balance - prev_balance
-                                print(f"🔍 Баланс аккаунта {account_id} на {platform}: {prev_balance} -> {current_balance} (дельта: {current_balance - prev_balance})")
+                                if prev_balance is not None:
+                                    prev = prev_balance(account_id, platform)
+                                else:
+                                    prev = find_prev_balance(session, account_id, platform, report)
+                                profit += current_balance - prev
+                                logger.debug("Баланс аккаунта %s на %s: %s -> %s (дельта: %s)", account_id, platform, prev, current_balance, current_balance - prev)
                         continue
                     
                     # Проверяем на аномально большие значения
                     if abs(start) > 100000:
-                        print(f"⚠️  Аномально большой начальный баланс {start} в отчете {report.id}, обнуляем")
+                        logger.warning(f"Аномально большой начальный баланс {start} в отчете {report.id}, обнуляем")
                         start = 0
                     if abs(end) > 100000:
-                        print(f"⚠️  Аномально большой конечный баланс {end} в отчете {report.id}, обнуляем")
+                        logger.warning(f"Аномально большой конечный баланс {end} в отчете {report.id}, обнуляем")
                         end = 0
                     
                     delta = end - start
                     profit += delta
-                    print(f"🔍 Баланс аккаунта {acc.get('account_id', 'N/A')} на {platform}: {start} -> {end} (дельта: {delta})")
+                    logger.debug("Баланс аккаунта %s на %s: %s -> %s (дельта: %s)", acc.account_id or 'N/A', platform, start, end, delta)
                     
                 except (ValueError, TypeError) as e:
-                    print(f"⚠️  Ошибка при парсинге баланса в отчете {report.id}: {e}")
+                    logger.warning(f"Ошибка при парсинге баланса в отчете {report.id}: {e}")
                     continue
     
-    try:
-        dokidka = float(getattr(report, 'dokidka_amount', 0) or 0)
-        internal = float(getattr(report, 'internal_transfer_amount', 0) or 0)
-        scam = float(report.scam_amount or 0)
-    except (ValueError, TypeError):
-        dokidka = 0.0
-        internal = 0.0
-        scam = 0.0
+    dokidka, internal, scam = _report_adjustments(report)
     
     scam_personal = getattr(report, 'scam_personal', False)
     
     # Проверяем на аномально большие значения прибыли
     if abs(profit) > 50000:
-        print(f"⚠️  Аномально большая прибыль {profit} в отчете {report.id}, обнуляем")
+        logger.warning(f"Аномально большая прибыль {profit} в отчете {report.id}, обнуляем")
         profit = 0.0
     
     profit = profit - dokidka - internal
@@ -114,20 +169,163 @@ def calculate_report_profit(session: Session, report) -> Dict[str, float]:
         'internal': round(internal, 2)
     }
 
+class ProfitCalculator:
+    """
+    Прибыль отчётов в пределах одного запроса: каждый отчёт считается один раз.
+
+    prepare(reports) проходит отчёты в хронологическом порядке вместе с записями
+    журнала балансов за тот же период и переносит последний баланс каждого
+    аккаунта вперёд: журнал за период читается одним запросом, баланс до начала
+    периода — одним запросом на аккаунт. Результаты запоминаются по id отчёта.
+
+    Для отчётов с актуальной сохранённой прибылью (stored_report_profit)
+    profit() возвращает её без разбора balances_json; prepare_profits(reports)
+    готовит балансы только для отчётов, ожидающих пересчёта.
+
+    cache (profit_cache.GenerationCache) и generation — кэш процесса между
+    запросами: посчитанные прибыль и балансы читаются из него и сохраняются
+    в него с поколением данных, сверенным в начале запроса.
+
+    Использование (один экземпляр на запрос, см. app.profit_calculator):
+        calculator = ProfitCalculator(db.session)
+        calculator.prepare_profits(reports)
+        calculator.profit(report)['salary_profit']
+        calculator.prev_balance(account_id, platform, report)
+    """
+
+    def __init__(self, session: Session, cache=None, generation=None):
+        self.session = session
+        self.cache = cache
+        self.generation = generation
+        self._profits = {}  # id отчёта -> результат calculate_report_profit
+        self._prev = {}  # id отчёта -> {(площадка, id аккаунта): предыдущий баланс}
+        self._initial = {}  # (площадка, id аккаунта) -> начальный баланс
+
+    @staticmethod
+    def _accounts(report) -> List:
+        """Пары (площадка, id аккаунта) из balances_json отчёта"""
+        balances = report_balances(report)
+        return [
+            (platform, acc.key)
+            for platform in balances.platforms()
+            for acc in balances.accounts(platform)
+            if acc.key is not None
+        ]
+
+    def _cached(self, key):
+        return self.cache.get(key) if self.cache is not None else None
+
+    def _store(self, key, value) -> None:
+        if self.cache is not None:
+            self.cache.put(key, value, self.generation)
+
+    def _initial_balance(self, pair) -> float:
+        if pair not in self._initial:
+            balance = self._cached(('initial',) + pair)
+            if balance is None:
+                platform, account_id = pair
+                balance = find_initial_balance(self.session, account_id, platform)
+                self._store(('initial',) + pair, balance)
+            self._initial[pair] = balance
+        return self._initial[pair]
+
+    def prepare(self, reports: List) -> None:
+        """Считает предыдущие балансы всех аккаунтов отчётов за один проход по периоду"""
+        from app import AccountBalanceLedger, shift_rank
+        pending = {}
+        for report in reports:
+            if report.id in self._prev:
+                continue
+            cached = self._cached(('prev', report.id))
+            if cached is not None:
+                self._prev[report.id] = cached
+            else:
+                pending[report.id] = report
+        if not pending:
+            return
+        ordered = sorted(pending.values(), key=lambda r: (r.shift_date, shift_rank(r.shift_type), r.id))
+        report_pairs = {report.id: self._accounts(report) for report in ordered}
+        pairs = {pair for report_id in report_pairs for pair in report_pairs[report_id]}
+        first, last = ordered[0], ordered[-1]
+
+        # Последний баланс каждого аккаунта до первой смены периода
+        carried = {}
+        for pair in pairs:
+            platform, account_id = pair
+            balance = find_ledger_balance_before(self.session, account_id, platform, first.shift_date, first.shift_type)
+            if balance is not None:
+                carried[pair] = balance
+
+        ledger = AccountBalanceLedger
+        rows = []
+        if pairs:
+            rows = self.session.query(
+                ledger.platform, ledger.account_id, ledger.shift_date, ledger.shift_rank, ledger.balance
+            ).filter(
+                ledger.account_id.in_({account_id for _, account_id in pairs}),
+                ledger.shift_date >= first.shift_date,
+                ledger.shift_date <= last.shift_date
+            ).order_by(ledger.shift_date, ledger.shift_rank, ledger.report_id).all()
+
+        # Записи журнала применяются до отчётов более поздних смен; записи той же
+        # смены (в том числе самого отчёта) предыдущими не считаются
+        position = 0
+        for report in ordered:
+            report_slot = (report.shift_date, shift_rank(report.shift_type))
+            while position < len(rows) and (rows[position].shift_date, rows[position].shift_rank) < report_slot:
+                row = rows[position]
+                pair = (row.platform, row.account_id)
+                if pair in pairs:
+                    carried[pair] = float(row.balance or 0)
+                position += 1
+            self._prev[report.id] = {
+                pair: carried[pair] if pair in carried else self._initial_balance(pair)
+                for pair in report_pairs[report.id]
+            }
+            self._store(('prev', report.id), self._prev[report.id])
+
+    def prepare_profits(self, reports: List) -> None:
+        """prepare() для отчётов без актуальной сохранённой прибыли"""
+        self.prepare([report for report in reports if stored_report_profit(report) is None])
+
+    def prev_balance(self, account_id, platform, report) -> float:
+        """Предыдущий баланс аккаунта до отчёта (как find_prev_balance)"""
+        self.prepare([report])
+        pair = (platform, _ledger_account_id(account_id))
+        prevs = self._prev[report.id]
+        if pair not in prevs:
+            return find_prev_balance(self.session, account_id, platform, report)
+        return prevs[pair]
+
+    def profit(self, report) -> Dict[str, float]:
+        """Сохранённая прибыль отчёта или calculate_report_profit, посчитанный не больше одного раза за запрос"""
+        if report.id not in self._profits:
+            profit = stored_report_profit(report)
+            if profit is None:
+                profit = self._cached(('profit', report.id))
+            if profit is None:
+                profit = self.compute(report)
+                self._store(('profit', report.id), profit)
+            self._profits[report.id] = profit
+        return self._profits[report.id]
+
+    def compute(self, report) -> Dict[str, float]:
+        """calculate_report_profit отчёта по журналу балансов, без сохранённых значений"""
+        self.prepare([report])
+        return calculate_report_profit(
+            self.session, report,
+            lambda account_id, platform: self.prev_balance(account_id, platform, report)
+        )
+
 def calculate_account_last_balance(session: Session, account_id: int, platform: str, reports: List) -> float:
     """
     Возвращает последний баланс аккаунта за период (или начальный баланс).
     """
     from app import InitialBalance, Account
     for r in sorted(reports, key=lambda x: (x.shift_date, 0 if x.shift_type=='morning' else 1), reverse=True):
-        try:
-            b = json.loads(r.balances_json or '{}')
-        except:
-            b = {}
-        if b.get(platform):
-            found = next((a for a in b[platform] if (a.get('account_id') or a.get('id')) == account_id), None)
-            if found and found.get('balance') not in (None, ''):
-                return float(found['balance'])
+        found = report_balances(r).find(platform, account_id)
+        if found and found.balance is not None:
+            return found.balance
     # Если нет ни одного отчёта — берём начальный баланс
     ib = session.query(InitialBalance).filter_by(platform=platform).all()
     acc_obj = session.query(Account).filter_by(id=account_id).first()
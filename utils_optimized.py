@@ -6,21 +6,31 @@
 import json
 from decimal import Decimal
 from datetime import datetime, timedelta
-from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
-import logging
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+from logging_setup import get_logger
+from profit_cache import cache as profit_cache
+
+logger = get_logger(__name__)
 
 # Кэш для часто используемых данных
-@lru_cache(maxsize=1000)
 def find_prev_balance_cached(account_id: int, platform: str, shift_date: str, shift_type: str) -> float:
     """
-    Кэшированная версия поиска предыдущего баланса
+    Кэшированная версия поиска предыдущего баланса.
+    Кэш общий с app (profit_cache) и сбрасывается при смене поколения данных,
+    поэтому запись отчётов и балансов в любом процессе не оставляет устаревших значений.
     """
-    return find_prev_balance_optimized(account_id, platform, shift_date, shift_type)
+    from app import profit_cache_generation
+    generation = profit_cache_generation()
+    if generation is None:
+        # Поколение не сверено (вне запроса) или запрос уже писал данные — без кэша
+        return find_prev_balance_optimized(account_id, platform, shift_date, shift_type)
+    key = ('optimized_prev', account_id, platform, shift_date, shift_type)
+    balance = profit_cache.get(key)
+    if balance is None:
+        balance = find_prev_balance_optimized(account_id, platform, shift_date, shift_type)
+        profit_cache.put(key, balance, generation)
+    return balance
 
 def find_prev_balance_optimized(account_id: int, platform: str, shift_date: str, shift_type: str) -> float:
     """
@@ -291,7 +301,7 @@ def clear_cache():
     """
     Очистка кэша для обновления данных
     """
-    find_prev_balance_cached.cache_clear()
+    profit_cache.clear()
     logger.info("Кэш очищен")
 
 # Статистика кэша
@@ -300,5 +310,5 @@ def get_cache_info():
     Получение информации о кэше
     """
     return {
-        'find_prev_balance_cached': find_prev_balance_cached.cache_info()._asdict()
+        'find_prev_balance_cached': profit_cache.stats()
     } 
\ No newline at end of file
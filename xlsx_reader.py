@@ -0,0 +1,240 @@
+"""
+Потоковое чтение листа .xlsx без построения модели книги.
+
+Лист разбирается напрямую из XML внутри архива через iterparse: в памяти
+держится только текущая строка, а значения считываются только для
+запрошенных колонок. Это в разы быстрее openpyxl (в том числе в режиме
+read_only), который создаёт объект на каждую ячейку.
+
+Значения ячеек совпадают с тем, что отдаёт openpyxl: числа → int/float,
+ячейки с форматом даты → datetime, общие и встроенные строки → str.
+Для распознавания форматов дат используются функции openpyxl.
+"""
+
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse
+from xml.parsers.expat import ParserCreate
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900, from_ISO8601, from_excel
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+TEXT_TAG = MAIN_NS + 't'
+SHARED_ITEM_TAG = MAIN_NS + 'si'
+
+# Имена элементов листа в виде, который отдаёт expat с namespace_separator=' '
+MAIN_URI = MAIN_NS.strip('{}')
+ROW_NAME = MAIN_URI + ' row'
+CELL_NAME = MAIN_URI + ' c'
+VALUE_NAME = MAIN_URI + ' v'
+TEXT_NAME = MAIN_URI + ' t'
+
+PARSE_BLOCK_SIZE = 64 * 1024
+
+# Стили ячеек: обычное число, дата, длительность
+NUMBER, DATE, TIMEDELTA = 0, 1, 2
+
+
+_column_indexes = {}
+
+
+def _column_index(ref):
+    """'AB12' → 27 (индекс колонки с нуля)"""
+    letters = ref.rstrip('0123456789')
+    index = _column_indexes.get(letters)
+    if index is None:
+        index = 0
+        for ch in letters:
+            index = index * 26 + (ord(ch.upper()) - 64)
+        index -= 1
+        _column_indexes[letters] = index
+    return index
+
+
+def _text_content(element):
+    """Текст строки: простой <t> или набор фрагментов форматированного текста"""
+    return ''.join(t.text or '' for t in element.iter(TEXT_TAG))
+
+
+class XlsxSheetReader:
+    """
+    Читатель первого листа книги .xlsx.
+
+    Использование:
+        with XlsxSheetReader(path) as reader:
+            for row in reader.iter_rows(columns=[0, 3, 7]):
+                ...
+    """
+
+    def __init__(self, filepath):
+        self._zip = zipfile.ZipFile(filepath)
+        try:
+            self._sheet_path, self._epoch = self._read_workbook()
+            self._shared_strings = self._read_shared_strings()
+            self._styles = self._read_styles()
+        except Exception:
+            self._zip.close()
+            raise
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _read_workbook(self):
+        """Путь к XML первого листа и эпоха дат книги (1900/1904)"""
+        first_sheet_rel = None
+        epoch = CALENDAR_WINDOWS_1900
+        with self._zip.open('xl/workbook.xml') as f:
+            for _, element in iterparse(f, events=('end',)):
+                if element.tag == MAIN_NS + 'workbookPr' and element.get('date1904') in ('1', 'true'):
+                    epoch = CALENDAR_MAC_1904
+                elif element.tag == MAIN_NS + 'sheet' and first_sheet_rel is None:
+                    first_sheet_rel = element.get(REL_NS + 'id')
+
+        sheet_path = 'xl/worksheets/sheet1.xml'
+        if first_sheet_rel and 'xl/_rels/workbook.xml.rels' in self._zip.namelist():
+            with self._zip.open('xl/_rels/workbook.xml.rels') as f:
+                for _, element in iterparse(f, events=('end',)):
+                    if element.tag == PKG_REL_NS + 'Relationship' and element.get('Id') == first_sheet_rel:
+                        target = element.get('Target')
+                        if target.startswith('/'):
+                            sheet_path = target.lstrip('/')
+                        else:
+                            sheet_path = posixpath.normpath(posixpath.join('xl', target))
+                        break
+        return sheet_path, epoch
+
+    def _read_shared_strings(self):
+        if 'xl/sharedStrings.xml' not in self._zip.namelist():
+            return []
+        strings = []
+        with self._zip.open('xl/sharedStrings.xml') as f:
+            for _, element in iterparse(f, events=('end',)):
+                if element.tag == SHARED_ITEM_TAG:
+                    strings.append(_text_content(element))
+                    element.clear()
+        return strings
+
+    def _read_styles(self):
+        """Тип значения для каждого индекса стиля ячейки (число/дата/длительность)"""
+        if 'xl/styles.xml' not in self._zip.namelist():
+            return []
+        formats = dict(BUILTIN_FORMATS)
+        styles = []
+        with self._zip.open('xl/styles.xml') as f:
+            in_num_fmts = in_cell_xfs = False
+            for event, element in iterparse(f, events=('start', 'end')):
+                if element.tag == MAIN_NS + 'numFmts':
+                    in_num_fmts = event == 'start'
+                elif element.tag == MAIN_NS + 'numFmt' and in_num_fmts and event == 'end':
+                    formats[int(element.get('numFmtId'))] = element.get('formatCode')
+                elif element.tag == MAIN_NS + 'cellXfs':
+                    in_cell_xfs = event == 'start'
+                elif element.tag == MAIN_NS + 'xf' and in_cell_xfs and event == 'end':
+                    code = formats.get(int(element.get('numFmtId', 0)))
+                    if code and is_timedelta_format(code):
+                        styles.append(TIMEDELTA)
+                    elif code and is_date_format(code):
+                        styles.append(DATE)
+                    else:
+                        styles.append(NUMBER)
+        return styles
+
+    def _cell_value(self, data_type, style, text):
+        """Значение ячейки по её типу (атрибут t), стилю (s) и тексту <v>/<t>"""
+        if data_type == 'inlineStr':
+            return text
+        if text is None:
+            return None
+        if data_type == 'n':
+            number = float(text) if ('.' in text or 'E' in text or 'e' in text) else int(text)
+            kind = self._styles[style] if style < len(self._styles) else NUMBER
+            if kind == DATE:
+                return from_excel(number, self._epoch)
+            if kind == TIMEDELTA:
+                return from_excel(number, self._epoch, timedelta=True)
+            return number
+        if data_type == 's':
+            return self._shared_strings[int(text)]
+        if data_type == 'b':
+            return bool(int(text))
+        if data_type == 'd':
+            return from_ISO8601(text)
+        if data_type == 'e':
+            return None
+        return text
+
+    def iter_rows(self, columns=None):
+        """
+        Отдаёт строки листа списками значений.
+
+        Args:
+            columns: индексы колонок (с нуля), которые нужно прочитать; значения
+                отдаются в этом порядке. None — все колонки до последней
+                заполненной в строке.
+        """
+        wanted = None if columns is None else {col: pos for pos, col in enumerate(columns)}
+        width = 0 if columns is None else len(columns)
+
+        # Разбор на колбэках expat: элементы дерева не создаются,
+        # в памяти только текущая строка и ещё не отданные готовые строки
+        rows = []
+        state = {'row': None, 'position': 0, 'cell': None, 'text': None}
+
+        def start_element(name, attrs):
+            if name == CELL_NAME:
+                ref = attrs.get('r')
+                index = _column_index(ref) if ref else state['position']
+                state['position'] = index + 1
+                pos = index if wanted is None else wanted.get(index)
+                state['cell'] = None if pos is None else (pos, attrs.get('t', 'n'), int(attrs.get('s', 0)))
+            elif name == ROW_NAME:
+                state['row'] = [None] * width
+                state['position'] = 0
+            elif (name == VALUE_NAME or name == TEXT_NAME) and state['cell'] is not None:
+                if state['text'] is None or name == VALUE_NAME:
+                    state['text'] = []
+
+        def end_element(name):
+            if name == CELL_NAME:
+                cell = state['cell']
+                if cell is not None:
+                    pos, data_type, style = cell
+                    text = ''.join(state['text']) if state['text'] is not None else None
+                    row = state['row']
+                    if pos >= len(row):
+                        row.extend([None] * (pos + 1 - len(row)))
+                    row[pos] = self._cell_value(data_type, style, text)
+                state['cell'] = None
+                state['text'] = None
+            elif name == ROW_NAME:
+                rows.append(state['row'])
+                state['row'] = None
+
+        def character_data(data):
+            if state['text'] is not None:
+                state['text'].append(data)
+
+        parser = ParserCreate(namespace_separator=' ')
+        parser.buffer_text = True
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+
+        with self._zip.open(self._sheet_path) as f:
+            for block in iter(lambda: f.read(PARSE_BLOCK_SIZE), b''):
+                parser.Parse(block, False)
+                if rows:
+                    yield from rows
+                    rows.clear()
+            parser.Parse(b'', True)
+            yield from rows